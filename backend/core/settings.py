@@ -6,6 +6,7 @@ from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
 import os
+import tempfile
 
 load_dotenv()
 
@@ -129,6 +130,14 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # BEGIN IMMEDIATE: a transaction takes the write lock up front and
+        # waits for it, instead of failing with "database is locked" when
+        # it upgrades from a read (concurrent wallet updates, wallet/services.py)
+        "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 20},
+        # a file, not the default in-memory DB: its shared cache locks whole
+        # tables without waiting, which the threaded wallet tests run into;
+        # one per test run (pid), so concurrent runs don't share it
+        "TEST": {"NAME": os.path.join(tempfile.gettempdir(), f"cryptoflow-test-{os.getpid()}.sqlite3")},
     }
 }
 
@@ -142,6 +151,193 @@ CACHES = {
     }
 }
 
+# -------------------------------------------------------------------
+# MARKET DATA (see markets/ingest.py)
+# -------------------------------------------------------------------
+COINGECKO_BASE_URL = os.getenv(
+    "COINGECKO_BASE_URL", "https://api.coingecko.com/api/v3"
+)
+
+# seconds between `manage.py ingest_markets` cycles
+MARKET_INGEST_INTERVAL = float(os.getenv("MARKET_INGEST_INTERVAL", "30"))
+
+# per-process read cache in front of the store (markets/cache.py)
+MARKET_SNAPSHOT_TTL = 5
+MARKET_SNAPSHOT_STALE_TTL = 120
+
+# top100 ?sparkline=<points> resolutions, downsampled (LTTB) at ingest;
+# ?fields= may pick from TOP100_FIELDS (markets/sparkline.py)
+MARKET_SPARKLINE_POINTS = (0, 24, 48, 84)
+TOP100_FIELDS = (
+    "id", "symbol", "name", "image", "current_price", "market_cap",
+    "market_cap_rank", "fully_diluted_valuation", "total_volume",
+    "high_24h", "low_24h", "price_change_24h", "price_change_percentage_24h",
+    "price_change_percentage_24h_in_currency", "market_cap_change_24h",
+    "market_cap_change_percentage_24h", "circulating_supply", "total_supply",
+    "max_supply", "ath", "ath_change_percentage", "ath_date", "atl",
+    "atl_change_percentage", "atl_date", "roi", "last_updated",
+    "sparkline_in_7d",
+)
+
+# shared memory-mapped price table (markets/pricetable.py), one per node
+PRICE_TABLE_PATH = os.getenv(
+    "PRICE_TABLE_PATH",
+    os.path.join(tempfile.gettempdir(), "cryptoflow-prices.tbl"),
+)
+PRICE_TABLE_CAPACITY = 4096
+PRICE_TABLE_MAX_AGE = 300
+
+# price lookups missing from the store: collect for PRICE_BATCH_WINDOW
+# seconds, then one /simple/price call per batch (markets/prices.py)
+PRICE_BATCH_WINDOW = 0.02
+PRICE_BATCH_MAX_IDS = 250
+PRICE_BATCH_TIMEOUT = 15
+
+# coin detail pages: refresh after TTL, keep refreshing while viewed
+MARKET_DETAIL_TTL = 60
+MARKET_DETAIL_INFO_TTL = 600
+MARKET_DETAIL_DEMAND_WINDOW = 600
+MARKET_DETAIL_BATCH = 5
+
+# per-coin OHLC history (markets/history.py): seconds of bars kept per
+# resolution (None = all), how far back "max" is backfilled (CoinGecko
+# demo keys only serve 365 days), and how stale the newest point may get
+# before the worker fetches the delta for a viewed coin
+MARKET_HISTORY_KEEP = {"5m": 3 * 86400, "1h": 90 * 86400, "1d": None}
+MARKET_HISTORY_MAX_DAYS = os.getenv("MARKET_HISTORY_MAX_DAYS", "365")
+MARKET_HISTORY_DELTA = 300
+
+# coin catalog (markets/catalog.py): /coins/list + Binance futures symbols
+# re-fetched by the worker every TTL; each process reloads its search
+# index every RELOAD and caches unknown ids for MISS_TTL seconds
+MARKET_CATALOG_TTL = 86400
+MARKET_CATALOG_RELOAD = 600
+MARKET_CATALOG_MISS_TTL = 300
+
+# max per-process cache entries for keys made from user input (coin ids,
+# top100 ?fields= projections), least frequently used evicted first;
+# "default" holds every key cached without a group (markets/cache.py)
+MARKET_CACHE_LIMITS = {"detail": 2000, "catalog": 10000, "projection": 64, "default": 1000}
+
+# -------------------------------------------------------------------
+# FUTURES MARK PRICES (see futures/markprice.py)
+# -------------------------------------------------------------------
+BINANCE_FAPI_URL = os.getenv("BINANCE_FAPI_URL", "https://fapi.binance.com")
+BINANCE_MARK_PRICE_WS = os.getenv(
+    "BINANCE_MARK_PRICE_WS", "wss://fstream.binance.com/ws/!markPrice@arr"
+)
+MARK_PRICE_TABLE_PATH = os.getenv(
+    "MARK_PRICE_TABLE_PATH",
+    os.path.join(tempfile.gettempdir(), "cryptoflow-markprices.tbl"),
+)
+MARK_PRICE_TABLE_CAPACITY = 1024
+
+# older stream prices are ignored and Binance REST is asked instead
+MARK_PRICE_MAX_AGE = float(os.getenv("MARK_PRICE_MAX_AGE", "10"))
+
+# -------------------------------------------------------------------
+# FUTURES ACCOUNT STREAM (see futures/stream.py, futures/events.py)
+# -------------------------------------------------------------------
+ACCOUNT_EVENTS_PATH = os.getenv(
+    "ACCOUNT_EVENTS_PATH",
+    os.path.join(tempfile.gettempdir(), "cryptoflow-account-events.tbl"),
+)
+# one record per user with futures activity; when full, streams of users
+# without a record fall back to reloading every FUTURES_STREAM_FALLBACK_POLL
+ACCOUNT_EVENTS_CAPACITY = int(os.getenv("ACCOUNT_EVENTS_CAPACITY", "65536"))
+
+# seconds between checks for account changes, minimum seconds between
+# unrealized-PnL pushes, and idle seconds before a keep-alive comment
+FUTURES_STREAM_POLL = 0.1
+FUTURES_STREAM_PNL_INTERVAL = float(os.getenv("FUTURES_STREAM_PNL_INTERVAL", "1"))
+FUTURES_STREAM_HEARTBEAT = 15
+FUTURES_STREAM_FALLBACK_POLL = 5
+
+# seconds a stream ticket (POST /api/futures/stream/ticket/) stays valid
+FUTURES_STREAM_TICKET_TTL = 30
+
+# -------------------------------------------------------------------
+# LIQUIDATIONS, TP/SL, LIMIT ORDERS (futures/liquidation.py, triggers.py,
+# orderbook.py — all run by stream_markprices)
+# -------------------------------------------------------------------
+# seconds between syncs of positions, triggers and orders from the DB, and
+# how far each sync looks back before the previous one (clock skew and
+# transactions that committed late)
+LIQUIDATION_SYNC_INTERVAL = 1
+LIQUIDATION_SYNC_OVERLAP = 5
+
+# limit-order fills are written behind: at most every FLUSH_INTERVAL
+# seconds, or as soon as FLUSH_BATCH fills are waiting
+LIMIT_ORDER_FLUSH_INTERVAL = 0.2
+LIMIT_ORDER_FLUSH_BATCH = 500
+
+# -------------------------------------------------------------------
+# CROSS MARGIN (see futures/risk.py, run by stream_markprices)
+# -------------------------------------------------------------------
+# maintenance margin = MAINTENANCE_MARGIN_RATE * notional at the mark; a
+# cross account is liquidated when its maintenance reaches its equity.
+# The engine publishes every account it changed to the shared risk table
+# at most every PUBLISH_INTERVAL seconds; readers ignore the table when
+# the engine has not written it for MAX_AGE seconds. At most
+# LIQUIDATION_BATCH accounts are liquidated per tick, riskiest first.
+FUTURES_MAINTENANCE_MARGIN_RATE = float(os.getenv("FUTURES_MAINTENANCE_MARGIN_RATE", "0.005"))
+ACCOUNT_RISK_PATH = os.getenv(
+    "ACCOUNT_RISK_PATH",
+    os.path.join(tempfile.gettempdir(), "cryptoflow-account-risk.tbl"),
+)
+ACCOUNT_RISK_CAPACITY = 65536
+ACCOUNT_RISK_PUBLISH_INTERVAL = 1
+ACCOUNT_RISK_MAX_AGE = 10
+CROSS_LIQUIDATION_BATCH = 500
+
+# -------------------------------------------------------------------
+# PLATFORM VALUATION (see futures/valuation.py, run by stream_markprices)
+# -------------------------------------------------------------------
+# every open position is revalued on every frame; the exposure per symbol
+# is published at most every PUBLISH_INTERVAL seconds and ignored by
+# readers once the engine has not written it for MAX_AGE seconds
+EXPOSURE_PATH = os.getenv(
+    "EXPOSURE_PATH",
+    os.path.join(tempfile.gettempdir(), "cryptoflow-exposure.tbl"),
+)
+EXPOSURE_CAPACITY = 1024
+EXPOSURE_PUBLISH_INTERVAL = 1
+EXPOSURE_MAX_AGE = 10
+
+# -------------------------------------------------------------------
+# POSITION ARCHIVE (see futures/archive.py)
+# -------------------------------------------------------------------
+# `manage.py archive_positions` moves positions closed more than
+# ARCHIVE_AFTER_DAYS days ago (whole UTC days) into the compressed
+# per-user, per-day partitions, every ARCHIVE_INTERVAL seconds
+FUTURES_ARCHIVE_AFTER_DAYS = int(os.getenv("FUTURES_ARCHIVE_AFTER_DAYS", "30"))
+FUTURES_ARCHIVE_INTERVAL = 3600
+
+# -------------------------------------------------------------------
+# WALLET LEDGER (see wallet/ledger.py)
+# -------------------------------------------------------------------
+# `manage.py ledger_checkpoint` rolls the balance snapshots forward
+# every CHECKPOINT_INTERVAL seconds, over entries older than CHECKPOINT_LAG
+# (so a transaction still committing is never skipped)
+LEDGER_CHECKPOINT_INTERVAL = 5
+LEDGER_CHECKPOINT_LAG = 10
+
+# -------------------------------------------------------------------
+# UPSTREAM HTTP POOLS (see core/upstream.py)
+# -------------------------------------------------------------------
+# pool_size: max in-flight requests (and kept-alive connections) per process
+# deadline:  total seconds per request, including waiting for a connection
+UPSTREAMS = {
+    "coingecko": {
+        "pool_size": int(os.getenv("COINGECKO_POOL_SIZE", "10")),
+        "deadline": float(os.getenv("COINGECKO_DEADLINE", "10")),
+    },
+    "binance": {
+        "pool_size": int(os.getenv("BINANCE_POOL_SIZE", "10")),
+        "deadline": float(os.getenv("BINANCE_DEADLINE", "3")),
+    },
+}
+
 # -------------------------------------------------------------------
 # PASSWORD VALIDATION
 # -------------------------------------------------------------------
@@ -0,0 +1,191 @@
+# core/upstream.py
+#
+# Shared HTTP clients for upstream APIs (CoinGecko, Binance).
+#
+# - one persistent keep-alive pool per upstream (requests.Session for sync
+#   code, httpx.AsyncClient per event loop for async code)
+# - at most `pool_size` requests in flight per upstream per process; a
+#   caller that cannot get a slot before its deadline fails fast instead
+#   of tying up the worker
+# - every request has a total deadline (requests' own timeout only bounds
+#   each socket operation, so sync calls run on the upstream's pool
+#   threads and the caller stops waiting at the deadline)
+# - latency / error counters per upstream endpoint, see stats()
+#
+# Limits come from settings.UPSTREAMS.
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import asyncio
+import threading
+import time
+import weakref
+
+from django.conf import settings
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class UpstreamBusy(UpstreamError):
+    """ No free connection slot for this upstream before the deadline """
+
+
+def config(upstream):
+    return settings.UPSTREAMS[upstream]
+
+
+# ===================== SYNC =====================
+
+_sessions = {}
+_slots = {}
+_executors = {}
+_sessions_lock = threading.Lock()
+
+
+def session(upstream):
+    with _sessions_lock:
+        s = _sessions.get(upstream)
+        if s is None:
+            size = config(upstream)["pool_size"]
+            s = requests.Session()
+            s.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=size))
+            s.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=size))
+            _sessions[upstream] = s
+            _slots[upstream] = threading.BoundedSemaphore(size)
+            _executors[upstream] = ThreadPoolExecutor(size, thread_name_prefix=f"upstream-{upstream}")
+        return s
+
+
+def get(upstream, url, params=None, headers=None, name=None, deadline=None):
+    """ GET url through the upstream's pool, returns parsed JSON or raises UpstreamError """
+    deadline = deadline or config(upstream)["deadline"]
+    s = session(upstream)
+    started = time.perf_counter()
+
+    if not _slots[upstream].acquire(timeout=deadline):
+        _record(upstream, name or url, started, "busy")
+        raise UpstreamBusy(f"{upstream}: no free connection within {deadline}s")
+
+    remaining = max(0.001, deadline - (time.perf_counter() - started))
+    try:
+        # the slot is released by _fetch: a request given up on still holds it
+        future = _executors[upstream].submit(_fetch, upstream, s, url, params, headers, remaining)
+    except Exception:
+        _slots[upstream].release()
+        raise
+
+    try:
+        data = future.result(timeout=remaining)
+    except FutureTimeout as e:
+        _record(upstream, name or url, started, "error")
+        raise UpstreamError(f"{upstream}: no answer within {deadline}s") from e
+    except Exception as e:
+        _record(upstream, name or url, started, "error")
+        raise UpstreamError(f"{upstream}: {e}") from e
+
+    _record(upstream, name or url, started)
+    return data
+
+
+def _fetch(upstream, s, url, params, headers, timeout):
+    try:
+        r = s.get(url, params=params, headers=headers, timeout=timeout)
+        r.raise_for_status()
+        return r.json()
+    finally:
+        _slots[upstream].release()
+
+
+# ===================== ASYNC =====================
+
+_async_clients = weakref.WeakKeyDictionary()   # loop -> {upstream: client}
+
+
+def async_client(upstream):
+    """ httpx.AsyncClient for this upstream on the running event loop """
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+
+    client = clients.get(upstream)
+    if client is None:
+        cfg = config(upstream)
+        client = clients[upstream] = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=cfg["pool_size"],
+                max_keepalive_connections=cfg["pool_size"],
+            ),
+            timeout=cfg["deadline"],
+        )
+    return client
+
+
+async def aclose():
+    """ Close the running loop's clients (call before the loop ends) """
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+async def aget(upstream, url, params=None, headers=None, name=None, deadline=None):
+    """ get() for async code; the deadline covers waiting for a connection too """
+    deadline = deadline or config(upstream)["deadline"]
+    client = async_client(upstream)
+    started = time.perf_counter()
+
+    try:
+        r = await asyncio.wait_for(
+            client.get(url, params=params, headers=headers), deadline
+        )
+        r.raise_for_status()
+        data = r.json()
+    except httpx.PoolTimeout as e:
+        _record(upstream, name or url, started, "busy")
+        raise UpstreamBusy(f"{upstream}: no free connection within {deadline}s") from e
+    except Exception as e:
+        _record(upstream, name or url, started, "error")
+        raise UpstreamError(f"{upstream}: {e!r}") from e
+
+    _record(upstream, name or url, started)
+    return data
+
+
+# ===================== METRICS =====================
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _record(upstream, endpoint, started, outcome="ok"):
+    elapsed = time.perf_counter() - started
+
+    with _stats_lock:
+        s = _stats.get((upstream, endpoint))
+        if s is None:
+            s = _stats[(upstream, endpoint)] = {
+                "count": 0, "errors": 0, "busy": 0,
+                "total_s": 0.0, "max_s": 0.0,
+            }
+        s["count"] += 1
+        s["total_s"] += elapsed
+        s["max_s"] = max(s["max_s"], elapsed)
+        if outcome == "error":
+            s["errors"] += 1
+        elif outcome == "busy":
+            s["busy"] += 1
+
+
+def stats():
+    """ {"upstream endpoint": counters} for this process """
+    with _stats_lock:
+        return {
+            f"{upstream} {endpoint}": {
+                **s,
+                "avg_ms": round(s["total_s"] / s["count"] * 1000, 2),
+                "max_ms": round(s["max_s"] * 1000, 2),
+            }
+            for (upstream, endpoint), s in sorted(_stats.items())
+        }
@@ -23,4 +23,5 @@ urlpatterns = [
     path("api/accounts/", include("accounts.urls")),
     path("api/markets/", include("markets.urls")),
     path("api/futures/", include("futures.urls")),
+    path("api/wallet/", include("wallet.urls")),
 ]
\ No newline at end of file
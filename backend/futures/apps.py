@@ -3,6 +3,3 @@ from django.apps import AppConfig
 class FuturesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'futures'
-
-    def ready(self):
-        import futures.signals
\ No newline at end of file
@@ -0,0 +1,244 @@
+# futures/archive.py
+#
+# Retention of closed positions. FuturesPosition only keeps the open ones
+# and those closed in the last FUTURES_ARCHIVE_AFTER_DAYS days; older ones
+# are moved, one UTC day at a time, into PositionArchive partitions: one
+# row per user and day holding the rows as zlib-compressed JSON columns,
+# plus the day's rollup (trades, liquidations, volume, PnL).
+#
+#   archive()                       move old closed positions (worker,
+#                                   `manage.py archive_positions`)
+#   history(user_id, statuses, ...) trade history across both tiers
+#   daily(user_id, since)           per-day rollups across both tiers
+#
+# Archived positions come back as unsaved FuturesPosition instances, so
+# readers don't care which tier a row lives in.
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import json
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .fixedpoint import QUANTUM
+from .models import FuturesPosition, PositionArchive
+
+FIELDS = (
+    "id", "symbol", "side", "entry_price", "amount", "leverage", "initial_margin",
+    "liquidation_price", "opened_at", "closed_at", "pnl", "status", "accrued_funding", "margin_mode",
+)
+DECIMALS = {"entry_price", "amount", "initial_margin", "liquidation_price", "pnl", "accrued_funding"}
+DATES = {"opened_at", "closed_at"}
+
+FINISHED = [FuturesPosition.CLOSED, FuturesPosition.LIQUIDATED]
+
+# ids per DELETE (SQLite's bound-parameter limit)
+DELETE_BATCH = 500
+
+
+# ===================== PACKING =====================
+
+def pack(positions):
+    """ zlib-compressed JSON columns of positions """
+    columns = {
+        field: [_dump(field, getattr(p, field)) for p in positions]
+        for field in FIELDS
+    }
+    return zlib.compress(json.dumps(columns, separators=(",", ":")).encode(), 9)
+
+
+def unpack(blob, user_id):
+    """ Unsaved FuturesPosition instances of a packed partition, oldest first """
+    if not blob:
+        return []
+    columns = json.loads(zlib.decompress(bytes(blob)))
+    # partitions packed before a field existed leave it at the model default
+    fields = [field for field in FIELDS if field in columns]
+    return [
+        FuturesPosition(user_id=user_id, **{field: _load(field, v) for field, v in zip(fields, row)})
+        for row in zip(*(columns[field] for field in fields))
+    ]
+
+
+# ===================== ARCHIVING =====================
+
+def archive(days=None, now=None):
+    """
+    Move every position closed before the start of the day `days` days
+    ago into the archive, oldest day first, one transaction per day.
+    Returns the number of positions moved.
+    """
+    days = settings.FUTURES_ARCHIVE_AFTER_DAYS if days is None else days
+    cutoff = _day_start((now or timezone.now()) - timedelta(days=days))
+
+    moved = 0
+    while True:
+        oldest = (
+            FuturesPosition.objects.filter(status__in=FINISHED, closed_at__lt=cutoff)
+            .order_by("closed_at")
+            .values_list("closed_at", flat=True)
+            .first()
+        )
+        if oldest is None:
+            return moved
+        moved += _archive_day(_day_start(oldest))
+
+
+# ===================== READS =====================
+
+def history(user_id, statuses, before=None, limit=50):
+    """
+    Closed positions of statuses newest first, (closed_at, id) < before,
+    at most limit + 1 (the extra one tells the caller there is a next page)
+    """
+    # hot tier: one (user, status, closed_at, id) index range per status
+    # (an IN over status would have to sort the user's whole history)
+    page = []
+    for status in statuses:
+        positions = FuturesPosition.objects.filter(user_id=user_id, status=status)
+        if before:
+            positions = positions.filter(_before(*before))
+        page += positions.order_by("-closed_at", "-id")[:limit + 1]
+    page.sort(key=lambda p: (p.closed_at, p.id), reverse=True)
+    page = page[:limit + 1]
+
+    # archive: partitions newest day first, until a whole day is past the page
+    partitions = PositionArchive.objects.filter(user_id=user_id)
+    if before:
+        partitions = partitions.filter(day__lte=before[0].astimezone(dt_timezone.utc).date())
+    if FuturesPosition.CLOSED not in statuses:
+        partitions = partitions.filter(liquidated__gt=0)
+    if FuturesPosition.LIQUIDATED not in statuses:
+        partitions = partitions.filter(closed__gt=0)
+
+    # a full hot page that ends after the newest partition's day: nothing archived can be on it
+    if len(page) > limit:
+        newest = partitions.order_by("-day").values_list("day", flat=True).first()
+        if newest is None or page[-1].closed_at >= datetime.combine(
+            newest + timedelta(days=1), time.min, tzinfo=dt_timezone.utc
+        ):
+            return page
+
+    found = []
+    for partition in partitions.order_by("-day").iterator(chunk_size=8):
+        if len(found) > limit:
+            break
+        found += [
+            p for p in unpack(partition.positions, user_id)
+            if p.status in statuses and (not before or (p.closed_at, p.id) < before)
+        ]
+
+    page += found
+    page.sort(key=lambda p: (p.closed_at, p.id), reverse=True)
+    return page[:limit + 1]
+
+
+def daily(user_id, since=None):
+    """ [{day, closed, liquidated, volume, pnl}] oldest day first, both tiers; since: a date """
+    days = defaultdict(lambda: {"closed": 0, "liquidated": 0, "volume": Decimal("0"), "pnl": Decimal("0")})
+
+    archived = PositionArchive.objects.filter(user_id=user_id)
+    hot = FuturesPosition.objects.filter(user_id=user_id, status__in=FINISHED)
+    if since:
+        archived = archived.filter(day__gte=since)
+        hot = hot.filter(closed_at__gte=datetime.combine(since, time.min, tzinfo=dt_timezone.utc))
+
+    rows = list(archived.values("day", "closed", "liquidated", "volume", "pnl"))
+    rows += (
+        hot.annotate(day=TruncDate("closed_at", tzinfo=dt_timezone.utc))
+        .values("day")
+        .annotate(
+            closed=Count("id", filter=Q(status=FuturesPosition.CLOSED)),
+            liquidated=Count("id", filter=Q(status=FuturesPosition.LIQUIDATED)),
+            volume=Sum(F("entry_price") * F("amount")),
+            pnl=Sum("pnl"),
+        )
+    )
+    for row in rows:
+        total = days[row["day"]]
+        for key in total:
+            total[key] += row[key] or 0
+
+    # SQLite sums decimals as floats: back to the 1e-8 of the columns
+    for total in days.values():
+        total["volume"] = Decimal(total["volume"]).quantize(QUANTUM)
+        total["pnl"] = Decimal(total["pnl"]).quantize(QUANTUM)
+    return [{"day": day, **days[day]} for day in sorted(days)]
+
+
+# -------- helpers --------
+def _archive_day(start):
+    """ Move the positions closed in [start, start + 1 day) into their users' partitions """
+    day = start.date()
+    with transaction.atomic():
+        moved = defaultdict(list)
+        for p in FuturesPosition.objects.filter(
+            status__in=FINISHED, closed_at__gte=start, closed_at__lt=start + timedelta(days=1)
+        ).order_by("closed_at", "id"):
+            moved[p.user_id].append(p)
+
+        # a partition already there (an earlier run) is merged into
+        existing = {
+            a.user_id: a
+            for a in PositionArchive.objects.select_for_update().filter(day=day, user_id__in=list(moved))
+        }
+        created, updated = [], []
+        for user_id, positions in moved.items():
+            partition = existing.get(user_id)
+            if partition is None:
+                partition = PositionArchive(user_id=user_id, day=day)
+                created.append(partition)
+            else:
+                positions = unpack(partition.positions, user_id) + positions
+                updated.append(partition)
+            _fill(partition, positions)
+
+        PositionArchive.objects.bulk_create(created, batch_size=500)
+        PositionArchive.objects.bulk_update(
+            updated, ["positions", "closed", "liquidated", "volume", "pnl", "updated_at"], batch_size=500
+        )
+
+        ids = [p.id for positions in moved.values() for p in positions]
+        for i in range(0, len(ids), DELETE_BATCH):
+            FuturesPosition.objects.filter(id__in=ids[i:i + DELETE_BATCH]).delete()
+    return len(ids)
+
+
+def _fill(partition, positions):
+    """ Packed rows and rollup of a partition """
+    partition.positions = pack(positions)
+    partition.closed = sum(p.status == FuturesPosition.CLOSED for p in positions)
+    partition.liquidated = sum(p.status == FuturesPosition.LIQUIDATED for p in positions)
+    partition.volume = sum((p.entry_price * p.amount for p in positions), Decimal("0")).quantize(QUANTUM)
+    partition.pnl = sum((p.pnl for p in positions), Decimal("0"))
+    partition.updated_at = timezone.now()
+
+
+def _before(closed_at, position_id):
+    return Q(closed_at__lt=closed_at) | Q(closed_at=closed_at, id__lt=position_id)
+
+
+def _day_start(moment):
+    return datetime.combine(moment.astimezone(dt_timezone.utc).date(), time.min, tzinfo=dt_timezone.utc)
+
+
+def _dump(field, value):
+    if field in DECIMALS:
+        return str(value)
+    if field in DATES:
+        return value.isoformat()
+    return value
+
+
+def _load(field, value):
+    if field in DECIMALS:
+        return Decimal(value)
+    if field in DATES:
+        return datetime.fromisoformat(value)
+    return value
@@ -0,0 +1,53 @@
+# futures/clock.py
+#
+# Time as the futures engines see it. Live it is the wall clock. A replay
+# (`manage.py replay_market`) runs them under a VirtualClock that follows
+# the event times of the recorded feed. The engines' sync / flush
+# intervals and every timestamp Django writes (timezone.now(),
+# auto_now_add) then come from the recording, so a replay runs as fast
+# as the CPU allows and does the same thing on every run.
+
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+import time
+
+from django.utils import timezone
+
+
+class VirtualClock:
+    """ Seconds since the epoch, moved forward by the caller only """
+
+    def __init__(self, seconds=0.0):
+        self.seconds = seconds
+
+    def advance(self, seconds):
+        # a feed slightly out of order never moves time backwards
+        self.seconds = max(self.seconds, seconds)
+
+    def now(self):
+        return datetime.fromtimestamp(self.seconds, tz=dt_timezone.utc)
+
+
+_virtual = None
+
+
+def monotonic():
+    """ time.monotonic(), or the virtual seconds during a replay """
+    return time.monotonic() if _virtual is None else _virtual.seconds
+
+
+def timestamp():
+    """ time.time(), or the virtual seconds during a replay """
+    return time.time() if _virtual is None else _virtual.seconds
+
+
+@contextmanager
+def virtual(clock):
+    """ Run the engines, and django.utils.timezone.now(), on clock """
+    global _virtual
+    real_now = timezone.now
+    _virtual, timezone.now = clock, clock.now
+    try:
+        yield clock
+    finally:
+        _virtual, timezone.now = None, real_now
@@ -0,0 +1,72 @@
+# futures/events.py
+#
+# Account change events, shared by every worker on the node. Each user
+# has a record in a memory-mapped table (same format as the price
+# tables); emit() bumps its version whenever the futures wallet or
+# positions change. Streams (futures/stream.py) watch that version and
+# only touch the DB when it moves. Users who found the table full have
+# no version (None) and their streams poll instead (see
+# ACCOUNT_EVENTS_CAPACITY).
+
+import time
+
+from django.conf import settings
+
+from markets.pricetable import SharedTable
+
+
+class AccountEvents(SharedTable):
+    """ user id -> last change; the record seq is the account's version """
+
+    MAGIC = b"CFE1"
+    KEY_SIZE = 16
+    TAG_SIZE = 8
+    FIELDS = ("changed_at",)
+
+
+def emit(user_id):
+    """ Tell every stream of this user that their account changed """
+    emit_many([user_id])
+
+
+def emit_many(user_ids):
+    now = time.time()
+    writer().upsert([(str(u), None, {"changed_at": now}) for u in set(user_ids)])
+
+
+def version(user_id):
+    """ The account's version, or None if its changes are not recorded (table full) """
+    table = reader()
+    if table is None:
+        return 0
+    version = table.version(str(user_id))
+    if not version and len(table) >= table.capacity:
+        return None
+    return version
+
+
+# ===================== PROCESS-WIDE HANDLES =====================
+
+_reader = None
+_writer = None
+
+
+def reader():
+    global _reader
+    if _reader is None:
+        try:
+            _reader = AccountEvents(settings.ACCOUNT_EVENTS_PATH)
+        except (FileNotFoundError, ValueError):
+            return None
+    return _reader
+
+
+def writer():
+    global _writer
+    if _writer is None:
+        _writer = AccountEvents(
+            settings.ACCOUNT_EVENTS_PATH,
+            capacity=settings.ACCOUNT_EVENTS_CAPACITY,
+            writable=True,
+        )
+    return _writer
@@ -0,0 +1,149 @@
+# futures/fixedpoint.py
+#
+# The futures math of futures.utils on scaled integers: every amount is
+# an int of 1e-8 units (the decimal_places of the money / price columns),
+# leverage is a plain int. The *_array variants work on NumPy int64
+# columns; the scalar functions are the Decimal reference they fall back
+# to for elements outside the int64 range.
+#
+# Results are exactly what the Decimal functions give once quantized to
+# the column: utils.f(...).quantize(Decimal("1e-8")), ROUND_HALF_EVEN in
+# the default 28-digit context. The exact quotient is rounded half-even
+# directly; the only inputs where Decimal's own 28-digit rounding could
+# change the last digit are the ones sitting on (or within 1e-16 of) a
+# half-way point, and those are recomputed in Decimal.
+#
+# settlement.fill_orders() sizes a whole batch of fills with the array
+# variants. futures/tests/test_fixedpoint.py checks the equivalence on
+# random, tie and edge inputs; `manage.py bench_fixedpoint` times it.
+
+from decimal import Decimal
+
+import numpy as np
+
+from . import utils
+
+PLACES = 8
+SCALE = 10 ** PLACES
+QUANTUM = Decimal(1).scaleb(-PLACES)
+
+# int64 bound used by the array paths (headroom below 2**63)
+LIMIT = 4 * 10 ** 18
+
+
+def to_fixed(value):
+    """ Scaled int of a Decimal / int / str; ValueError if it has more than PLACES decimals """
+    scaled = Decimal(value).scaleb(PLACES)
+    if scaled != scaled.to_integral_value():
+        raise ValueError(f"{value} has more than {PLACES} decimal places")
+    return int(scaled)
+
+
+def from_fixed(value):
+    """ Decimal with PLACES decimals of a scaled int """
+    return Decimal(int(value)).scaleb(-PLACES)
+
+
+def to_array(values):
+    return np.fromiter((to_fixed(v) for v in values), np.int64)
+
+
+# ===================== SCALAR =====================
+# The Decimal functions quantized to the column: the reference the array
+# paths match, and what they fall back to outside int64. No scalar int
+# path: per call, Python ints barely beat (or lose to) Decimal.
+
+def contracts(margin, entry_price, leverage):
+    """ margin * leverage / entry price """
+    return to_fixed(
+        utils.calculate_contracts(from_fixed(margin), from_fixed(entry_price), leverage).quantize(QUANTUM)
+    )
+
+
+def liquidation(entry_price, leverage, side):
+    """ entry * (1 -/+ 1 / leverage) """
+    return to_fixed(utils.liquidation_price(from_fixed(entry_price), leverage, side).quantize(QUANTUM))
+
+
+def pnl(entry_price, current_price, side, amount):
+    """ amount * (current - entry) for a long, the opposite for a short """
+    return to_fixed(
+        utils.calculate_pnl(from_fixed(entry_price), from_fixed(current_price), side, from_fixed(amount))
+        .quantize(QUANTUM)
+    )
+
+
+# ===================== ARRAYS =====================
+
+def contracts_array(margin, entry_price, leverage):
+    """ contracts() over int64 columns (leverage: int column or a single int) """
+    margin, entry_price, leverage = np.broadcast_arrays(
+        *(np.asarray(a, dtype=np.int64) for a in (margin, entry_price, leverage))
+    )
+    ok = (entry_price > 0) & (entry_price < LIMIT // 10 ** 4) & (leverage > 0)
+    ok &= np.abs(margin.astype(float)) * leverage < LIMIT
+    e = np.where(ok, entry_price, 1)
+    n = np.where(ok, margin * leverage, 0)
+
+    # long division, 4 digits at a time so r * 10**4 stays in int64
+    q, r = np.divmod(n, e)
+    ok &= np.abs(q) < LIMIT // SCALE
+    for _ in range(PLACES // 4):
+        digits, r = np.divmod(r * 10 ** 4, e)
+        q = q * 10 ** 4 + digits
+
+    ok &= np.abs(2 * r - e) > e // SCALE
+    out = q + (2 * r > e)
+    return _fallback(out, ok, contracts, margin, entry_price, leverage)
+
+
+def liquidation_array(entry_price, leverage, long):
+    """ liquidation() over int64 columns; long: bool column (or a single bool) """
+    entry_price, leverage, long = np.broadcast_arrays(
+        np.asarray(entry_price, dtype=np.int64), np.asarray(leverage, dtype=np.int64), np.asarray(long, dtype=bool)
+    )
+    ok = (leverage > 0) & (np.abs(entry_price) < LIMIT // 256) & (leverage < 255)
+    lev = np.where(ok, leverage, 1)
+    q, r = np.divmod(np.where(ok, entry_price, 0) * np.where(long, lev - 1, lev + 1), lev)
+
+    ok &= 2 * r != lev
+    out = q + (2 * r > lev)
+    return _fallback(out, ok, liquidation, entry_price, leverage, long)
+
+
+def pnl_array(entry_price, current_price, long, amount):
+    """ pnl() over int64 columns; long: bool column (or a single bool) """
+    entry_price, current_price, long, amount = np.broadcast_arrays(
+        np.asarray(entry_price, dtype=np.int64), np.asarray(current_price, dtype=np.int64),
+        np.asarray(long, dtype=bool), np.asarray(amount, dtype=np.int64),
+    )
+    # elements that could overflow are computed anyway (wrapping) and replaced below
+    diff = current_price - entry_price
+    ok = (np.abs(entry_price) < LIMIT) & (np.abs(current_price) < LIMIT)
+    ok &= np.abs(amount.astype(float) * diff.astype(float)) < LIMIT * float(SCALE)
+
+    # |c| * |d| / SCALE = c * d_hi + c_hi * d_lo + c_lo * d_lo / SCALE, every term in int64
+    negative = (amount < 0) ^ (diff < 0) ^ ~long
+    c, d = np.abs(amount), np.abs(diff)
+    c_hi, c_lo = np.divmod(c, SCALE)
+    d_hi, d_lo = np.divmod(d, SCALE)
+    carry, r = np.divmod(c_lo * d_lo, SCALE)
+    q = c * d_hi + c_hi * d_lo + carry
+
+    q += (2 * r > SCALE) | ((2 * r == SCALE) & (q & 1 == 1))
+    q = np.where(negative, -q, q)
+    return _fallback(q, ok, pnl, entry_price, current_price, long, amount)
+
+
+# -------- helpers --------
+def _fallback(out, ok, func, *columns):
+    """ Recompute the elements not covered by the int64 path with the scalar function (bool column = side) """
+    bad = np.flatnonzero(~ok)
+    if len(bad):
+        out = out.copy()
+        rows = zip(*(
+            np.where(c[bad], "LONG", "SHORT").tolist() if c.dtype == bool else c[bad].tolist()
+            for c in columns
+        ))
+        out[bad] = [func(*row) for row in rows]
+    return out
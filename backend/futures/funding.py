@@ -0,0 +1,70 @@
+# futures/funding.py
+#
+# Funding of the perpetuals, run inside `manage.py stream_markprices`.
+#
+# Every mark-price tick carries the symbol's current funding rate and its
+# next funding time (Binance: every 8 hours). The engine keeps the latest
+# (funding time, rate, mark) seen per symbol; the first tick whose event
+# time reaches that funding time settles it with the last values seen
+# before it. Ticks are read on their own event time, so a recorded feed
+# (`manage.py markprice_stub`) settles the same rounds as the live one.
+#
+# Settlement is futures.settlement.pay_funding(): one pass over all the
+# open positions of the due symbols, set-based. A round is stored per
+# symbol and funding time and never paid twice (restarts, a second
+# process). A funding time that passes while the engine is down is not
+# paid afterwards.
+
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from . import clock, settlement
+
+
+class FundingEngine:
+    def __init__(self):
+        self.pending = {}        # symbol -> (funding time ms, rate, mark)
+        self.retry = []          # (funding time ms, rounds) whose settlement failed
+
+    def on_ticks(self, ticks):
+        """
+        Settle the funding times reached by a batch of (symbol, values)
+        ticks. Returns the FundingRound rows created.
+        """
+        due = defaultdict(list)
+        for funding_time, rounds in self.retry:
+            due[funding_time] += rounds
+        self.retry = []
+
+        for symbol, values in ticks:
+            event_time = values.get("event_time") or clock.timestamp() * 1000
+
+            pending = self.pending.get(symbol)
+            if pending is not None and event_time >= pending[0]:
+                del self.pending[symbol]
+                due[pending[0]].append((symbol, pending[1], pending[2]))
+
+            funding_time = values.get("next_funding_time")
+            try:
+                rate = Decimal(str(values["funding_rate"]))
+                mark = Decimal(str(values["mark_price"]))
+            except (KeyError, InvalidOperation):
+                continue
+            if funding_time and event_time < funding_time and rate.is_finite() and mark.is_finite():
+                self.pending[symbol] = (int(funding_time), rate, mark)
+
+        settled = []
+        for funding_time, rounds in sorted(due.items()):
+            try:
+                settled += settlement.pay_funding(_moment(funding_time), rounds)
+            except Exception as e:
+                # tried again on the next tick
+                print("❌ FUNDING SETTLEMENT ERROR:", e)
+                self.retry.append((funding_time, rounds))
+        return settled
+
+
+# -------- helper --------
+def _moment(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=dt_timezone.utc)
@@ -0,0 +1,199 @@
+# futures/liquidation.py
+#
+# Liquidation engine, run inside `manage.py stream_markprices`.
+#
+# Open positions are indexed per symbol, longs and shorts apart, each
+# side as NumPy arrays sorted by liquidation price. A long is breached
+# when mark <= liquidation price, a short when mark >= it, so on every
+# mark-price tick the breached positions are one contiguous end of the
+# array: one bisect finds them and slicing pops them, O(log n + k) no
+# matter how many positions are open.
+#
+# Positions opened or closed by the web workers are picked up by sync()
+# every LIQUIDATION_SYNC_INTERVAL seconds (indexed queries on opened_at
+# / closed_at); breached positions are settled in bulk through
+# futures.settlement. Only isolated positions: cross-margin ones are
+# liquidated per account by futures/risk.py.
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+import numpy as np
+
+from . import clock, settlement
+from .models import FuturesPosition, FuturesWallet
+
+
+class SideBook:
+    """ Open positions of one symbol and side, sorted by liquidation price """
+
+    __slots__ = ("long", "prices", "ids", "new_prices", "new_ids", "dead")
+
+    def __init__(self, long):
+        self.long = long
+        self.prices = np.empty(0)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.new_prices = []     # added since the last merge
+        self.new_ids = []
+        self.dead = set()        # closed elsewhere, dropped when reached
+
+    def add(self, position_id, liq_price):
+        self.new_prices.append(liq_price)
+        self.new_ids.append(position_id)
+
+    def remove(self, position_id):
+        # may never have been here (cross margin, closed before a sync saw it)
+        self.dead.add(position_id)
+
+    def breached(self, mark):
+        """ Pop the positions liquidated at `mark`: (ids, liquidation prices) """
+        if self.new_ids:
+            self._merge()
+
+        if self.long:
+            i = np.searchsorted(self.prices, mark, "left")
+            ids, prices = self.ids[i:], self.prices[i:]
+            self.ids, self.prices = self.ids[:i], self.prices[:i]
+        else:
+            i = np.searchsorted(self.prices, mark, "right")
+            ids, prices = self.ids[:i], self.prices[:i]
+            self.ids, self.prices = self.ids[i:], self.prices[i:]
+
+        if len(ids) and self.dead:
+            alive = ~np.isin(ids, list(self.dead))
+            self.dead.difference_update(ids[~alive].tolist())
+            ids, prices = ids[alive], prices[alive]
+        return ids, prices
+
+    def compact(self):
+        """ Drop positions closed elsewhere that no tick has reached yet """
+        if self.new_ids:
+            self._merge()
+        if self.dead:
+            alive = ~np.isin(self.ids, list(self.dead))
+            self.ids, self.prices = self.ids[alive], self.prices[alive]
+            self.dead.clear()
+
+    def _merge(self):
+        prices = np.array(self.new_prices)
+        ids = np.array(self.new_ids, dtype=np.int64)
+        order = np.argsort(prices, kind="stable")
+        prices, ids = prices[order], ids[order]
+
+        at = np.searchsorted(self.prices, prices)
+        self.prices = np.insert(self.prices, at, prices)
+        self.ids = np.insert(self.ids, at, ids)
+        self.new_prices, self.new_ids = [], []
+
+    def __len__(self):
+        return max(len(self.ids) + len(self.new_ids) - len(self.dead), 0)
+
+
+class LiquidationEngine:
+    def __init__(self):
+        self.books = {}          # (symbol, side) -> SideBook
+        self.synced_at = None
+        self.next_sync = 0
+        self.recent = {}         # position id -> opened_at, for the sync overlap
+
+    def book(self, symbol, side):
+        book = self.books.get((symbol, side))
+        if book is None:
+            book = self.books[(symbol, side)] = SideBook(side == FuturesPosition.LONG)
+        return book
+
+    def add(self, position_id, symbol, side, liq_price):
+        self.book(symbol, side).add(position_id, float(liq_price))
+
+    # ===================== LOADING =====================
+
+    def load(self):
+        """ Index every open position (startup) """
+        self.synced_at = timezone.now()
+        rows = (
+            FuturesPosition.objects.filter(status=FuturesPosition.OPEN, margin_mode=FuturesWallet.ISOLATED)
+            .values_list("id", "symbol", "side", "liquidation_price")
+            .iterator(chunk_size=10000)
+        )
+        for position_id, symbol, side, liq_price in rows:
+            self.add(position_id, symbol, side, liq_price)
+        for book in self.books.values():
+            book.compact()
+        self.next_sync = clock.monotonic() + settings.LIQUIDATION_SYNC_INTERVAL
+        return len(self)
+
+    def sync(self):
+        """ Pick up positions opened / closed since the last sync """
+        now = timezone.now()
+        since = self.synced_at - timedelta(seconds=settings.LIQUIDATION_SYNC_OVERLAP)
+
+        opened = FuturesPosition.objects.filter(
+            status=FuturesPosition.OPEN, opened_at__gte=since, margin_mode=FuturesWallet.ISOLATED
+        ).values_list("id", "symbol", "side", "liquidation_price", "opened_at")
+        for position_id, symbol, side, liq_price, opened_at in opened:
+            if position_id not in self.recent:
+                self.recent[position_id] = opened_at
+                self.add(position_id, symbol, side, liq_price)
+
+        closed = FuturesPosition.objects.filter(closed_at__gte=since).exclude(
+            status=FuturesPosition.OPEN
+        ).values_list("id", "symbol", "side")
+        for position_id, symbol, side in closed:
+            book = self.books.get((symbol, side))
+            if book is not None:
+                book.remove(position_id)
+
+        self.recent = {p: t for p, t in self.recent.items() if t >= since}
+        self.synced_at = now
+        self.next_sync = clock.monotonic() + settings.LIQUIDATION_SYNC_INTERVAL
+
+        for book in self.books.values():
+            if len(book.dead) > max(1024, len(book.ids) // 8):
+                book.compact()
+
+    # ===================== TICKS =====================
+
+    def on_ticks(self, ticks):
+        """
+        Liquidate everything breached by a batch of (symbol, {"mark_price"})
+        ticks. Returns [(position id, user id)] liquidated.
+        """
+        if self.synced_at is not None and clock.monotonic() >= self.next_sync:
+            try:
+                self.sync()
+            except DatabaseError as e:
+                # next_sync is left as it was: the next tick retries
+                print("❌ LIQUIDATION SYNC ERROR:", e)
+
+        hits = []
+        for symbol, values in ticks:
+            if values.get("mark_price") is None:
+                continue
+            mark = float(values["mark_price"])
+            for side in (FuturesPosition.LONG, FuturesPosition.SHORT):
+                book = self.books.get((symbol, side))
+                if book is None:
+                    continue
+                ids, prices = book.breached(mark)
+                if len(ids):
+                    hits.append((book, ids, prices))
+
+        if not hits:
+            return []
+
+        try:
+            return settlement.liquidate(
+                pid for _, ids, _ in hits for pid in ids.tolist()
+            )
+        except Exception as e:
+            # put them back, the next tick retries
+            print("❌ LIQUIDATION SETTLEMENT ERROR:", e)
+            for book, ids, prices in hits:
+                for pid, price in zip(ids.tolist(), prices.tolist()):
+                    book.add(pid, price)
+            return []
+
+    def __len__(self):
+        return sum(len(b) for b in self.books.values())
@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from futures import archive
+from futures.models import FuturesPosition, PositionArchive
+
+
+class Command(BaseCommand):
+    help = "Periodically move old closed positions into the compressed archive (futures/archive.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.FUTURES_ARCHIVE_AFTER_DAYS,
+            help="Archive positions closed more than this many days ago",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.FUTURES_ARCHIVE_INTERVAL,
+            help="Seconds between runs",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run once and exit",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+
+            try:
+                moved = archive.archive(options["days"])
+                if moved:
+                    print(f"✅ ARCHIVE: {moved} positions moved in {time.monotonic() - started:.1f}s")
+                    self.report()
+            except Exception as e:
+                print("❌ ARCHIVE ERROR:", e)
+
+            if options["once"]:
+                return
+
+            elapsed = time.monotonic() - started
+            time.sleep(max(0.0, options["interval"] - elapsed))
+
+    def report(self):
+        hot = FuturesPosition.objects.aggregate(n=Count("id"))["n"]
+        partitions = list(PositionArchive.objects.values_list("closed", "liquidated", "positions"))
+        archived = sum(c + l for c, l, _ in partitions)
+        size = sum(len(blob) for _, _, blob in partitions)
+        print(f"   hot table: {hot} positions, archive: {archived} positions in "
+              f"{len(partitions)} partitions ({size / max(archived, 1):.0f} bytes per position)")
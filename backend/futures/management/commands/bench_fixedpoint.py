@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand
+import numpy as np
+
+from futures import fixedpoint as fp
+from futures.fixedpoint import from_fixed
+from futures.utils import calculate_contracts, calculate_pnl, liquidation_price
+
+
+class Command(BaseCommand):
+    help = "Fixed-point futures math: int64 arrays against the Decimal functions, per position"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--positions", type=int, default=1_000_000, help="Array size for the timings")
+
+    def handle(self, *args, **options):
+        # equivalence with Decimal is covered by futures/tests/test_fixedpoint.py
+        self.bench(options["positions"], options["seed"])
+
+    # ===================== SPEED =====================
+
+    def bench(self, n, seed):
+        rnd = np.random.default_rng(seed)
+        leverage = rnd.integers(1, 126, n)
+        long = rnd.random(n) < 0.5
+        # prices with 4 decimals, margins with 2, as placed through the API
+        margin = np.round(rnd.uniform(10, 1000, n) * 10 ** 2).astype(np.int64) * 10 ** 6
+        entry = np.round(10 ** rnd.uniform(-1, 5, n) * 10 ** 4).astype(np.int64) * 10 ** 4
+        current = entry + (entry * rnd.normal(0, 0.02, n)).astype(np.int64)
+        amount = fp.contracts_array(margin, entry, leverage)
+
+        k = min(n, 100_000)
+        side = np.where(long[:k], "LONG", "SHORT").tolist()
+        dec = [[from_fixed(v) for v in col[:k].tolist()] for col in (margin, entry, current, amount)]
+        lev = leverage[:k].tolist()
+
+        runs = {
+            "contracts": (
+                lambda: [calculate_contracts(*row).quantize(fp.QUANTUM) for row in zip(dec[0], dec[1], lev)],
+                lambda: fp.contracts_array(margin, entry, leverage),
+            ),
+            "liquidation": (
+                lambda: [liquidation_price(*row).quantize(fp.QUANTUM) for row in zip(dec[1], lev, side)],
+                lambda: fp.liquidation_array(entry, leverage, long),
+            ),
+            "pnl": (
+                lambda: [calculate_pnl(*row).quantize(fp.QUANTUM) for row in zip(dec[1], dec[2], side, dec[3])],
+                lambda: fp.pnl_array(entry, current, long, amount),
+            ),
+        }
+
+        print(f"ns per position (Decimal on {k:,}, int64 arrays on {n:,})")
+        for name, (decimal, array) in runs.items():
+            t_dec = _timed(decimal) / k
+            t_arr = _timed(array) / n
+            print(f"{name:12} Decimal {t_dec * 1e9:7.0f}   array {t_arr * 1e9:5.1f} ({t_dec / t_arr:5.0f}x)")
+
+
+# -------- helpers --------
+def _timed(func, runs=3):
+    """ Best of runs, in seconds """
+    best = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
@@ -0,0 +1,116 @@
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+import numpy as np
+
+from futures import settlement
+from futures.models import FuturesPosition, FuturesWallet
+from wallet import ledger, services
+from wallet.models import LedgerEntry
+
+START_BALANCE = Decimal("10000")
+
+
+class Command(BaseCommand):
+    help = "Time one funding pass over many open positions and check the money adds up (rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--positions", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--symbols", type=int, default=200)
+
+    def handle(self, *args, **options):
+        n, users, symbols = options["positions"], options["users"], options["symbols"]
+        rnd = np.random.default_rng(5)
+        names = [f"SYM{i}USDT" for i in range(symbols)]
+        marks = np.round(10 ** rnd.uniform(-2, 5, symbols), 4)
+        rates = np.round(rnd.normal(0.0001, 0.0003, symbols), 8)
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            user_ids = self.fake_users(users)
+            owner = rnd.integers(0, users, n)
+            sym = rnd.integers(0, symbols, n)
+            long = rnd.random(n) < 0.5
+            amount = np.round(10 ** rnd.uniform(-3, 3, n), 8)
+            for i in range(0, n, 50_000):
+                FuturesPosition.objects.bulk_create(
+                    [
+                        FuturesPosition(
+                            user_id=user_ids[u], symbol=names[s],
+                            side=FuturesPosition.LONG if l else FuturesPosition.SHORT,
+                            entry_price=Decimal("1"), amount=Decimal(repr(a)), leverage=10,
+                            initial_margin=Decimal("1"), liquidation_price=Decimal("0"),
+                        )
+                        for u, s, l, a in zip(
+                            owner[i:i + 50_000].tolist(), sym[i:i + 50_000].tolist(),
+                            long[i:i + 50_000].tolist(), amount[i:i + 50_000].tolist(),
+                        )
+                    ],
+                    batch_size=5000,
+                )
+            print(f"setup: {n:,} open positions, {users:,} users, {symbols} symbols "
+                  f"in {time.perf_counter() - started:.1f} s")
+
+            rounds = [(name, Decimal(repr(r)), Decimal(repr(m))) for name, r, m in zip(names, rates.tolist(), marks.tolist())]
+            funding_time = datetime.now(dt_timezone.utc).replace(microsecond=0)
+
+            started = time.perf_counter()
+            created = settlement.pay_funding(funding_time, rounds)
+            elapsed = time.perf_counter() - started
+            print(f"✅ funding pass: {n:,} positions in {elapsed:.2f} s ({n / elapsed:,.0f}/s)")
+
+            again = settlement.pay_funding(funding_time, rounds)
+            self.verify(user_ids, created, again, marks, rates, sym, long, amount)
+            transaction.set_rollback(True)
+
+    def fake_users(self, count):
+        # bulk_create: no post_save signals, the wallets are made here
+        stamp = time.time_ns()
+        users = User.objects.bulk_create(
+            [User(username=f"bench-funding-{stamp}-{i}") for i in range(count)], batch_size=5000
+        )
+        FuturesWallet.objects.bulk_create(
+            [FuturesWallet(user=u, balance=START_BALANCE) for u in users], batch_size=5000
+        )
+        return [u.id for u in users]
+
+    def verify(self, user_ids, created, again, marks, rates, sym, long, amount):
+        if again:
+            raise CommandError("the same funding time was paid twice")
+        if sum(r.positions for r in created) != len(sym):
+            raise CommandError("not every open position was in the pass")
+
+        # every position: amount * mark * rate, paid by longs, received by shorts
+        expected = np.where(long, -1, 1) * amount * marks[sym] * rates[sym]
+        positions = FuturesPosition.objects.filter(user_id__in=user_ids)
+        accrued = np.array([float(v) for v in positions.order_by("id").values_list("accrued_funding", flat=True)])
+        worst = np.max(np.abs(accrued - expected) / np.maximum(np.abs(expected), 1))
+        print(f"   positions: worst error vs float reference {worst:.1e}")
+        if worst > 1e-6:
+            raise CommandError("funding payments differ from amount * mark * rate")
+
+        # the wallets moved by exactly what the ledger says: each user's total
+        # rounded once to cents, never taking more than the wallet held
+        total = positions.aggregate(total=Sum("accrued_funding"))["total"]
+        expected = sum((
+            max(services.quantize(FuturesWallet, accrued), -START_BALANCE)
+            for accrued in positions.values("user_id").annotate(s=Sum("accrued_funding")).values_list("s", flat=True)
+        ), Decimal("0"))
+        wallets = FuturesWallet.objects.filter(user_id__in=user_ids).aggregate(total=Sum("balance"))["total"]
+        booked = ledger.rounded(ledger.FUTURES, LedgerEntry.objects.filter(
+            user_id__in=user_ids, kind=LedgerEntry.FUNDING
+        ).aggregate(total=Sum("amount"))["total"])
+        moved = wallets - START_BALANCE * len(user_ids)
+        print(f"   accrued {total:.8f}, wallets moved {moved:.2f}, ledger {booked:.2f} "
+              f"({expected - total:.2f} not collected from empty wallets)")
+        if moved != booked or abs(booked - expected) > Decimal("0.01") * len(user_ids):
+            raise CommandError("wallets / ledger don't match the accrued funding")
+
+        paid = sum(r.paid_by_longs for r in created)
+        print(f"   longs paid {paid:.8f} over {len(created)} rounds")
@@ -0,0 +1,120 @@
+from decimal import Decimal
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+import numpy as np
+
+from futures import settlement
+from futures.liquidation import LiquidationEngine
+from futures.models import FuturesPosition
+
+
+def fake_positions(n, symbols, seed=7):
+    """ (ids, symbol index, is long, liquidation price) arrays and the starting marks """
+    rnd = np.random.default_rng(seed)
+    marks = 10 ** rnd.uniform(-2, 5, symbols)
+    sym = rnd.integers(0, symbols, n)
+    long = rnd.random(n) < 0.5
+    # 2x..125x leverage: liquidation 0.8%..50% away from the mark
+    distance = 1 / rnd.uniform(2, 125, n)
+    liq = marks[sym] * np.where(long, 1 - distance, 1 + distance)
+    return np.arange(1, n + 1, dtype=np.int64), sym, long, liq, marks
+
+
+class Command(BaseCommand):
+    help = "Per-tick cost of the liquidation engine (bisect) vs scanning every open position"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--positions", type=int, default=1_000_000)
+        parser.add_argument("--symbols", type=int, default=200)
+        parser.add_argument("--frames", type=int, default=500, help="Mark-price frames (every symbol ticks)")
+        parser.add_argument(
+            "--db", type=int, default=0, metavar="N",
+            help="Also time settling N liquidations in the DB (rolled back)",
+        )
+
+    def handle(self, *args, **options):
+        n, symbols = options["positions"], options["symbols"]
+        ids, sym, long, liq, marks = fake_positions(n, symbols)
+        names = [f"SYM{i}USDT" for i in range(symbols)]
+
+        # --- build ---
+        engine = LiquidationEngine()
+        started = time.perf_counter()
+        sides = np.where(long, FuturesPosition.LONG, FuturesPosition.SHORT)
+        for pid, s, side, price in zip(ids.tolist(), sym.tolist(), sides.tolist(), liq.tolist()):
+            engine.add(pid, names[s], side, price)
+        for book in engine.books.values():
+            book.compact()
+        print(f"build: {n:,} positions, {len(engine.books)} books in {time.perf_counter() - started:.2f} s")
+
+        # ticks go straight to the books: settlement is timed apart (--db)
+        alive = np.ones(n, dtype=bool)
+        rnd = np.random.default_rng(11)
+        bisect_times, scan_times, hits = [], [], []
+
+        for _ in range(options["frames"]):
+            marks = marks * (1 + rnd.normal(0, 0.002, symbols))
+            ticks = [(names[i], {"mark_price": repr(m)}) for i, m in enumerate(marks.tolist())]
+
+            started = time.perf_counter()
+            found = []
+            for symbol, values in ticks:
+                mark = float(values["mark_price"])
+                for side in (FuturesPosition.LONG, FuturesPosition.SHORT):
+                    book = engine.books.get((symbol, side))
+                    if book is not None:
+                        found.append(book.breached(mark)[0])
+            bisect_times.append(time.perf_counter() - started)
+            found = np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+            # the same frame, checking every open position
+            started = time.perf_counter()
+            mark = marks[sym]
+            breached = alive & np.where(long, mark <= liq, mark >= liq)
+            scan_times.append(time.perf_counter() - started)
+
+            assert np.array_equal(np.sort(found), ids[breached]), "engine and scan disagree"
+            alive &= ~breached
+            hits.append(len(found))
+
+        bisect_times = np.array(bisect_times) * 1e6
+        scan_times = np.array(scan_times) * 1e6
+        print(f"{options['frames']} frames x {symbols} symbols, {int(np.sum(hits)):,} liquidated "
+              f"(max {max(hits)} in one frame), {int(alive.sum()):,} still open\n")
+        print(f"{'per frame':22} {'p50 µs':>10} {'p99 µs':>10}")
+        print(f"{'bisect (engine)':22} {np.percentile(bisect_times, 50):10.0f} {np.percentile(bisect_times, 99):10.0f}")
+        print(f"{'numpy full scan':22} {np.percentile(scan_times, 50):10.0f} {np.percentile(scan_times, 99):10.0f}")
+
+        if options["db"]:
+            self.bench_db(options["db"])
+
+    def bench_db(self, count):
+        with transaction.atomic():
+            # bulk_create: no post_save, no wallet — the bench doesn't need one
+            user, = User.objects.bulk_create([User(username=f"bench-liquidations-{time.time_ns()}")])
+            FuturesPosition.objects.bulk_create(
+                [
+                    FuturesPosition(
+                        user=user, symbol="BTCUSDT", side=FuturesPosition.LONG,
+                        entry_price=Decimal("50000"), amount=Decimal("0.01"), leverage=10,
+                        initial_margin=Decimal("50"), liquidation_price=Decimal("45000"),
+                    )
+                    for _ in range(count)
+                ],
+                batch_size=1000,
+            )
+            position_ids = list(
+                FuturesPosition.objects.filter(user=user).values_list("id", flat=True)
+            )
+
+            started = time.perf_counter()
+            done = settlement.liquidate(position_ids)
+            elapsed = time.perf_counter() - started
+
+            assert len(done) == count
+            print(f"\nDB settle: {count:,} liquidations in {elapsed * 1000:.0f} ms "
+                  f"({count / elapsed:,.0f}/s)")
+            transaction.set_rollback(True)
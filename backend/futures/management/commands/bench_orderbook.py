@@ -0,0 +1,118 @@
+from decimal import Decimal
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+import numpy as np
+
+from futures import settlement
+from futures.models import FuturesPosition, FuturesWallet, LimitOrder
+from futures.orderbook import Order, OrderEngine
+
+
+def fake_orders(n, symbols, seed=7):
+    """ Resting limit orders around each symbol's mark (tick-rounded prices), and the marks """
+    rnd = np.random.default_rng(seed)
+    marks = np.round(10 ** rnd.uniform(0, 4, symbols), 2)
+    sym = rnd.integers(0, symbols, n)
+    long = rnd.random(n) < 0.5
+    # buys below the mark, sells above, up to 5% away
+    distance = rnd.uniform(0, 0.05, n)
+    prices = np.round(marks[sym] * np.where(long, 1 - distance, 1 + distance), 2)
+
+    names = [f"SYM{i}USDT" for i in range(symbols)]
+    orders = [
+        Order(i + 1, 1, names[s], FuturesPosition.LONG if l else FuturesPosition.SHORT, Decimal(repr(p)))
+        for i, (s, l, p) in enumerate(zip(sym.tolist(), long.tolist(), prices.tolist()))
+    ]
+    return orders, names, marks
+
+
+class Command(BaseCommand):
+    help = "Limit-order book throughput: orders/sec placed / cancelled, match latency per tick"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=200_000, help="Resting orders")
+        parser.add_argument("--symbols", type=int, default=50)
+        parser.add_argument("--ticks", type=int, default=20_000, help="Mark-price ticks to match")
+        parser.add_argument(
+            "--db", type=int, default=0, metavar="N",
+            help="Also time writing N fills to the DB (rolled back)",
+        )
+
+    def handle(self, *args, **options):
+        orders, names, marks = fake_orders(options["orders"], options["symbols"])
+        n = len(orders)
+
+        # --- restart: rebuild from the stored orders ---
+        started = time.perf_counter()
+        restarted = OrderEngine()
+        restarted.live = {o.id: o for o in orders}
+        restarted.rebuild()
+        print(f"rebuild:  {n:,} orders in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        # --- placing one by one ---
+        engine = OrderEngine()
+        started = time.perf_counter()
+        for order in orders:
+            engine.add(order)
+        elapsed = time.perf_counter() - started
+        print(f"place:    {n / elapsed:,.0f} orders/s")
+
+        # --- cancelling a third ---
+        started = time.perf_counter()
+        for order in orders[::3]:
+            engine.cancel(order.id)
+        elapsed = time.perf_counter() - started
+        print(f"cancel:   {len(orders[::3]) / elapsed:,.0f} orders/s")
+
+        # --- matching: every tick moves one symbol's mark ---
+        rnd = np.random.default_rng(11)
+        latencies = np.empty(options["ticks"])
+        filled = 0
+        symbols = rnd.integers(0, len(names), options["ticks"]).tolist()
+        moves = rnd.normal(0, 0.002, options["ticks"]).tolist()
+        marks = marks.tolist()
+
+        for i, (s, move) in enumerate(zip(symbols, moves)):
+            marks[s] *= 1 + move
+            started = time.perf_counter()
+            filled += len(engine.match(names[s], marks[s]))
+            latencies[i] = time.perf_counter() - started
+        engine.pending = []
+
+        latencies *= 1e6
+        total = latencies.sum() / 1e6
+        print(f"match:    {options['ticks']:,} ticks, {filled:,} orders filled, "
+              f"{len(engine.live):,} still resting")
+        print(f"          {filled / total:,.0f} fills/s, latency µs p50 {np.percentile(latencies, 50):.1f} "
+              f"p99 {np.percentile(latencies, 99):.1f} max {latencies.max():.0f}")
+
+        if options["db"]:
+            self.bench_db(options["db"])
+
+    def bench_db(self, count):
+        with transaction.atomic():
+            # bulk_create: no post_save signals, the wallet is made below
+            user, = User.objects.bulk_create([User(username=f"bench-orderbook-{time.time_ns()}")])
+            FuturesWallet.objects.create(user=user)
+            LimitOrder.objects.bulk_create(
+                [
+                    LimitOrder(
+                        user=user, symbol="BTCUSDT", side=FuturesPosition.LONG,
+                        price=Decimal("50000"), margin=Decimal("10"), leverage=10,
+                    )
+                    for _ in range(count)
+                ],
+                batch_size=1000,
+            )
+            order_ids = list(LimitOrder.objects.filter(user=user).values_list("id", flat=True))
+
+            started = time.perf_counter()
+            filled = settlement.fill_orders(order_ids)
+            elapsed = time.perf_counter() - started
+
+            assert len(filled) == count
+            print(f"\nDB write-behind: {count:,} fills in {elapsed * 1000:.0f} ms ({count / elapsed:,.0f}/s)")
+            transaction.set_rollback(True)
@@ -0,0 +1,162 @@
+from decimal import Decimal
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+import numpy as np
+
+from futures.models import FuturesPosition, FuturesWallet
+from futures.risk import AccountRisk, RiskEngine
+from futures.valuation import Positions
+
+START_BALANCE = Decimal("100")
+
+
+class Command(BaseCommand):
+    help = "Time the cross-margin risk engine on many accounts: ticks, reads, liquidations (rolled back)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--positions", type=int, default=200_000)
+        parser.add_argument("--users", type=int, default=20_000)
+        parser.add_argument("--symbols", type=int, default=100)
+        parser.add_argument("--ticks", type=int, default=200, help="frames, every symbol ticks in each")
+
+    def handle(self, *args, **options):
+        n, users, symbols = options["positions"], options["users"], options["symbols"]
+        rnd = np.random.default_rng(7)
+        names = [f"SYM{i}USDT" for i in range(symbols)]
+        marks = np.round(10 ** rnd.uniform(-1, 4, symbols), 4)
+
+        path = os.path.join(tempfile.mkdtemp(), "risk.tbl")
+        with transaction.atomic():
+            started = time.perf_counter()
+            user_ids = self.fake_users(users)
+            self.fake_positions(rnd, n, user_ids, names, marks)
+            print(f"setup: {n:,} cross positions, {users:,} accounts, {symbols} symbols "
+                  f"in {time.perf_counter() - started:.1f} s")
+
+            engine = RiskEngine(AccountRisk(path, capacity=users + 1, writable=True))
+            engine.marks.update(zip(names, marks.tolist()))
+            started = time.perf_counter()
+            engine.load()
+            # every position was opened just now: a sync would reload every account
+            engine.next_sync = float("inf")
+            user_ids = sorted(engine.slots)     # the users that got positions
+            print(f"✅ load: {len(engine):,} accounts in {time.perf_counter() - started:.2f} s")
+
+            # random walk, one frame = one tick per symbol; nobody gets liquidated yet
+            moved = 0
+            started = time.perf_counter()
+            for _ in range(options["ticks"]):
+                marks = marks * np.exp(rnd.normal(0, 0.002, symbols))
+                engine.on_ticks([(s, {"mark_price": repr(m)}) for s, m in zip(names, marks.tolist())])
+                moved += sum(len(book) for book in engine.books.values())
+            elapsed = time.perf_counter() - started
+            ticks = options["ticks"] * symbols
+            print(f"✅ ticks: {ticks / elapsed:,.0f} symbol ticks/s, "
+                  f"{moved / elapsed:,.0f} account updates/s ({elapsed / options['ticks'] * 1000:.2f} ms per frame)")
+
+            self.verify(engine, user_ids, names, marks)
+
+            started = time.perf_counter()
+            count = engine.publish()
+            print(f"✅ publish: {count:,} accounts in {time.perf_counter() - started:.2f} s")
+            reader = AccountRisk(path)
+            keys = [str(u) for u in rnd.choice(user_ids, 10_000).tolist()]
+            started = time.perf_counter()
+            for key in keys:
+                reader.get(key)
+            print(f"✅ reads: {(time.perf_counter() - started) / len(keys) * 1e6:.1f} µs per account")
+
+            self.crash(engine, user_ids, names, marks)
+            transaction.set_rollback(True)
+
+    def fake_users(self, count):
+        # bulk_create: no post_save signals, the wallets are made here
+        stamp = time.time_ns()
+        users = User.objects.bulk_create(
+            [User(username=f"bench-risk-{stamp}-{i}") for i in range(count)], batch_size=5000
+        )
+        FuturesWallet.objects.bulk_create(
+            [FuturesWallet(user=u, balance=START_BALANCE, margin_mode=FuturesWallet.CROSS) for u in users],
+            batch_size=5000,
+        )
+        return [u.id for u in users]
+
+    def fake_positions(self, rnd, n, user_ids, names, marks):
+        owner = rnd.integers(0, len(user_ids), n)
+        sym = rnd.integers(0, len(names), n)
+        long = rnd.random(n) < 0.5
+        entry = np.round(marks[sym] * rnd.uniform(0.98, 1.02, n), 4)
+        margin = np.round(rnd.uniform(1, 50, n), 2)
+        leverage = rnd.integers(1, 21, n)
+        for i in range(0, n, 50_000):
+            part = slice(i, i + 50_000)
+            FuturesPosition.objects.bulk_create(
+                [
+                    FuturesPosition(
+                        user_id=user_ids[u], symbol=names[s], margin_mode=FuturesWallet.CROSS,
+                        side=FuturesPosition.LONG if l else FuturesPosition.SHORT,
+                        entry_price=Decimal(repr(e)), amount=Decimal(f"{m * lev / e:.8f}"), leverage=lev,
+                        initial_margin=Decimal(repr(m)), liquidation_price=Decimal("0"),
+                    )
+                    for u, s, l, e, m, lev in zip(
+                        owner[part].tolist(), sym[part].tolist(), long[part].tolist(),
+                        entry[part].tolist(), margin[part].tolist(), leverage[part].tolist(),
+                    )
+                ],
+                batch_size=5000,
+            )
+
+    def revalue(self, engine, user_ids, names, marks):
+        """ (unrealized PnL, maintenance) per user from a full revaluation of every position """
+        book = Positions.load(FuturesPosition.objects.filter(user_id__in=user_ids, status=FuturesPosition.OPEN))
+        values = book.value(dict(zip(names, marks.tolist())))
+        owners = np.searchsorted(np.array(user_ids), book.user_ids)
+        pnl = np.bincount(owners, weights=values["unrealized_pnl"], minlength=len(user_ids))
+        maintenance = np.bincount(owners, weights=values["notional"], minlength=len(user_ids)) * engine.rate
+        return pnl, maintenance
+
+    def verify(self, engine, user_ids, names, marks):
+        """ The incremental aggregates against a full revaluation """
+        pnl, maintenance = self.revalue(engine, user_ids, names, marks)
+        slots = np.array([engine.slots[u] for u in user_ids], np.int64)
+        worst = max(
+            np.max(np.abs(engine.pnl[slots] - pnl) / np.maximum(np.abs(pnl), 1)),
+            np.max(np.abs(engine.maintenance[slots] - maintenance) / np.maximum(maintenance, 1)),
+        )
+        print(f"   aggregates: worst error vs full revaluation {worst:.1e}")
+        if worst > 1e-6:
+            raise CommandError("incremental aggregates drifted from the positions")
+
+    def crash(self, engine, user_ids, names, marks):
+        """ Crash the busiest symbol: the accounts it breaks go riskiest first, one batch per tick """
+        code = max(range(len(names)), key=lambda i: len(engine.books[names[i]]))
+        marks = marks.copy()
+        marks[code] *= 0.2 if engine.books[names[code]].arrays()[1].sum() > 0 else 5
+
+        # expected: every breached account, by margin ratio at the crashed marks
+        pnl, maintenance = self.revalue(engine, user_ids, names, marks)
+        equity = np.array([engine.balance[engine.slots[u]] + engine.margin[engine.slots[u]] for u in user_ids]) + pnl
+        breached = (maintenance > 0) & (maintenance >= equity)
+        with np.errstate(divide="ignore"):
+            ratio = np.where(equity > 0, maintenance / equity, np.inf)
+        expected = dict(zip(np.array(user_ids)[breached].tolist(), ratio[breached].tolist()))
+        started = time.perf_counter()
+        done = engine.on_ticks([(names[code], {"mark_price": repr(marks[code].item())})])
+        elapsed = time.perf_counter() - started
+        positions = sum(len(ids) for ids in done.values())
+        print(f"✅ {names[code]} crash: {len(done):,} accounts ({positions:,} positions) liquidated "
+              f"in {elapsed:.2f} s, {len(engine.breached):,} left for the next ticks")
+
+        if set(done) | engine.breached != set(expected) or len(done) != min(len(expected), settings.CROSS_LIQUIDATION_BATCH):
+            raise CommandError("breached accounts missing from the liquidation")
+        # ties aside, nobody left in the queue was riskier than someone liquidated
+        if done and engine.breached and max(expected[u] for u in engine.breached) > min(expected[u] for u in done) * (1 + 1e-9):
+            raise CommandError("the liquidated accounts are not the riskiest breached ones")
+        if FuturesWallet.objects.filter(user_id__in=list(done), balance__lt=0).exists():
+            raise CommandError("a liquidated wallet went negative")
@@ -0,0 +1,99 @@
+from decimal import Decimal
+import time
+
+from django.core.management.base import BaseCommand
+import numpy as np
+
+from futures.models import FuturesPosition
+from futures.utils import calculate_pnl, liquidation_price
+from futures.valuation import Positions, current_marks
+
+
+def fake_positions(n, symbols, seed=7):
+    """ Position rows as stored (Decimal columns) and a mark per symbol """
+    rnd = np.random.default_rng(seed)
+    marks = np.round(10 ** rnd.uniform(-2, 5, symbols), 4).tolist()
+    names = [f"SYM{i}USDT" for i in range(symbols)]
+    rows = []
+    for i, (s, long, lev, margin, move) in enumerate(zip(
+        rnd.integers(0, symbols, n).tolist(),
+        (rnd.random(n) < 0.5).tolist(),
+        rnd.integers(1, 126, n).tolist(),
+        np.round(rnd.uniform(10, 1000, n), 2).tolist(),
+        rnd.normal(0, 0.02, n).tolist(),
+    )):
+        side = FuturesPosition.LONG if long else FuturesPosition.SHORT
+        entry = Decimal(repr(round(marks[s] * (1 + move), 4)))
+        margin = Decimal(repr(margin))
+        amount = (margin * lev / entry).quantize(Decimal("1e-8"))
+        liq = liquidation_price(entry, lev, side).quantize(Decimal("1e-8"))
+        rows.append((i + 1, i % 1000, names[s], side, entry, amount, margin, liq))
+    return rows, dict(zip(names, marks))
+
+
+class Command(BaseCommand):
+    help = "Mark-to-market of every open position: vectorized pass vs calculate_pnl() per position"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--positions", type=int, default=1_000_000)
+        parser.add_argument("--symbols", type=int, default=200)
+        parser.add_argument("--ticks", type=int, default=20)
+        parser.add_argument(
+            "--from-db", action="store_true",
+            help="Value the stored open positions at the current marks and print platform exposure",
+        )
+
+    def handle(self, *args, **options):
+        if options["from_db"]:
+            return self.exposure()
+
+        started = time.perf_counter()
+        rows, prices = fake_positions(options["positions"], options["symbols"])
+        print(f"{len(rows):,} synthetic positions in {time.perf_counter() - started:.1f} s")
+
+        started = time.perf_counter()
+        book = Positions(rows)
+        print(f"load into arrays: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        rnd = np.random.default_rng(11)
+        times = []
+        for _ in range(options["ticks"]):
+            prices = {s: p * (1 + rnd.normal(0, 0.001)) for s, p in prices.items()}
+            started = time.perf_counter()
+            values = book.value(prices)
+            book.exposure(values)
+            times.append(time.perf_counter() - started)
+        vectorized = float(np.median(times))
+
+        # the per-position Decimal path, on a sample
+        sample = rows[:50_000]
+        marks = {s: Decimal(repr(p)) for s, p in prices.items()}
+        started = time.perf_counter()
+        pnls = [calculate_pnl(r[4], marks[r[2]], r[3], r[5]) for r in sample]
+        per_position = (time.perf_counter() - started) / len(sample)
+
+        worst = max(abs(float(d) - v) for d, v in zip(pnls, values["unrealized_pnl"][: len(sample)].tolist()))
+        print(f"\nvectorized, all metrics + exposure: {vectorized * 1000:.1f} ms per tick "
+              f"({len(rows) / vectorized:,.0f} positions/s)")
+        print(f"calculate_pnl() per position, PnL only: {per_position * len(rows) * 1000:.0f} ms per tick "
+              f"({1 / per_position:,.0f} positions/s)")
+        print(f"speedup {per_position * len(rows) / vectorized:.0f}x, "
+              f"max |float - Decimal| PnL difference {worst:.2e}")
+
+    def exposure(self):
+        book = Positions.load()
+        if not len(book):
+            print("no open positions")
+            return
+
+        values = book.value(current_marks(book.symbols.tolist()))
+        exposure = book.exposure(values)
+        print(f"{'symbol':14} {'positions':>9} {'long':>16} {'short':>16} {'uPnL':>14}")
+        for i in np.argsort(-(exposure["long"] + exposure["short"])).tolist():
+            print(
+                f"{exposure['symbols'][i]:14} {exposure['positions'][i]:9d} {exposure['long'][i]:16,.2f} "
+                f"{exposure['short'][i]:16,.2f} {exposure['unrealized_pnl'][i]:14,.2f}"
+            )
+        unpriced = int(np.isnan(values["mark_price"]).sum())
+        if unpriced:
+            print(f"\n{unpriced} positions without a fresh mark price (stream_markprices not running?)")
@@ -0,0 +1,37 @@
+import asyncio
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+import websockets
+
+FIXTURE = Path(__file__).resolve().parents[2] / "fixtures" / "markprice_frames.jsonl"
+
+
+class Command(BaseCommand):
+    help = "Local WebSocket server that replays recorded !markPrice@arr frames"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--frames", default=str(FIXTURE), help="JSON-lines file, one frame per line")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds between frames")
+        parser.add_argument("--loop", action="store_true", help="Start over after the last frame")
+
+    def handle(self, *args, **options):
+        frames = [
+            line for line in Path(options["frames"]).read_text().splitlines() if line.strip()
+        ]
+        print(f"▶ replaying {len(frames)} frames on ws://{options['host']}:{options['port']}/")
+        asyncio.run(self.serve(frames, options))
+
+    async def serve(self, frames, options):
+        async def replay(ws):
+            while True:
+                for frame in frames:
+                    await ws.send(frame)
+                    await asyncio.sleep(options["interval"])
+                if not options["loop"]:
+                    return
+
+        async with websockets.serve(replay, options["host"], options["port"]):
+            await asyncio.Future()
@@ -0,0 +1,136 @@
+from decimal import Decimal
+from pathlib import Path
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from futures import replay
+from futures.models import FuturesPosition
+from wallet import ledger
+from wallet.models import LedgerEntry
+
+FIXTURE = Path(__file__).resolve().parents[2] / "fixtures" / "markprice_frames.jsonl"
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay recorded mark prices / klines through the futures engines on a virtual clock, "
+        "as fast as possible, with a seeded trading scenario (rolled back)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--frames", action="append", default=[],
+            help="recorded !markPrice@arr frames, JSON lines (stream_markprices --record); repeatable",
+        )
+        parser.add_argument(
+            "--klines", action="append", default=[], metavar="SYMBOL=PATH",
+            help="klines of one symbol, Binance REST .json or data.binance.vision .csv; repeatable",
+        )
+        parser.add_argument("--loop", type=int, default=1, help="play the feed this many times in a row")
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--positions", type=int, default=2000, help="market opens over the feed")
+        parser.add_argument("--orders", type=int, default=500, help="limit orders over the feed")
+        parser.add_argument("--closes", type=float, default=0.3, help="share of positions their owner closes")
+        parser.add_argument("--cross", type=float, default=0.3, help="share of users in cross margin")
+        parser.add_argument("--balance", type=Decimal, default=Decimal("10000"))
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--speed", type=float, default=0, help="x real time (0 = as fast as possible)")
+        parser.add_argument("--expect", help="fail unless the end state has this digest (regression runs)")
+
+    def handle(self, *args, **options):
+        frames = self.feed(options)
+        if not frames:
+            raise CommandError("the feed has no ticks")
+
+        scenario = replay.Scenario(
+            frames, options["users"], options["positions"], options["orders"],
+            options["closes"], options["cross"], options["seed"],
+        )
+        print(f"▶ {len(frames):,} frames, {len(scenario.symbols)} symbols, "
+              f"{(frames[-1][0] - frames[0][0]) / 1000:,.0f} s of market time")
+
+        with transaction.atomic():
+            # the engines load every open position / order / trigger in the DB, not only the replay's
+            others = FuturesPosition.objects.filter(status=FuturesPosition.OPEN).count()
+            if others:
+                print(f"⚠️ {others:,} positions already open in this DB: the engines replay them too (rolled back)")
+
+            run = replay.Replay(frames, scenario, options["balance"], options["speed"]).run()
+            self.report(run)
+            digest = run.digest()
+            self.verify(run)
+            transaction.set_rollback(True)
+
+        print(f"digest {digest}")
+        if options["expect"] and options["expect"] != digest:
+            raise CommandError(f"end state differs from {options['expect']}")
+
+    def feed(self, options):
+        frames = []
+        for path in options["frames"] or ([] if options["klines"] else [FIXTURE]):
+            frames += replay.read_frames(path)
+
+        sources = []
+        for source in options["klines"]:
+            symbol, _, path = source.partition("=")
+            if not path:
+                raise CommandError("--klines takes SYMBOL=PATH")
+            sources.append((symbol.upper(), path))
+        if sources:
+            frames += replay.kline_frames(sources)
+
+        frames.sort(key=lambda frame: frame[0])
+        return replay.repeat(frames, options["loop"])
+
+    def report(self, run):
+        c, t = run.counts, run.timings
+        total = t["total"]
+        market = (run.frames[-1][0] - run.frames[0][0]) / 1000
+        processed = sum(c[k] for k in (
+            "opened", "closed", "filled", "triggered", "liquidated", "cross_liquidated", "funding_payments"
+        ))
+
+        print(f"✅ replayed in {total:.2f} s ({market / total:,.0f}x real time)" if total else "✅ replayed")
+        print(f"   {c['ticks'] / total:,.0f} ticks/s, {c['frames'] / total:,.0f} frames/s, "
+              f"{processed / total:,.0f} positions processed/s")
+        print("   wall time: " + ", ".join(
+            f"{name} {t[name]:.2f} s" for name in ("scenario", *replay.STAGES)
+        ))
+        print(f"   opened {c['opened']:,}, limit orders {c['orders']:,} (filled {c['filled']:,}), "
+              f"rejected {c['rejected']:,}")
+        print(f"   closed by owner {c['closed']:,}, TP/SL {c['triggered']:,}, liquidated {c['liquidated']:,}, "
+              f"cross {c['cross_liquidated']:,} in {c['cross_accounts']:,} accounts")
+        print(f"   funding: {c['funding_rounds']} rounds, {c['funding_payments']:,} payments")
+
+        balances = run.wallets()
+        start = run.balance * len(balances)
+        end = sum(balances, Decimal("0"))
+        print(f"   end state: {run.outcome()}")
+        print(f"   wallets: {start:,.2f} → {end:,.2f} (median {statistics.median(balances):,.2f}, "
+              f"min {min(balances):,.2f}, max {max(balances):,.2f})")
+
+    def verify(self, run):
+        """ Every wallet is exactly what its ledger books, and none went negative """
+        balances = run.wallets()
+        if min(balances) < 0:
+            raise CommandError("a wallet went negative")
+
+        booked = {
+            user_id: ledger.rounded(ledger.FUTURES, total)
+            for user_id, total in LedgerEntry.objects.filter(user_id__in=run.user_ids, account=ledger.FUTURES)
+            .values("user_id").annotate(total=Sum("amount")).values_list("user_id", "total")
+        }
+        # movements are rounded to the wallet column before they are booked: no drift
+        off = [
+            (user_id, balance, booked.get(user_id, 0))
+            for user_id, balance in zip(run.user_ids, balances)
+            if balance != booked.get(user_id, 0)
+        ]
+        print(f"   ledger: {sum(booked.values(), Decimal('0')):,.8f} booked, {len(off)} wallets off")
+        for user_id, balance, total in off[:20]:
+            print(f"❌ user {user_id}: wallet {balance}, ledger {total}")
+        if off:
+            raise CommandError(f"{len(off)} wallets don't match the ledger")
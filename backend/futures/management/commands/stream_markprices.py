@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import websockets
+
+from futures.funding import FundingEngine
+from futures.liquidation import LiquidationEngine
+from futures.markprice import apply_frame, writer
+from futures.orderbook import OrderEngine
+from futures.risk import RiskEngine, writer as risk_writer
+from futures.triggers import TriggerEngine
+from futures.valuation import ValuationEngine, writer as exposure_writer
+
+
+class Command(BaseCommand):
+    help = "Subscribe to the Binance !markPrice@arr stream and keep the mark-price table current"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default=settings.BINANCE_MARK_PRICE_WS,
+            help="WebSocket URL (point at `manage.py markprice_stub` for local runs)",
+        )
+        parser.add_argument(
+            "--record",
+            metavar="PATH",
+            help="Also append every raw frame to PATH (JSON lines) for replay",
+        )
+        parser.add_argument(
+            "--max-frames",
+            type=int,
+            default=0,
+            help="Exit after this many frames (0 = run forever)",
+        )
+        parser.add_argument(
+            "--no-liquidations",
+            action="store_true",
+            help="Only keep the table current: no liquidations, TP/SL, limit-order fills, funding, cross risk or exposure",
+        )
+
+    def handle(self, *args, **options):
+        asyncio.run(self.stream(options))
+
+    async def stream(self, options):
+        table = writer()
+        record = open(options["record"], "a") if options["record"] else None
+        frames = 0
+        backoff = 1
+
+        liquidations = triggers = orders = funding = cross = valuation = None
+        if not options["no_liquidations"]:
+            funding = FundingEngine()
+
+            orders = OrderEngine()
+            count = await sync_to_async(orders.load)()
+            print(f"✅ ORDER BOOKS: {count} open limit orders")
+
+            triggers = TriggerEngine()
+            count = await sync_to_async(triggers.load)()
+            print(f"✅ TRIGGER ENGINE: {count} active TP/SL orders")
+
+            liquidations = LiquidationEngine()
+            count = await sync_to_async(liquidations.load)()
+            print(f"✅ LIQUIDATION ENGINE: {count} open positions")
+
+            cross = RiskEngine(risk_writer())
+            count = await sync_to_async(cross.load)()
+            print(f"✅ RISK ENGINE: {count} cross-margin accounts")
+
+            valuation = ValuationEngine(exposure_writer())
+            count = await sync_to_async(valuation.load)()
+            print(f"✅ VALUATION: {count} open positions")
+
+        try:
+            while True:
+                try:
+                    async with websockets.connect(options["url"]) as ws:
+                        print("✅ MARK PRICE STREAM CONNECTED:", options["url"])
+                        backoff = 1
+
+                        async for message in ws:
+                            ticks = apply_frame(message, table)
+                            frames += 1
+
+                            if liquidations is not None:
+                                filled = await sync_to_async(orders.on_ticks)(ticks)
+                                if filled:
+                                    print(f"✅ FILLED {len(filled)} limit orders:", list(filled)[:20])
+
+                                # TP/SL first: a stop is there to avoid the liquidation
+                                closed = await sync_to_async(triggers.on_ticks)(ticks)
+                                if closed:
+                                    print(f"✅ TRIGGERED {len(closed)} positions:", list(closed)[:20])
+
+                                liquidated = await sync_to_async(liquidations.on_ticks)(ticks)
+                                if liquidated:
+                                    print(f"⚠️ LIQUIDATED {len(liquidated)} positions:",
+                                          [pid for pid, _ in liquidated][:20])
+
+                                accounts = await sync_to_async(cross.on_ticks)(ticks)
+                                if accounts:
+                                    print(f"⚠️ LIQUIDATED {len(accounts)} cross accounts:", list(accounts)[:20])
+
+                                funded = await sync_to_async(funding.on_ticks)(ticks)
+                                for r in funded:
+                                    print(f"✅ FUNDING {r.symbol} {r.rate} @ {r.funding_time:%Y-%m-%d %H:%M}: "
+                                          f"{r.positions} positions, longs paid {r.paid_by_longs}")
+
+                                # after the closes above: exposure of what is still open
+                                await sync_to_async(valuation.on_ticks)(ticks)
+
+                            if record:
+                                record.write(json.dumps(json.loads(message)) + "\n")
+
+                            if options["max_frames"] and frames >= options["max_frames"]:
+                                return
+                except (OSError, websockets.WebSocketException) as e:
+                    print("❌ MARK PRICE STREAM ERROR:", e)
+
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+        finally:
+            if orders is not None:
+                await sync_to_async(orders.flush)()
+            if valuation is not None:
+                valuation.flush()
+            if record:
+                record.close()
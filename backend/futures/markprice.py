@@ -0,0 +1,160 @@
+# futures/markprice.py
+#
+# Mark-price table fed by the Binance `!markPrice@arr` stream
+# (python manage.py stream_markprices). Every futures price read goes
+# through get_mark_price() / aget_mark_price(): a fresh table entry when
+# the stream is up, a bounded REST call when it is not.
+
+from decimal import Decimal
+import json
+import time
+
+from django.conf import settings
+
+from core import upstream
+from markets.pricetable import SharedTable
+
+
+class MarkPriceTable(SharedTable):
+    """ Binance symbol -> latest mark price; the record seq is its version """
+
+    MAGIC = b"CFM1"
+    KEY_SIZE = 24
+    TAG_SIZE = 8
+    FIELDS = (
+        "mark_price",
+        "index_price",
+        "funding_rate",
+        "next_funding_time",
+        "event_time",
+        "updated_at",
+    )
+
+
+# ===================== STREAM FRAMES =====================
+
+def parse_frame(message):
+    """
+    [(symbol, {field: value})] from one `!markPrice@arr` message.
+    Accepts the raw array and the combined-stream {"data": [...]} wrapper.
+    """
+    data = json.loads(message) if isinstance(message, (str, bytes)) else message
+    if isinstance(data, dict):
+        data = data.get("data", [data])
+
+    now = time.time()
+    ticks = []
+    for u in data:
+        if u.get("e") != "markPriceUpdate" or not u.get("s"):
+            continue
+        ticks.append((u["s"], {
+            "mark_price": u.get("p"),
+            "index_price": u.get("i"),
+            "funding_rate": u.get("r") or None,
+            "next_funding_time": u.get("T"),
+            "event_time": u.get("E"),
+            "updated_at": now,
+        }))
+    return ticks
+
+
+def apply_frame(message, table=None):
+    """ Write one stream message into the table, returns the parsed ticks """
+    ticks = parse_frame(message)
+    (table or writer()).upsert(
+        [(symbol, None, values) for symbol, values in ticks]
+    )
+    return ticks
+
+
+# ===================== READS =====================
+
+def get_mark_price(symbol, max_age=None):
+    """
+    Decimal mark price for a Binance futures symbol, or None.
+    Table entries older than MARK_PRICE_MAX_AGE fall back to Binance REST.
+    """
+    symbol = symbol.upper()
+    price = table_mark_price(symbol, max_age)
+    return price if price is not None else rest_mark_price(symbol)
+
+
+async def aget_mark_price(symbol, max_age=None):
+    """ get_mark_price() for async views """
+    symbol = symbol.upper()
+    price = table_mark_price(symbol, max_age)
+    return price if price is not None else await arest_mark_price(symbol)
+
+
+def table_mark_price(symbol, max_age=None):
+    """ Mark price from the table if younger than max_age seconds, else None """
+    max_age = settings.MARK_PRICE_MAX_AGE if max_age is None else max_age
+
+    table = reader()
+    values = table.values(symbol) if table else None
+    if values and time.time() - values[5] <= max_age:
+        return Decimal(repr(values[0]))
+    return None
+
+
+def listed(symbol):
+    """ True if the stream has ever priced this symbol (the engines only match those) """
+    table = reader()
+    return table is not None and table.version(symbol.upper()) > 0
+
+
+def rest_mark_price(symbol):
+    """ Binance /premiumIndex mark price within the binance upstream deadline """
+    try:
+        data = upstream.get(
+            "binance",
+            f"{settings.BINANCE_FAPI_URL}/fapi/v1/premiumIndex",
+            params={"symbol": symbol},
+            name="/fapi/v1/premiumIndex",
+        )
+        return Decimal(data["markPrice"])
+    except (upstream.UpstreamError, KeyError) as e:
+        print("❌ BINANCE MARK PRICE ERROR:", symbol, e)
+        return None
+
+
+async def arest_mark_price(symbol):
+    try:
+        data = await upstream.aget(
+            "binance",
+            f"{settings.BINANCE_FAPI_URL}/fapi/v1/premiumIndex",
+            params={"symbol": symbol},
+            name="/fapi/v1/premiumIndex",
+        )
+        return Decimal(data["markPrice"])
+    except (upstream.UpstreamError, KeyError) as e:
+        print("❌ BINANCE MARK PRICE ERROR:", symbol, e)
+        return None
+
+
+# ===================== PROCESS-WIDE HANDLES =====================
+
+_reader = None
+_writer = None
+
+
+def reader():
+    """ Read-only handle, or None until the stream has created the file """
+    global _reader
+    if _reader is None:
+        try:
+            _reader = MarkPriceTable(settings.MARK_PRICE_TABLE_PATH)
+        except (FileNotFoundError, ValueError):
+            return None
+    return _reader
+
+
+def writer():
+    global _writer
+    if _writer is None:
+        _writer = MarkPriceTable(
+            settings.MARK_PRICE_TABLE_PATH,
+            capacity=settings.MARK_PRICE_TABLE_CAPACITY,
+            writable=True,
+        )
+    return _writer
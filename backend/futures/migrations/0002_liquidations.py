@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:00
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('futures', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='futuresposition',
+            name='status',
+            field=models.CharField(choices=[('OPEN', 'Open'), ('CLOSED', 'Closed'), ('LIQUIDATED', 'Liquidated')], default='OPEN', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='futureswallet',
+            name='balance',
+            field=models.DecimalField(decimal_places=2, default=Decimal('10000.00'), max_digits=20),
+        ),
+        migrations.AlterField(
+            model_name='futureswallet',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='futures_wallet', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='futuresposition',
+            index=models.Index(fields=['status', 'opened_at'], name='futures_fut_status_8b98bd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='futuresposition',
+            index=models.Index(fields=['closed_at'], name='futures_fut_closed__b93b90_idx'),
+        ),
+    ]
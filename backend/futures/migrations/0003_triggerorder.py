@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('futures', '0002_liquidations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TriggerOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20)),
+                ('kind', models.CharField(choices=[('TAKE_PROFIT', 'Take profit'), ('STOP_LOSS', 'Stop loss'), ('TRAILING_STOP', 'Trailing stop')], max_length=15)),
+                ('trigger_price', models.DecimalField(decimal_places=8, max_digits=20)),
+                ('callback_rate', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('peak', models.DecimalField(blank=True, decimal_places=8, max_digits=20, null=True)),
+                ('status', models.CharField(choices=[('ACTIVE', 'Active'), ('TRIGGERED', 'Triggered'), ('CANCELLED', 'Cancelled')], default='ACTIVE', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('position', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='triggers', to='futures.futuresposition')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='futures_tri_status_f64bdf_idx'), models.Index(fields=['finished_at'], name='futures_tri_finishe_fc3d89_idx')],
+            },
+        ),
+    ]
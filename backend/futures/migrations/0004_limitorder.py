@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('futures', '0003_triggerorder'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LimitOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20)),
+                ('side', models.CharField(choices=[('LONG', 'Long'), ('SHORT', 'Short')], max_length=5)),
+                ('price', models.DecimalField(decimal_places=8, max_digits=20)),
+                ('margin', models.DecimalField(decimal_places=8, max_digits=20)),
+                ('leverage', models.IntegerField(default=10)),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('FILLED', 'Filled'), ('CANCELLED', 'Cancelled')], default='OPEN', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='futuresposition',
+            name='limit_order',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='position', to='futures.limitorder'),
+        ),
+        migrations.AddIndex(
+            model_name='limitorder',
+            index=models.Index(fields=['status', 'created_at'], name='futures_lim_status_c3b758_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='limitorder',
+            index=models.Index(fields=['finished_at'], name='futures_lim_finishe_8bc9bf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='limitorder',
+            index=models.Index(fields=['user', 'status'], name='futures_lim_user_id_e599af_idx'),
+        ),
+    ]
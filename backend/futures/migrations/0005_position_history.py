@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('futures', '0004_limitorder'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='futuresposition',
+            index=models.Index(fields=['user', 'status', 'closed_at', 'id'], name='futures_fut_user_id_ffc6ae_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='futuresposition',
+            index=models.Index(condition=models.Q(('status', 'OPEN')), fields=['user', 'id'], name='futures_position_open_idx'),
+        ),
+    ]
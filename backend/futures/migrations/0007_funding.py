@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('futures', '0006_positionarchive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='futuresposition',
+            name='accrued_funding',
+            field=models.DecimalField(decimal_places=8, default=0, max_digits=20),
+        ),
+        migrations.CreateModel(
+            name='FundingRound',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20)),
+                ('funding_time', models.DateTimeField()),
+                ('rate', models.DecimalField(decimal_places=8, max_digits=12)),
+                ('mark_price', models.DecimalField(decimal_places=8, max_digits=20)),
+                ('positions', models.IntegerField(default=0)),
+                ('paid_by_longs', models.DecimalField(decimal_places=8, default=0, max_digits=30)),
+                ('settled_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('symbol', 'funding_time')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('futures', '0007_funding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='futuresposition',
+            name='margin_mode',
+            field=models.CharField(choices=[('ISOLATED', 'Isolated'), ('CROSS', 'Cross')], default='ISOLATED', max_length=8),
+        ),
+        migrations.AddField(
+            model_name='futureswallet',
+            name='margin_mode',
+            field=models.CharField(choices=[('ISOLATED', 'Isolated'), ('CROSS', 'Cross')], default='ISOLATED', max_length=8),
+        ),
+    ]
@@ -6,6 +6,14 @@ from decimal import Decimal
 
 
 class FuturesWallet(models.Model):
+    ISOLATED = "ISOLATED"
+    CROSS = "CROSS"
+
+    MARGIN_MODE_CHOICES = [
+        (ISOLATED, "Isolated"),
+        (CROSS, "Cross"),
+    ]
+
     user = models.OneToOneField(
         User,
         on_delete=models.CASCADE,
@@ -19,6 +27,9 @@ class FuturesWallet(models.Model):
         default=Decimal("10000.00")
     )
 
+    # mode of the positions opened from now on; only switched while flat
+    margin_mode = models.CharField(max_length=8, choices=MARGIN_MODE_CHOICES, default=ISOLATED)
+
     def __str__(self):
         return f"{self.user.username} Futures Wallet (${self.balance})"
 
@@ -34,10 +45,12 @@ class FuturesPosition(models.Model):
 
     OPEN = "OPEN"
     CLOSED = "CLOSED"
+    LIQUIDATED = "LIQUIDATED"
 
     STATUS_CHOICES = [
         (OPEN, "Open"),
         (CLOSED, "Closed"),
+        (LIQUIDATED, "Liquidated"),
     ]
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -57,5 +70,179 @@ class FuturesPosition(models.Model):
     pnl = models.DecimalField(max_digits=20, decimal_places=8, default=0)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=OPEN)
 
+    # funding received (+) / paid (-) while open, already in the wallet (futures/funding.py)
+    accrued_funding = models.DecimalField(max_digits=20, decimal_places=8, default=0)
+
+    # ISOLATED: liquidated alone at liquidation_price (futures/liquidation.py).
+    # CROSS: backed by the whole wallet, liquidated with the user's other
+    # cross positions when the account's margin ratio reaches 100%
+    # (futures/risk.py); liquidation_price is then only the isolated bound.
+    margin_mode = models.CharField(
+        max_length=8, choices=FuturesWallet.MARGIN_MODE_CHOICES, default=FuturesWallet.ISOLATED
+    )
+
+    # set when the position was opened by a limit-order fill
+    limit_order = models.OneToOneField(
+        "LimitOrder", null=True, blank=True, on_delete=models.SET_NULL, related_name="position"
+    )
+
+    class Meta:
+        indexes = [
+            # incremental sync of the liquidation engine (futures/liquidation.py)
+            models.Index(fields=["status", "opened_at"]),
+            models.Index(fields=["closed_at"]),
+            # trade history: keyset pages on (closed_at, id) per user and status
+            models.Index(fields=["user", "status", "closed_at", "id"]),
+            # a user's open positions, however many closed ones they have
+            models.Index(
+                fields=["user", "id"], condition=models.Q(status="OPEN"), name="futures_position_open_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.symbol} {self.side}"
+
+class TriggerOrder(models.Model):
+    """ Take-profit / stop-loss / trailing stop closing a position (futures/triggers.py) """
+
+    TAKE_PROFIT = "TAKE_PROFIT"
+    STOP_LOSS = "STOP_LOSS"
+    TRAILING_STOP = "TRAILING_STOP"
+
+    KIND_CHOICES = [
+        (TAKE_PROFIT, "Take profit"),
+        (STOP_LOSS, "Stop loss"),
+        (TRAILING_STOP, "Trailing stop"),
+    ]
+
+    ACTIVE = "ACTIVE"
+    TRIGGERED = "TRIGGERED"
+    CANCELLED = "CANCELLED"
+
+    STATUS_CHOICES = [
+        (ACTIVE, "Active"),
+        (TRIGGERED, "Triggered"),
+        (CANCELLED, "Cancelled"),
+    ]
+
+    position = models.ForeignKey(FuturesPosition, on_delete=models.CASCADE, related_name="triggers")
+    symbol = models.CharField(max_length=20)
+    kind = models.CharField(max_length=15, choices=KIND_CHOICES)
+
+    # the stop of a trailing order follows its best price seen (peak for a
+    # long, trough for a short) at callback_rate percent
+    trigger_price = models.DecimalField(max_digits=20, decimal_places=8)
+    callback_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    peak = models.DecimalField(max_digits=20, decimal_places=8, null=True, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=ACTIVE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["finished_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.position_id} {self.kind} @ {self.trigger_price}"
+
+
+class FundingRound(models.Model):
+    """ One funding settlement of one symbol (futures/funding.py); unique, so it is never paid twice """
+
+    symbol = models.CharField(max_length=20)
+    funding_time = models.DateTimeField()
+    rate = models.DecimalField(max_digits=12, decimal_places=8)
+    mark_price = models.DecimalField(max_digits=20, decimal_places=8)
+
+    positions = models.IntegerField(default=0)
+    # paid by the longs (negative: received by them) = received by the shorts
+    paid_by_longs = models.DecimalField(max_digits=30, decimal_places=8, default=0)
+    settled_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("symbol", "funding_time")
+
+    def __str__(self):
+        return f"{self.symbol} funding {self.rate} @ {self.funding_time}"
+
+
+class LimitOrder(models.Model):
+    """ Resting limit order, matched by futures/orderbook.py; margin is reserved when placed """
+
+    OPEN = "OPEN"
+    FILLED = "FILLED"
+    CANCELLED = "CANCELLED"
+
+    STATUS_CHOICES = [
+        (OPEN, "Open"),
+        (FILLED, "Filled"),
+        (CANCELLED, "Cancelled"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    symbol = models.CharField(max_length=20)
+    side = models.CharField(max_length=5, choices=FuturesPosition.SIDE_CHOICES)
+
+    price = models.DecimalField(max_digits=20, decimal_places=8)
+    margin = models.DecimalField(max_digits=20, decimal_places=8)
+    leverage = models.IntegerField(default=10)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=OPEN)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["finished_at"]),
+            models.Index(fields=["user", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.symbol} {self.side} @ {self.price}"
+
+
+class PositionArchive(models.Model):
+    """
+    One user's positions closed on one (UTC) day, moved out of
+    FuturesPosition by futures/archive.py, with that day's rollup
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+
+    # zlib-compressed JSON columns of the archived rows (archive.FIELDS)
+    positions = models.BinaryField(default=b"")
+
+    closed = models.IntegerField(default=0)
+    liquidated = models.IntegerField(default=0)
+    volume = models.DecimalField(max_digits=30, decimal_places=8, default=0)   # entry notional
+    pnl = models.DecimalField(max_digits=30, decimal_places=8, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("user", "day")
+
+    def __str__(self):
+        return f"{self.user.username} positions of {self.day}"
+
+
+class StreamTicket(models.Model):
+    """
+    Short-lived, single-use key for opening the account stream
+    (futures/stream.py): it goes in the EventSource URL instead of the
+    access token, so access logs never hold a usable credential
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    expires_at = models.DateTimeField()
+    # the stream ends with the access token the ticket was issued for
+    stream_until = models.DateTimeField()
+
     def __str__(self):
-        return f"{self.user.username} {self.symbol} {self.side}"
\ No newline at end of file
+        return f"{self.user.username} stream ticket"
@@ -0,0 +1,239 @@
+# futures/orderbook.py
+#
+# Limit-order matching, run inside `manage.py stream_markprices` next to
+# the trigger and liquidation engines.
+#
+# Each symbol has an OrderBook with two sides of price levels: a sorted
+# list of level keys plus a FIFO deque of orders per level. Keys are
+# signed (bids +price, asks -price) so that on both sides the best level
+# is the last key and a side is crossed while keys[-1] >= sign * mark:
+# matching pops whole levels off the end, O(levels crossed + orders
+# filled). A buy fills when the mark falls to its price, a sell when the
+# mark rises to it, always at the order's own price.
+#
+# Orders are placed / cancelled in the DB by the web workers (margin is
+# reserved there) and picked up by sync(). Fills are written behind:
+# queued in memory and settled in batches by settlement.fill_orders(),
+# which skips orders cancelled in the meantime. On restart the books are
+# rebuilt from the OPEN orders in one pass.
+
+from bisect import insort
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from . import clock, settlement
+from .models import FuturesPosition, LimitOrder
+
+
+class Order:
+    __slots__ = ("id", "user_id", "symbol", "side", "price", "key")
+
+    def __init__(self, id, user_id, symbol, side, price):
+        self.id = id
+        self.user_id = user_id
+        self.symbol = symbol
+        self.side = side
+        self.price = price       # Decimal, the fill price
+        self.key = float(price) * (1 if side == FuturesPosition.LONG else -1)
+
+
+class BookSide:
+    __slots__ = ("sign", "keys", "levels")
+
+    def __init__(self, sign):
+        self.sign = sign
+        self.keys = []           # ascending, best level last
+        self.levels = {}         # key -> deque of orders, oldest first
+
+    def add(self, order):
+        level = self.levels.get(order.key)
+        if level is None:
+            insort(self.keys, order.key)
+            level = self.levels[order.key] = deque()
+        level.append(order)
+
+    def crossed(self, mark):
+        """ Pop every level crossed by mark, best first """
+        threshold = self.sign * mark
+        keys, levels = self.keys, self.levels
+        popped = []
+        while keys and keys[-1] >= threshold:
+            popped.append(levels.pop(keys.pop()))
+        return popped
+
+    def bulk_load(self, orders):
+        """ Replace the side with orders (oldest first), sorting once """
+        self.levels = {}
+        for order in orders:
+            level = self.levels.get(order.key)
+            if level is None:
+                level = self.levels[order.key] = deque()
+            level.append(order)
+        self.keys = sorted(self.levels)
+
+
+class OrderBook:
+    """ Resting limit orders of one symbol """
+
+    __slots__ = ("bids", "asks")
+
+    def __init__(self):
+        self.bids = BookSide(1)
+        self.asks = BookSide(-1)
+
+    def side(self, side):
+        return self.bids if side == FuturesPosition.LONG else self.asks
+
+    def match(self, mark, live):
+        """
+        (orders filled at this mark, entries popped); orders missing from
+        live (cancelled) are dropped
+        """
+        filled, popped = [], 0
+        for side in (self.bids, self.asks):
+            for level in side.crossed(mark):
+                popped += len(level)
+                for order in level:
+                    if live.pop(order.id, None) is not None:
+                        filled.append(order)
+        return filled, popped
+
+
+class OrderEngine:
+    def __init__(self):
+        self.books = {}          # symbol -> OrderBook
+        self.live = {}           # order id -> Order still resting
+        self.entries = 0         # orders in the levels, cancelled ones included
+        self.pending = []        # filled, not written yet
+        self.synced_at = None
+        self.next_sync = 0
+        self.next_flush = 0
+
+    def book(self, symbol):
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = OrderBook()
+        return book
+
+    def add(self, order):
+        if order.id in self.live:
+            return
+        self.live[order.id] = order
+        self.entries += 1
+        self.book(order.symbol).side(order.side).add(order)
+
+    def cancel(self, order_id):
+        """ Lazy: the order stays in its level and is skipped when reached """
+        return self.live.pop(order_id, None)
+
+    def match(self, symbol, mark):
+        book = self.books.get(symbol)
+        if book is None:
+            return []
+        filled, popped = book.match(mark, self.live)
+        self.entries -= popped
+        self.pending += filled
+        return filled
+
+    # ===================== LOADING =====================
+
+    def load(self):
+        """ Rebuild every book from the OPEN orders (startup) """
+        self.synced_at = timezone.now()
+        self.live = {
+            row[0]: Order(*row) for row in _open().order_by("id").iterator(chunk_size=10000)
+        }
+        self.rebuild()
+        self.next_sync = clock.monotonic() + settings.LIQUIDATION_SYNC_INTERVAL
+        return len(self.live)
+
+    def rebuild(self):
+        """ Books from the live orders only, sorting each side once """
+        by_side = {}
+        for order in self.live.values():     # insertion order: oldest first
+            by_side.setdefault((order.symbol, order.side), []).append(order)
+
+        self.books = {}
+        for (symbol, side), orders in by_side.items():
+            self.book(symbol).side(side).bulk_load(orders)
+        self.entries = len(self.live)
+
+    def sync(self):
+        """ Pick up orders placed / cancelled since the last sync """
+        now = timezone.now()
+        since = self.synced_at - timedelta(seconds=settings.LIQUIDATION_SYNC_OVERLAP)
+
+        for row in _open().filter(created_at__gte=since).order_by("id"):
+            order = Order(*row)
+            if order.id not in self.live and not self._filled(order.id):
+                self.add(order)
+
+        cancelled = LimitOrder.objects.filter(
+            finished_at__gte=since, status=LimitOrder.CANCELLED
+        ).values_list("id", flat=True)
+        for order_id in cancelled:
+            self.cancel(order_id)
+
+        # cancelled orders far from the mark are never popped
+        if self.entries - len(self.live) > max(1024, len(self.live)):
+            self.rebuild()
+
+        self.synced_at = now
+        self.next_sync = clock.monotonic() + settings.LIQUIDATION_SYNC_INTERVAL
+
+    def flush(self):
+        """ Write the queued fills (positions + FILLED orders) in one transaction """
+        self.next_flush = clock.monotonic() + settings.LIMIT_ORDER_FLUSH_INTERVAL
+        if not self.pending:
+            return {}
+
+        pending, self.pending = self.pending, []
+        try:
+            return settlement.fill_orders([order.id for order in pending])
+        except Exception as e:
+            # back to the queue, the next flush retries
+            print("❌ LIMIT ORDER SETTLEMENT ERROR:", e)
+            self.pending = pending + self.pending
+            return {}
+
+    # ===================== TICKS =====================
+
+    def on_ticks(self, ticks):
+        """
+        Match a batch of (symbol, {"mark_price"}) ticks. Fills are flushed
+        every LIMIT_ORDER_FLUSH_INTERVAL / LIMIT_ORDER_FLUSH_BATCH; returns
+        {order id: position id} of the fills written by this call.
+        """
+        now = clock.monotonic()
+        if self.synced_at is not None and now >= self.next_sync:
+            self.flush()
+            try:
+                self.sync()
+            except DatabaseError as e:
+                # next_sync is left as it was: the next tick retries
+                print("❌ ORDER BOOK SYNC ERROR:", e)
+
+        for symbol, values in ticks:
+            if values.get("mark_price") is not None:
+                self.match(symbol, float(values["mark_price"]))
+
+        if self.pending and (
+            now >= self.next_flush or len(self.pending) >= settings.LIMIT_ORDER_FLUSH_BATCH
+        ):
+            return self.flush()
+        return {}
+
+    def _filled(self, order_id):
+        """ Still queued for writing (the DB says OPEN until the flush) """
+        return any(order.id == order_id for order in self.pending)
+
+
+# -------- helper --------
+def _open():
+    return LimitOrder.objects.filter(status=LimitOrder.OPEN).values_list(
+        "id", "user_id", "symbol", "side", "price"
+    )
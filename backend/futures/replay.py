@@ -0,0 +1,367 @@
+# futures/replay.py
+#
+# Deterministic market replay (`manage.py replay_market`). A recorded
+# feed goes through the same pipeline as `manage.py stream_markprices`:
+# limit-order matching, TP/SL, isolated liquidations, the cross-margin
+# risk engine and funding. A seeded scenario of fake users meanwhile
+# opens positions (views.parse_open + settlement.batch, as the API
+# does), places limit orders and closes positions.
+#
+# Feeds:
+#   read_frames()   `stream_markprices --record` / markprice_stub files,
+#                   one !markPrice@arr frame per line
+#   read_klines()   Binance klines (REST JSON arrays or data.binance.vision
+#                   CSV) of one symbol, each bar replayed as 4 ticks:
+#                   open, low / high (in the bar's direction), close
+#
+# Time is a futures.clock.VirtualClock moved to every frame's event time,
+# so the engines' sync intervals, funding times and every DB timestamp
+# follow the recording. Nothing waits on the wall clock, and the same
+# feed + seed ends in the same balances (digest()).
+
+from collections import defaultdict
+from decimal import Decimal
+import csv
+import hashlib
+import heapq
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.db.models import Count
+import numpy as np
+
+from wallet import ledger
+from wallet.models import LedgerEntry
+
+from . import clock, settlement
+from .fixedpoint import QUANTUM
+from .funding import FundingEngine
+from .liquidation import LiquidationEngine
+from .markprice import parse_frame
+from .models import FuturesPosition, FuturesWallet, LimitOrder
+from .orderbook import OrderEngine
+from .risk import RiskEngine
+from .triggers import TriggerEngine
+from .valuation import ValuationEngine
+from .views import parse_open
+
+# the engines, in stream_markprices order
+STAGES = ("orders", "triggers", "liquidations", "cross", "funding", "valuation")
+
+LEVERAGES = [2, 5, 10, 20, 50, 100]
+LEVERAGE_WEIGHTS = [0.15, 0.25, 0.3, 0.15, 0.1, 0.05]
+
+
+# ===================== FEEDS =====================
+
+def read_frames(path):
+    """ [(event time ms, ticks)] of a file of recorded !markPrice@arr frames """
+    frames = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            ticks = parse_frame(line)
+            times = [values["event_time"] for _, values in ticks if values["event_time"]]
+            if times:
+                frames.append((max(times), ticks))
+    frames.sort(key=lambda frame: frame[0])
+    return frames
+
+
+def read_klines(path, symbol):
+    """ [(time ms, symbol, price)] of one symbol's klines file, 4 ticks per bar """
+    with open(path) as f:
+        if str(path).endswith(".json"):
+            rows = json.load(f)
+        else:
+            # data.binance.vision CSVs, with or without the header line
+            rows = [row for row in csv.reader(f) if row and row[0].isdigit()]
+
+    ticks = []
+    for row in rows:
+        opened, closed = int(row[0]), int(row[6])
+        o, h, l, c = row[1:5]
+        step = (closed - opened) / 3
+        path = (o, l, h, c) if float(c) >= float(o) else (o, h, l, c)
+        ticks += [(int(opened + i * step), symbol, price) for i, price in enumerate(path)]
+    return ticks
+
+
+def kline_frames(sources):
+    """ [(event time ms, ticks)] merged from [(symbol, klines path)], one frame per timestamp """
+    frames = []
+    merged = heapq.merge(*(read_klines(path, symbol) for symbol, path in sources), key=lambda t: t[0])
+    for event_time, symbol, price in merged:
+        if not frames or frames[-1][0] != event_time:
+            frames.append((event_time, []))
+        frames[-1][1].append((symbol, {
+            "mark_price": str(price),
+            "index_price": None,
+            "funding_rate": None,
+            "next_funding_time": None,
+            "event_time": event_time,
+            "updated_at": event_time / 1000,
+        }))
+    return frames
+
+
+def repeat(frames, times):
+    """ The feed played times times in a row, each pass shifted after the previous one """
+    if times <= 1 or not frames:
+        return frames
+    gap = frames[1][0] - frames[0][0] if len(frames) > 1 else 1000
+    span = frames[-1][0] - frames[0][0] + gap
+
+    out = []
+    for n in range(times):
+        shift = n * span
+        for event_time, ticks in frames:
+            out.append((event_time + shift, [
+                (symbol, {
+                    **values,
+                    "event_time": values["event_time"] and values["event_time"] + shift,
+                    "next_funding_time": values["next_funding_time"] and values["next_funding_time"] + shift,
+                })
+                for symbol, values in ticks
+            ]))
+    return out
+
+
+# ===================== SCENARIO =====================
+
+class Scenario:
+    """ What the fake users do, drawn up front from the seed: {frame index: [action]} """
+
+    def __init__(self, frames, users, positions, orders, closes, cross, seed):
+        rnd = np.random.default_rng(seed)
+        self.users = users
+        self.cross = rnd.random(users) < cross
+        self.symbols = sorted({symbol for _, ticks in frames for symbol, _ in ticks})
+        self.actions = defaultdict(list)
+
+        # opens in the first 80% of the feed, closes by their owner after them
+        last = max(1, int(len(frames) * 0.8))
+        for i in range(positions):
+            at = int(rnd.integers(0, last))
+            self.actions[at].append(("open", i, self._order(rnd)))
+            if rnd.random() < closes and at + 1 < len(frames):
+                self.actions[int(rnd.integers(at + 1, len(frames)))].append(("close", i, None))
+
+        for i in range(orders):
+            order = self._order(rnd)
+            # resting 0.05-0.5% on the far side of the mark
+            order["offset"] = rnd.uniform(0.0005, 0.005)
+            self.actions[int(rnd.integers(0, last))].append(("order", i, order))
+
+    def _order(self, rnd):
+        long = bool(rnd.random() < 0.5)
+        order = {
+            "user": int(rnd.integers(0, self.users)),
+            "symbol": self.symbols[int(rnd.integers(0, len(self.symbols)))],
+            "side": "BUY" if long else "SELL",
+            "margin": round(float(10 ** rnd.uniform(1, 2.5)), 2),
+            "leverage": int(rnd.choice(LEVERAGES, p=LEVERAGE_WEIGHTS)),
+        }
+        # TP / SL as a share of the way to the liquidation price, trailing stop in %
+        kind = rnd.random()
+        if kind < 0.3:
+            order["tp"], order["sl"] = rnd.uniform(0.05, 0.5), rnd.uniform(0.1, 0.9)
+        elif kind < 0.4:
+            order["trailing"] = round(float(rnd.uniform(0.1, 2)), 2)
+        return order
+
+
+# ===================== REPLAY =====================
+
+class Replay:
+    def __init__(self, frames, scenario, balance, speed=0):
+        self.frames = frames
+        self.scenario = scenario
+        self.balance = balance
+        self.speed = speed                  # x real time, 0 = as fast as possible
+
+        self.clock = clock.VirtualClock(frames[0][0] / 1000 if frames else 0)
+        self.marks = {}
+        self.user_ids = []
+        self.positions = {}                 # scenario open index -> position id
+        self.counts = defaultdict(int)
+        self.timings = defaultdict(float)   # wall seconds per stage
+
+    def run(self):
+        """ Play the whole feed; call inside a transaction that is rolled back afterwards """
+        with clock.virtual(self.clock):
+            self.setup()
+            engines = {
+                "orders": OrderEngine(),
+                "triggers": TriggerEngine(),
+                "liquidations": LiquidationEngine(),
+                "cross": RiskEngine(),
+                "funding": FundingEngine(),
+                "valuation": ValuationEngine(),
+            }
+            for name, engine in engines.items():
+                if name != "funding":
+                    self.counts[f"loaded_{name}"] = engine.load()
+
+            started = time.perf_counter()
+            for i, (event_time, ticks) in enumerate(self.frames):
+                self.clock.advance(event_time / 1000)
+                if self.speed:
+                    self._pace(started, event_time)
+
+                for symbol, values in ticks:
+                    if values.get("mark_price") is not None:
+                        self.marks[symbol] = values["mark_price"]
+                for name in STAGES:
+                    self._stage(name, engines[name], ticks)
+                self._act(self.scenario.actions.get(i, ()))
+                self.counts["frames"] += 1
+                self.counts["ticks"] += len(ticks)
+
+            # whatever the engines still hold back
+            engines["orders"].flush()
+            engines["triggers"].flush()
+            self.timings["total"] = time.perf_counter() - started
+
+        # the order engine also flushes fills when it syncs: counted from the DB
+        self.counts["filled"] = LimitOrder.objects.filter(user_id__in=self.user_ids, status=LimitOrder.FILLED).count()
+        return self
+
+    def setup(self):
+        """ The fake users, their wallets (margin mode from the scenario) and opening ledger entries """
+        stamp = time.time_ns()
+        users = User.objects.bulk_create(
+            [User(username=f"replay-{stamp}-{i}") for i in range(self.scenario.users)], batch_size=5000
+        )
+        FuturesWallet.objects.bulk_create(
+            [
+                FuturesWallet(
+                    user=u, balance=self.balance,
+                    margin_mode=FuturesWallet.CROSS if cross else FuturesWallet.ISOLATED,
+                )
+                for u, cross in zip(users, self.scenario.cross.tolist())
+            ],
+            batch_size=5000,
+        )
+        ledger.record(ledger.entry(u.id, ledger.FUTURES, LedgerEntry.OPENING, self.balance) for u in users)
+        self.user_ids = [u.id for u in users]
+
+    # ===================== END STATE =====================
+
+    def wallets(self):
+        """ [balance] of the scenario users, in their order """
+        balances = dict(
+            FuturesWallet.objects.filter(user_id__in=self.user_ids).values_list("user_id", "balance")
+        )
+        return [balances[u] for u in self.user_ids]
+
+    def outcome(self):
+        """ {status: count} of the scenario's positions """
+        return dict(
+            FuturesPosition.objects.filter(user_id__in=self.user_ids)
+            .values("status").annotate(n=Count("id")).values_list("status", "n")
+        )
+
+    def digest(self):
+        """ sha256 of every end balance and position result, in scenario order (ids left out) """
+        rows = FuturesPosition.objects.filter(user_id__in=self.user_ids).order_by("id").values_list(
+            "user_id", "symbol", "side", "status", "pnl", "accrued_funding"
+        )
+        index = {u: i for i, u in enumerate(self.user_ids)}
+        state = {
+            "wallets": [str(b) for b in self.wallets()],
+            "positions": [[index[u], *map(str, rest)] for u, *rest in rows],
+        }
+        return hashlib.sha256(json.dumps(state, separators=(",", ":")).encode()).hexdigest()
+
+    # -------- helpers --------
+    def _stage(self, name, engine, ticks):
+        started = time.perf_counter()
+        result = engine.on_ticks(ticks)
+        self.timings[name] += time.perf_counter() - started
+
+        if name == "triggers":
+            self.counts["triggered"] += len(result)
+        elif name == "liquidations":
+            self.counts["liquidated"] += len(result)
+        elif name == "cross":
+            self.counts["cross_accounts"] += len(result)
+            self.counts["cross_liquidated"] += sum(len(ids) for ids in result.values())
+        elif name == "funding":
+            self.counts["funding_rounds"] += len(result)
+            self.counts["funding_payments"] += sum(r.positions for r in result)
+
+    def _act(self, actions):
+        """ One frame's scenario actions, at the frame's marks """
+        started = time.perf_counter()
+        opens = defaultdict(list)
+        closes = []
+        for kind, i, order in actions:
+            if kind == "close":
+                if i in self.positions:
+                    pos_id, symbol = self.positions[i]
+                    closes.append((pos_id, _decimal(self.marks[symbol]), None))
+                continue
+
+            mark = self.marks.get(order["symbol"])
+            if mark is None:
+                self.counts["rejected"] += 1
+                continue
+            user_id = self.user_ids[order["user"]]
+
+            if kind == "order":
+                sign = 1 if order["side"] == "BUY" else -1
+                price = _decimal(float(mark) * (1 - sign * order["offset"]))
+                placed = settlement.place_order(
+                    user_id, symbol=order["symbol"], side="LONG" if sign > 0 else "SHORT",
+                    price=price, margin=_decimal(order["margin"]), leverage=order["leverage"],
+                )
+                self.counts["orders" if placed else "rejected"] += 1
+                continue
+
+            try:
+                fields, parsed = parse_open(self._request(order, float(mark)), mark)
+            except ValueError:
+                self.counts["rejected"] += 1
+                continue
+            fields["margin_mode"] = (
+                FuturesWallet.CROSS if self.scenario.cross[order["user"]] else FuturesWallet.ISOLATED
+            )
+            opens[user_id].append((i, fields, parsed))
+
+        if closes:
+            self.counts["closed"] += len(settlement.close_many(closes))
+        for user_id, batch in opens.items():
+            result = settlement.batch(user_id, [], [(fields, parsed) for _, fields, parsed in batch])
+            if result is None:
+                self.counts["rejected"] += len(batch)
+                continue
+            for (i, fields, _), pos in zip(batch, result[1]):
+                self.positions[i] = (pos.id, fields["symbol"])
+            self.counts["opened"] += len(batch)
+        self.timings["scenario"] += time.perf_counter() - started
+
+    def _request(self, order, mark):
+        """ The body of the open request the scenario user sends """
+        data = {key: order[key] for key in ("symbol", "side", "margin", "leverage")}
+        # distance to the isolated liquidation price
+        room = mark / order["leverage"] * (1 if order["side"] == "BUY" else -1)
+        if "tp" in order:
+            data["take_profit"] = str(_decimal(mark + room * order["tp"] * 2))
+            data["stop_loss"] = str(_decimal(mark - room * order["sl"]))
+        if "trailing" in order:
+            data["trailing_stop"] = str(order["trailing"])
+        return data
+
+    def _pace(self, started, event_time):
+        """ Wait for the wall clock at speed x real time """
+        due = started + (event_time - self.frames[0][0]) / 1000 / self.speed
+        if due > time.perf_counter():
+            time.sleep(due - time.perf_counter())
+
+
+# -------- helper --------
+def _decimal(value):
+    return Decimal(str(value)).quantize(QUANTUM)
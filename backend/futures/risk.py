@@ -0,0 +1,485 @@
+# futures/risk.py
+#
+# Cross-margin account risk, run inside `manage.py stream_markprices`.
+#
+# A cross account is a user's futures wallet together with all their
+# cross-margin positions:
+#
+#   equity        balance + margin of the positions + unrealized PnL
+#   maintenance   FUTURES_MAINTENANCE_MARGIN_RATE * notional at the mark
+#   margin ratio  maintenance / equity, % (100 = liquidation)
+#
+# The engine keeps these per user in NumPy columns, one slot per user.
+# For each symbol it also keeps its holders' positions netted to three
+# numbers per user: signed quantity, signed entry cost and gross
+# quantity. A tick of one symbol only moves that symbol's holders, by
+# quantity * (new mark - old mark). That costs the same however many
+# positions a holder has, and accounts without the symbol are not
+# touched. A user is reloaded from the DB (wallet + open cross positions)
+# only when something of theirs changed: a futures ledger entry or a
+# position opened by a limit fill. sync() checks for these every
+# LIQUIDATION_SYNC_INTERVAL seconds.
+#
+# Breached accounts (maintenance >= equity) are liquidated riskiest
+# first, at most CROSS_LIQUIDATION_BATCH per tick, through
+# futures.settlement.liquidate_cross(). Accounts that changed are
+# published to a shared table (same format as the price tables), so
+# account() in any worker is one record read. current() falls back to
+# compute() from the DB when the engine is not running.
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+import numpy as np
+
+from markets.pricetable import SharedTable
+from wallet import ledger
+from wallet.models import LedgerEntry
+
+from . import clock, settlement, valuation
+from .models import FuturesPosition, FuturesWallet
+
+# table key of the engine's own record: its updated_at is a heartbeat
+HEARTBEAT = "engine"
+
+CHUNK = 1000
+
+# per-slot columns of RiskEngine and their dtypes
+COLUMNS = {
+    "user_ids": np.int64,
+    "balance": float,
+    "margin": float,
+    "pnl": float,            # unrealized, symbols with a mark only
+    "maintenance": float,
+    "positions": np.int64,
+    "changed": bool,         # to publish
+}
+
+
+class AccountRisk(SharedTable):
+    """ user id -> cross account risk """
+
+    MAGIC = b"CFR1"
+    KEY_SIZE = 16
+    TAG_SIZE = 8
+    FIELDS = (
+        "balance",
+        "margin",
+        "unrealized_pnl",
+        "equity",
+        "maintenance",
+        "margin_ratio",
+        "positions",
+        "updated_at",
+    )
+
+
+class Holdings:
+    """ Cross positions of one symbol netted per holder: slot -> (quantity, cost, gross quantity) """
+
+    __slots__ = ("rows", "columns")
+
+    def __init__(self):
+        self.rows = {}
+        self.columns = None      # (slots, quantity, cost, gross) arrays, rebuilt after a change
+
+    def set(self, slot, row):
+        self.rows[slot] = row
+        self.columns = None
+
+    def drop(self, slot):
+        if self.rows.pop(slot, None) is not None:
+            self.columns = None
+
+    def arrays(self):
+        if self.columns is None:
+            n = len(self.rows)
+            values = np.array(list(self.rows.values()), dtype=float).reshape(n, 3)
+            self.columns = (np.fromiter(self.rows, np.int64, n), values[:, 0], values[:, 1], values[:, 2])
+        return self.columns
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class RiskEngine:
+    def __init__(self, table=None, rate=None):
+        self.table = table       # AccountRisk to publish to (None: keep it in memory)
+        self.rate = settings.FUTURES_MAINTENANCE_MARGIN_RATE if rate is None else rate
+
+        self.slots = {}          # user id -> slot
+        self.free = []
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, np.zeros(0, dtype))
+
+        self.held = {}           # user id -> symbols of their cross positions
+        self.books = {}          # symbol -> Holdings
+        self.marks = {}          # symbol -> last mark
+        self.breached = set()    # user ids at / past maintenance
+        self.dropped = set()     # user ids gone since the last publish
+
+        self.synced_at = None
+        self.last_entry = 0
+        self.recent = {}         # ("entry" | "position", id) -> created, for the sync overlap
+        self.next_sync = 0
+        self.next_publish = 0
+
+    # ===================== READS =====================
+
+    def equity(self, slots):
+        return self.balance[slots] + self.margin[slots] + self.pnl[slots]
+
+    def ratio(self, slots):
+        """ Margin ratio (%) of slots; 0 without maintenance, inf with nothing left """
+        equity = self.equity(slots)
+        maintenance = self.maintenance[slots]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(equity > 0, maintenance / equity * 100, np.inf)
+        return np.where(maintenance > 0, ratio, 0.0)
+
+    def riskiest(self, count):
+        """ [(user id, margin ratio)] of the count highest margin ratios """
+        slots = np.fromiter(self.slots.values(), np.int64, len(self.slots))
+        ratio = self.ratio(slots)
+        if count < len(slots):
+            top = np.argpartition(-ratio, count)[:count]
+            slots, ratio = slots[top], ratio[top]
+        order = np.argsort(-ratio, kind="stable")
+        return list(zip(self.user_ids[slots[order]].tolist(), ratio[order].tolist()))
+
+    def __len__(self):
+        return len(self.slots)
+
+    # ===================== LOADING =====================
+
+    def load(self):
+        """ Every cross account (startup) """
+        self.synced_at = timezone.now()
+        self.last_entry = LedgerEntry.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+        cross = FuturesPosition.objects.filter(status=FuturesPosition.OPEN, margin_mode=FuturesWallet.CROSS)
+        self.marks.update(valuation.current_marks(cross.values_list("symbol", flat=True).distinct()))
+        self.reload(list(cross.values_list("user_id", flat=True).distinct()))
+
+        self.next_sync = clock.monotonic() + settings.LIQUIDATION_SYNC_INTERVAL
+        return len(self)
+
+    def sync(self):
+        """
+        Reload the users whose wallet or cross positions changed since the
+        last sync. Nothing is marked seen until they are reloaded: a sync
+        that fails part way is run again whole.
+        """
+        now = timezone.now()
+        since = self.synced_at - timedelta(seconds=settings.LIQUIDATION_SYNC_OVERLAP)
+        recent = dict(self.recent)
+        changed = set()
+
+        # every balance movement of a futures wallet is a ledger entry
+        entries = list(
+            LedgerEntry.objects.filter(id__gt=self.last_entry, account=ledger.FUTURES)
+            .values_list("id", "user_id", "created_at")
+        )
+        for entry_id, user_id, created_at in entries:
+            if ("entry", entry_id) not in recent:
+                recent[("entry", entry_id)] = created_at
+                changed.add(user_id)
+
+        # limit-order fills open positions without an entry (the margin was taken when placed)
+        opened = FuturesPosition.objects.filter(
+            status=FuturesPosition.OPEN, opened_at__gte=since, margin_mode=FuturesWallet.CROSS
+        ).values_list("id", "user_id", "opened_at")
+        for position_id, user_id, opened_at in opened:
+            if ("position", position_id) not in recent:
+                recent[("position", position_id)] = opened_at
+                changed.add(user_id)
+
+        if changed:
+            self.reload(changed)
+
+        # entries older than the overlap are not read again
+        self.last_entry = max(
+            (entry_id for entry_id, _, created_at in entries if created_at < since), default=self.last_entry
+        )
+        self.recent = {key: t for key, t in recent.items() if t >= since}
+        self.synced_at = now
+        self.next_sync = clock.monotonic() + settings.LIQUIDATION_SYNC_INTERVAL
+
+    def reload(self, user_ids):
+        """ Rebuild the accounts of user_ids from their wallet and open cross positions """
+        user_ids = list(user_ids)
+        for i in range(0, len(user_ids), CHUNK):
+            chunk = user_ids[i:i + CHUNK]
+            balances = dict(FuturesWallet.objects.filter(user_id__in=chunk).values_list("user_id", "balance"))
+
+            netted = defaultdict(dict)
+            margins = defaultdict(float)
+            counts = defaultdict(int)
+            rows = FuturesPosition.objects.filter(
+                user_id__in=chunk, status=FuturesPosition.OPEN, margin_mode=FuturesWallet.CROSS
+            ).values_list("user_id", "symbol", "side", "entry_price", "amount", "initial_margin")
+            for user_id, symbol, side, entry, amount, margin in rows.iterator(chunk_size=10000):
+                sign = 1.0 if side == FuturesPosition.LONG else -1.0
+                amount = float(amount)
+                qty, cost, gross = netted[user_id].get(symbol, (0.0, 0.0, 0.0))
+                netted[user_id][symbol] = (qty + sign * amount, cost + sign * amount * float(entry), gross + amount)
+                margins[user_id] += float(margin)
+                counts[user_id] += 1
+
+            slots = []
+            for user_id in chunk:
+                if user_id in netted:
+                    slots.append(self._set(
+                        user_id, float(balances.get(user_id, 0)), margins[user_id], counts[user_id], netted[user_id]
+                    ))
+                else:
+                    self._drop(user_id)
+            self._check(np.array(slots, np.int64))
+
+    # ===================== TICKS =====================
+
+    def on_ticks(self, ticks):
+        """
+        Move the accounts holding the symbols of a batch of (symbol,
+        {"mark_price"}) ticks and liquidate the breached ones. Returns
+        {user id: [position ids]} liquidated.
+        """
+        if self.synced_at is not None and clock.monotonic() >= self.next_sync:
+            try:
+                self.sync()
+            except DatabaseError as e:
+                # next_sync is left as it was: the next tick retries
+                print("❌ RISK SYNC ERROR:", e)
+
+        touched = []
+        for symbol, values in ticks:
+            if values.get("mark_price") is None:
+                continue
+            mark = float(values["mark_price"])
+            old = self.marks.get(symbol)
+            self.marks[symbol] = mark
+
+            book = self.books.get(symbol)
+            if not book or mark == old:
+                continue
+            slots, qty, cost, gross = book.arrays()
+            # one holder per slot in a book: plain fancy-index adds are safe
+            if old is None:
+                self.pnl[slots] += qty * mark - cost
+                self.maintenance[slots] += gross * (mark * self.rate)
+            else:
+                self.pnl[slots] += qty * (mark - old)
+                self.maintenance[slots] += gross * ((mark - old) * self.rate)
+            touched.append(slots)
+
+        if touched:
+            slots = np.unique(np.concatenate(touched)) if len(touched) > 1 else touched[0]
+            self.changed[slots] = True
+            self._check(slots)
+
+        liquidated = self.liquidate() if self.breached else {}
+        if self.table is not None and clock.monotonic() >= self.next_publish:
+            self.publish()
+        return liquidated
+
+    def liquidate(self):
+        """ Liquidate the breached accounts, highest margin ratio first """
+        users = np.fromiter(self.breached, np.int64, len(self.breached))
+        ratio = self.ratio(np.array([self.slots[u] for u in users.tolist()], np.int64))
+        riskiest = users[np.argsort(-ratio, kind="stable")][:settings.CROSS_LIQUIDATION_BATCH].tolist()
+        marks = {
+            symbol: Decimal(repr(self.marks[symbol]))
+            for user_id in riskiest for symbol in self.held[user_id] if symbol in self.marks
+        }
+
+        try:
+            done = settlement.liquidate_cross(riskiest, marks)
+        except Exception as e:
+            # still breached: the next tick retries
+            print("❌ CROSS LIQUIDATION SETTLEMENT ERROR:", e)
+            return {}
+        try:
+            self.reload(riskiest)
+        except DatabaseError as e:
+            # their LIQUIDATE entries bring them back on the next sync
+            print("❌ RISK RELOAD ERROR:", e)
+        return done
+
+    # ===================== PUBLISHING =====================
+
+    def publish(self):
+        """ Write the accounts changed since the last publish, and the heartbeat """
+        now = time.time()
+        slots = np.flatnonzero(self.changed)
+        self.changed[slots] = False
+
+        equity = self.equity(slots)
+        columns = zip(
+            self.user_ids[slots].tolist(), self.balance[slots].tolist(), self.margin[slots].tolist(),
+            self.pnl[slots].tolist(), equity.tolist(), self.maintenance[slots].tolist(),
+            self.ratio(slots).tolist(), self.positions[slots].tolist(),
+        )
+        rows = [
+            (str(user_id), None, dict(zip(AccountRisk.FIELDS, (*values, now))))
+            for user_id, *values in columns
+        ]
+        rows += [(str(user_id), None, _flat(now)) for user_id in self.dropped]
+        rows.append((HEARTBEAT, None, {"updated_at": now}))
+
+        self.table.upsert(rows)
+        self.dropped = set()
+        self.next_publish = clock.monotonic() + settings.ACCOUNT_RISK_PUBLISH_INTERVAL
+        return len(rows) - 1
+
+    # -------- helpers --------
+    def _set(self, user_id, balance, margin, count, symbols):
+        """ One account from its balance, margin, count and {symbol: (quantity, cost, gross)}; its slot """
+        slot = self.slots.get(user_id)
+        if slot is None:
+            slot = self._slot(user_id)
+        for symbol in self.held.get(user_id, set()) - symbols.keys():
+            self.books[symbol].drop(slot)
+
+        pnl = notional = 0.0
+        for symbol, row in symbols.items():
+            book = self.books.get(symbol)
+            if book is None:
+                book = self.books[symbol] = Holdings()
+            book.set(slot, row)
+            mark = self.marks.get(symbol)
+            if mark is not None:
+                pnl += row[0] * mark - row[1]
+                notional += row[2] * mark
+        self.held[user_id] = set(symbols)
+
+        self.user_ids[slot] = user_id
+        self.balance[slot] = balance
+        self.margin[slot] = margin
+        self.pnl[slot] = pnl
+        self.maintenance[slot] = notional * self.rate
+        self.positions[slot] = count
+        self.changed[slot] = True
+        self.dropped.discard(user_id)
+        return slot
+
+    def _drop(self, user_id):
+        """ Forget a user without cross positions """
+        slot = self.slots.pop(user_id, None)
+        if slot is None:
+            return
+        for symbol in self.held.pop(user_id, ()):
+            self.books[symbol].drop(slot)
+        for name in COLUMNS:
+            getattr(self, name)[slot] = 0
+        self.free.append(slot)
+        self.breached.discard(user_id)
+        self.dropped.add(user_id)
+
+    def _slot(self, user_id):
+        if not self.free:
+            n = len(self.user_ids)
+            grow = max(n, 1024)
+            for name, dtype in COLUMNS.items():
+                setattr(self, name, np.concatenate([getattr(self, name), np.zeros(grow, dtype)]))
+            self.free = list(range(n + grow - 1, n - 1, -1))
+        slot = self.slots[user_id] = self.free.pop()
+        return slot
+
+    def _check(self, slots):
+        """ Track which of slots are at / past maintenance """
+        maintenance = self.maintenance[slots]
+        hit = (maintenance > 0) & (maintenance >= self.equity(slots))
+        users = self.user_ids[slots]
+        if hit.any():
+            self.breached.update(users[hit].tolist())
+        if self.breached:
+            self.breached.difference_update(users[~hit].tolist())
+
+
+# ===================== READS (views) =====================
+
+def account(user_id):
+    """
+    {field: value} of a user's cross account as last published by the
+    engine: one record read. None when the engine is not running.
+    """
+    table = reader()
+    if table is None:
+        return None
+    beat = table.get(HEARTBEAT)
+    if beat is None or time.time() - beat["updated_at"] > settings.ACCOUNT_RISK_MAX_AGE:
+        return None
+    # no record: no cross positions yet
+    return table.get(str(user_id)) or _flat(beat["updated_at"])
+
+
+def compute(user_id, balance):
+    """ The same record computed from the DB and the mark-price table """
+    positions = FuturesPosition.objects.filter(
+        user_id=user_id, status=FuturesPosition.OPEN, margin_mode=FuturesWallet.CROSS
+    )
+    book = valuation.Positions.load(positions)
+    values = book.value(valuation.current_marks(book.symbols.tolist()))
+    priced = ~np.isnan(values["mark_price"])
+
+    balance, margin = float(balance), float(book.margin.sum())
+    pnl = float(values["unrealized_pnl"][priced].sum())
+    maintenance = float(values["notional"][priced].sum()) * settings.FUTURES_MAINTENANCE_MARGIN_RATE
+    equity = balance + margin + pnl
+    if maintenance <= 0:
+        ratio = 0.0
+    else:
+        ratio = maintenance / equity * 100 if equity > 0 else float("inf")
+
+    return {
+        "balance": balance,
+        "margin": margin,
+        "unrealized_pnl": pnl,
+        "equity": equity,
+        "maintenance": maintenance,
+        "margin_ratio": ratio,
+        "positions": len(book),
+        "updated_at": time.time(),
+    }
+
+
+def current(user_id, balance):
+    """ account(), or compute() when the engine is not running """
+    return account(user_id) or compute(user_id, balance)
+
+
+# -------- helper --------
+def _flat(now):
+    return {field: 0.0 for field in AccountRisk.FIELDS} | {"updated_at": now}
+
+
+# ===================== PROCESS-WIDE HANDLES =====================
+
+_reader = None
+_writer = None
+
+
+def reader():
+    global _reader
+    if _reader is None:
+        try:
+            _reader = AccountRisk(settings.ACCOUNT_RISK_PATH)
+        except (FileNotFoundError, ValueError):
+            return None
+    return _reader
+
+
+def writer():
+    global _writer
+    if _writer is None:
+        _writer = AccountRisk(
+            settings.ACCOUNT_RISK_PATH,
+            capacity=settings.ACCOUNT_RISK_CAPACITY,
+            writable=True,
+        )
+    return _writer
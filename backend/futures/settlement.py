@@ -0,0 +1,451 @@
+# futures/settlement.py
+#
+# Every way a position ends goes through here: closed by its owner
+# (views.close_position / batch), by a TP/SL trigger (futures/triggers.py)
+# or liquidated (futures/liquidation.py). Every update is conditional on
+# the position still being OPEN (or made on rows locked while OPEN), so
+# when two of them race only one settles.
+# Limit-order fills (futures/orderbook.py) are claimed the same way
+# against a concurrent cancel, and funding (futures/funding.py) is paid
+# once per symbol and funding time. Wallet movements are rounded to the
+# wallet column (services.quantize) and written to the ledger
+# (wallet/ledger.py) in the same transaction; an isolated liquidation
+# moves nothing (the margin was taken when the position opened), a
+# cross-margin one (futures/risk.py) realizes its PnL against the wallet.
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from wallet import ledger, services
+from wallet.models import LedgerEntry
+
+from . import events, fixedpoint, triggers
+from .models import FundingRound, FuturesPosition, FuturesWallet, LimitOrder, TriggerOrder
+from .utils import calculate_pnl
+
+CHUNK = 1000
+
+
+def close(position_id, price):
+    """ Close one position at price: (pnl, wallet balance), or None if it was no longer open """
+    with transaction.atomic():
+        closed = close_many([(position_id, price, None)])
+        if not closed:
+            return None
+
+        pnl, user_id = closed[position_id]
+        balance = FuturesWallet.objects.filter(user_id=user_id).values_list("balance", flat=True).first()
+    return pnl, balance
+
+
+def close_many(fills):
+    """
+    Close positions at a price each: [(position id, price, trigger id or
+    None)]. Margin + PnL go back to the wallets, the trigger that fired is
+    marked TRIGGERED and the position's other triggers are cancelled.
+    Returns {position id: (pnl, user id)} for the positions actually closed.
+    """
+    now = timezone.now()
+    closed = {}
+    fired = []
+    credits = defaultdict(int)
+    entries = []
+
+    with transaction.atomic():
+        positions = {
+            p.id: p
+            for p in FuturesPosition.objects.select_for_update().filter(
+                id__in=[pid for pid, _, _ in fills], status=FuturesPosition.OPEN
+            )
+        }
+
+        # the rows are locked while OPEN: nobody else can settle them before
+        # this transaction ends, so they are written back in one bulk UPDATE
+        done = []
+        for position_id, price, trigger_id in fills:
+            pos = positions.pop(position_id, None)
+            if pos is None:
+                continue
+
+            pnl = calculate_pnl(pos.entry_price, price, pos.side, pos.amount)
+            pos.status, pos.closed_at, pos.pnl = FuturesPosition.CLOSED, now, pnl
+            done.append(pos)
+
+            closed[position_id] = (pnl, pos.user_id)
+            amount = services.quantize(FuturesWallet, pos.initial_margin + pnl)
+            credits[pos.user_id] += amount
+            entries.append(ledger.entry(
+                pos.user_id, ledger.FUTURES, LedgerEntry.SETTLE, amount, f"position:{position_id}"
+            ))
+            if trigger_id is not None:
+                fired.append(trigger_id)
+
+        FuturesPosition.objects.bulk_update(done, ["status", "closed_at", "pnl"], batch_size=CHUNK)
+        for user_id, credit in credits.items():
+            FuturesWallet.objects.filter(user_id=user_id).update(balance=F("balance") + credit)
+        ledger.record(entries)
+
+        if fired:
+            TriggerOrder.objects.filter(id__in=fired, status=TriggerOrder.ACTIVE).update(
+                status=TriggerOrder.TRIGGERED, finished_at=now
+            )
+        _cancel_triggers(list(closed), now)
+        _notify(credits)
+
+    return closed
+
+
+def liquidate(position_ids):
+    """
+    Liquidate open positions: isolated margin is lost, nothing goes back
+    to the wallet. One transaction for the whole batch. Returns the
+    [(position id, user id)] that were actually liquidated.
+    """
+    now = timezone.now()
+    done = []
+
+    with transaction.atomic():
+        for chunk in _chunks(list(position_ids)):
+            rows = list(
+                FuturesPosition.objects.select_for_update()
+                .filter(id__in=chunk, status=FuturesPosition.OPEN)
+                .values_list("id", "user_id")
+            )
+            if not rows:
+                continue
+
+            FuturesPosition.objects.filter(
+                id__in=[pid for pid, _ in rows], status=FuturesPosition.OPEN
+            ).update(
+                status=FuturesPosition.LIQUIDATED,
+                closed_at=now,
+                pnl=-F("initial_margin"),
+            )
+            _cancel_triggers([pid for pid, _ in rows], now)
+            done += rows
+
+        _notify(user_id for _, user_id in done)
+
+    return done
+
+
+def liquidate_cross(user_ids, marks):
+    """
+    Liquidate every open cross-margin position of user_ids at marks
+    {symbol: Decimal}: margin + PnL go back to the wallet like a close,
+    but a loss past the balance is not collected (the wallet stops at 0).
+    Positions of symbols without a mark stay open. Set-based: one UPDATE
+    per chunk of users claims the positions and computes their PnL, the
+    credits are made from the PnL it stored. Returns {user id: [position
+    ids]} liquidated.
+    """
+    now = timezone.now()
+    done = defaultdict(list)
+    entries = []
+
+    mark = Case(
+        *[When(symbol=symbol, then=Value(price)) for symbol, price in marks.items()],
+        output_field=DecimalField(max_digits=20, decimal_places=8),
+    )
+    pnl = Round(
+        Case(
+            When(side=FuturesPosition.LONG, then=F("amount") * (mark - F("entry_price"))),
+            default=F("amount") * (F("entry_price") - mark),
+        ),
+        fixedpoint.PLACES,
+        output_field=DecimalField(max_digits=20, decimal_places=8),
+    )
+
+    with transaction.atomic():
+        for chunk in _chunks(list(user_ids)):
+            if not FuturesPosition.objects.filter(
+                user_id__in=chunk, status=FuturesPosition.OPEN,
+                margin_mode=FuturesWallet.CROSS, symbol__in=list(marks),
+            ).update(status=FuturesPosition.LIQUIDATED, closed_at=now, pnl=pnl):
+                continue
+
+            credits = defaultdict(int)
+            rows = FuturesPosition.objects.filter(
+                user_id__in=chunk, status=FuturesPosition.LIQUIDATED, closed_at=now
+            ).order_by("id").values_list("id", "user_id", "initial_margin", "pnl")
+            for position_id, user_id, margin, position_pnl in rows:
+                done[user_id].append(position_id)
+                amount = services.quantize(FuturesWallet, margin + position_pnl)
+                credits[user_id] += amount
+                entries.append(ledger.entry(
+                    user_id, ledger.FUTURES, LedgerEntry.LIQUIDATE, amount, f"position:{position_id}"
+                ))
+
+            balances = dict(
+                FuturesWallet.objects.select_for_update().filter(user_id__in=list(credits))
+                .values_list("user_id", "balance")
+            )
+            for user_id, credit in credits.items():
+                shortfall = -(balances.get(user_id, 0) + credit)
+                if shortfall > 0:
+                    # the part of the loss the wallet can't cover
+                    credit += shortfall
+                    entries.append(ledger.entry(user_id, ledger.FUTURES, LedgerEntry.LIQUIDATE, shortfall, "shortfall"))
+                FuturesWallet.objects.filter(user_id=user_id).update(balance=F("balance") + credit)
+
+            _cancel_triggers([pid for user_id in credits for pid in done[user_id]], now)
+
+        ledger.record(entries)
+        _notify(done)
+
+    return dict(done)
+
+
+def fill_orders(order_ids):
+    """
+    Open the positions of filled limit orders (at the order price, with
+    the margin reserved when it was placed). Orders cancelled meanwhile
+    are skipped. Returns {order id: position id}.
+    """
+    now = timezone.now()
+    filled = {}
+    users = set()
+
+    with transaction.atomic():
+        for chunk in _chunks(list(order_ids)):
+            # claim first: a cancel can no longer win after this UPDATE
+            LimitOrder.objects.filter(id__in=chunk, status=LimitOrder.OPEN).update(
+                status=LimitOrder.FILLED, finished_at=now
+            )
+            orders = list(
+                LimitOrder.objects.filter(id__in=chunk, status=LimitOrder.FILLED, finished_at=now)
+            )
+            if not orders:
+                continue
+            cross = set(
+                FuturesWallet.objects.filter(
+                    user_id__in={o.user_id for o in orders}, margin_mode=FuturesWallet.CROSS
+                ).values_list("user_id", flat=True)
+            )
+
+            # the whole chunk at once, on scaled ints (same values as the Decimal functions)
+            prices = fixedpoint.to_array(o.price for o in orders)
+            leverage = [o.leverage for o in orders]
+            amounts = fixedpoint.contracts_array(fixedpoint.to_array(o.margin for o in orders), prices, leverage)
+            liq_prices = fixedpoint.liquidation_array(
+                prices, leverage, [o.side == FuturesPosition.LONG for o in orders]
+            )
+
+            positions = FuturesPosition.objects.bulk_create([
+                FuturesPosition(
+                    limit_order=o,
+                    user_id=o.user_id,
+                    symbol=o.symbol,
+                    side=o.side,
+                    entry_price=o.price,
+                    amount=fixedpoint.from_fixed(amount),
+                    leverage=o.leverage,
+                    initial_margin=o.margin,
+                    liquidation_price=fixedpoint.from_fixed(liq),
+                    margin_mode=FuturesWallet.CROSS if o.user_id in cross else FuturesWallet.ISOLATED,
+                )
+                for o, amount, liq in zip(orders, amounts.tolist(), liq_prices.tolist())
+            ])
+            for order, pos in zip(orders, positions):
+                filled[order.id] = pos.id
+                users.add(order.user_id)
+
+        _notify(users)
+
+    return filled
+
+
+def open_position(user_id, orders=None, **fields):
+    """
+    Take the margin from the wallet and open a position at the market,
+    with its TP / SL / trailing stop (triggers.parse() output) in the same
+    transaction. None if the balance is too low.
+    """
+    with transaction.atomic():
+        if services.debit(FuturesWallet, user_id, fields["initial_margin"]) is None:
+            return None
+        pos = FuturesPosition.objects.create(user_id=user_id, **fields)
+        ledger.record([_margin_entry(user_id, -pos.initial_margin, f"position:{pos.id}")])
+        if orders:
+            TriggerOrder.objects.bulk_create(triggers.build(pos, orders, pos.entry_price))
+        _notify([user_id])
+    return pos
+
+
+def batch(user_id, closes, opens):
+    """
+    One user's batch in one transaction: close [(position id, price)],
+    then open [(fields, triggers.parse() output)] with the margin of all
+    of them taken in a single guarded debit (so the closes can pay for
+    the opens). Returns ({position id: (pnl, user id)}, [new positions]),
+    or None, with nothing changed, if the balance is too low.
+    """
+    with transaction.atomic():
+        closed = close_many([(position_id, price, None) for position_id, price in closes]) if closes else {}
+        if not opens:
+            return closed, []
+
+        margin = sum(fields["initial_margin"] for fields, _ in opens)
+        if services.debit(FuturesWallet, user_id, margin) is None:
+            transaction.set_rollback(True)
+            return None
+
+        positions = FuturesPosition.objects.bulk_create(
+            [FuturesPosition(user_id=user_id, **fields) for fields, _ in opens], batch_size=CHUNK
+        )
+        ledger.record(_margin_entry(user_id, -p.initial_margin, f"position:{p.id}") for p in positions)
+        TriggerOrder.objects.bulk_create(
+            [t for p, (_, orders) in zip(positions, opens) if orders for t in triggers.build(p, orders, p.entry_price)],
+            batch_size=CHUNK,
+        )
+        _notify([user_id])
+    return closed, positions
+
+
+def pay_funding(funding_time, rounds):
+    """
+    Settle one funding time: rounds = [(symbol, rate, mark price)]. Every
+    open position of those symbols pays (long, rate > 0) or receives
+    amount * mark * rate. Set-based: each user's total is one GROUP BY
+    over the payments, taken before the UPDATE that adds every
+    position's payment (the factor read from the round of its symbol);
+    it is booked as one ledger entry the wallet is then credited from.
+    A wallet is never debited below 0: what it can't pay is not
+    collected. Symbols already settled for that time are skipped.
+    Returns the FundingRound rows created.
+    """
+    with transaction.atomic():
+        done = set(
+            FundingRound.objects.filter(
+                funding_time=funding_time, symbol__in=[symbol for symbol, _, _ in rounds]
+            ).values_list("symbol", flat=True)
+        )
+        created = FundingRound.objects.bulk_create([
+            FundingRound(symbol=symbol, funding_time=funding_time, rate=rate, mark_price=mark)
+            for symbol, rate, mark in rounds
+            if symbol not in done
+        ])
+        if not created:
+            return []
+
+        # the transaction holds the write lock from its first statement
+        # (IMMEDIATE, core/settings.py), so the sums and the UPDATE see
+        # the same rows; positions opened after it (higher ids) stay out
+        last_id = FuturesPosition.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        positions = FuturesPosition.objects.filter(
+            status=FuturesPosition.OPEN, symbol__in=[r.symbol for r in created], id__lte=last_id
+        ).order_by()
+
+        factor = Subquery(
+            FundingRound.objects.filter(symbol=OuterRef("symbol"), funding_time=funding_time)
+            .annotate(factor=F("rate") * F("mark_price"))
+            .values("factor")
+        )
+        sign = Case(When(side=FuturesPosition.LONG, then=Value(-1)), default=Value(1))
+        payment = Round(
+            F("amount") * factor * sign, fixedpoint.PLACES, output_field=DecimalField(max_digits=20, decimal_places=8)
+        )
+
+        payments = {
+            user_id: services.quantize(FuturesWallet, total)
+            for user_id, total in positions.values("user_id").annotate(total=Sum(payment))
+            .values_list("user_id", "total")
+        }
+        positions.update(accrued_funding=F("accrued_funding") + payment)
+
+        balances = dict(
+            FuturesWallet.objects.filter(user_id__in=positions.values("user_id")).values_list("user_id", "balance")
+        )
+        totals = {}
+        for user_id, total in payments.items():
+            total = max(total, -balances.get(user_id, 0))
+            if total:
+                totals[user_id] = total
+
+        # one ledger entry per user, then every wallet credited from its entry
+        reference = f"funding:{funding_time.isoformat()}"
+        last_entry = LedgerEntry.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        ledger.record(
+            ledger.entry(user_id, ledger.FUTURES, LedgerEntry.FUNDING, total, reference)
+            for user_id, total in totals.items()
+        )
+        entries = LedgerEntry.objects.filter(
+            id__gt=last_entry, account=ledger.FUTURES, kind=LedgerEntry.FUNDING, reference=reference
+        )
+        FuturesWallet.objects.filter(user_id__in=entries.values("user_id")).update(
+            balance=F("balance") + Subquery(entries.filter(user_id=OuterRef("user_id")).values("amount")[:1])
+        )
+        # per round: positions paid, and what the longs paid (before rounding each one)
+        stats = {
+            symbol: (count, Decimal(longs or 0))
+            for symbol, count, longs in positions.values("symbol").annotate(
+                count=Count("id"), longs=Sum("amount", filter=Q(side=FuturesPosition.LONG))
+            ).values_list("symbol", "count", "longs")
+        }
+        for r in created:
+            count, longs = stats.get(r.symbol, (0, 0))
+            r.positions = count
+            r.paid_by_longs = (longs * r.rate * r.mark_price).quantize(fixedpoint.QUANTUM) if longs else Decimal("0")
+        FundingRound.objects.bulk_update(created, ["positions", "paid_by_longs"])
+        _notify(totals)
+    return created
+
+
+def place_order(user_id, **fields):
+    """ Reserve the margin and create a LimitOrder; None if the balance is too low """
+    with transaction.atomic():
+        if services.debit(FuturesWallet, user_id, fields["margin"]) is None:
+            return None
+        order = LimitOrder.objects.create(user_id=user_id, **fields)
+        ledger.record([_margin_entry(user_id, -order.margin, f"order:{order.id}")])
+        _notify([user_id])
+    return order
+
+
+def cancel_order(order_id, user_id):
+    """ Cancel an open limit order and give its margin back; False if it was no longer open """
+    with transaction.atomic():
+        margin = (
+            LimitOrder.objects.filter(id=order_id, user_id=user_id, status=LimitOrder.OPEN)
+            .values_list("margin", flat=True)
+            .first()
+        )
+        if margin is None:
+            return False
+
+        if not LimitOrder.objects.filter(id=order_id, status=LimitOrder.OPEN).update(
+            status=LimitOrder.CANCELLED, finished_at=timezone.now()
+        ):
+            return False
+        services.credit(FuturesWallet, user_id, margin, LedgerEntry.REFUND, f"order:{order_id}")
+        _notify([user_id])
+    return True
+
+
+# -------- helpers --------
+def _margin_entry(user_id, amount, reference):
+    return ledger.entry(user_id, ledger.FUTURES, LedgerEntry.MARGIN, amount, reference)
+
+
+def _cancel_triggers(position_ids, now):
+    for chunk in _chunks(position_ids):
+        TriggerOrder.objects.filter(position_id__in=chunk, status=TriggerOrder.ACTIVE).update(
+            status=TriggerOrder.CANCELLED, finished_at=now
+        )
+
+
+def _notify(user_ids):
+    """ Wake the users' streams once the transaction is committed """
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: events.emit_many(user_ids))
+
+
+def _chunks(items, size=CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
@@ -1,11 +0,0 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-from django.contrib.auth.models import User
-
-from .models import FuturesWallet
-
-
-@receiver(post_save, sender=User)
-def create_futures_wallet(sender, instance, created, **kwargs):
-    if created:
-        FuturesWallet.objects.create(user=instance, balance=0)
\ No newline at end of file
@@ -0,0 +1,292 @@
+# futures/stream.py
+#
+# POST /api/futures/stream/ticket/               -> {"ticket", "expires_in"}
+# GET  /api/futures/stream/?ticket=<ticket>      (text/event-stream)
+#
+# EventSource cannot send the Authorization header, and a URL ends up in
+# access logs, so the URL carries a single-use ticket that expires within
+# seconds (FUTURES_STREAM_TICKET_TTL), never the access token itself.
+#
+# Pushes the futures account to the trade page instead of it polling
+# /wallet/ and /positions/:
+#
+#   snapshot   {"wallet": {...}, "positions": [...], "orders": [...]}   on connect
+#   wallet     {"balance": "..."}                        when it changes
+#   positions  {"upsert": [...], "remove": [ids]}        when they change
+#   orders     [...]  open limit orders, when they change
+#   pnl        {"marks": {symbol: price}, "positions": {id: pnl}, "roe": {id: %}}
+#              at most once per FUTURES_STREAM_PNL_INTERVAL, and only
+#              when the mark price of an open position moved
+#   expired    {}  the access token ran out — get a new ticket with a
+#              fresh one and reconnect
+#
+# Account changes are noticed through futures.events (a shared-memory
+# version per user, bumped by open/close), so an idle stream costs no
+# DB queries. One watcher task per event loop polls those versions for
+# every connected user and wakes their streams.
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+import asyncio
+import json
+import secrets
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import events, markprice, valuation
+from .models import FuturesWallet, StreamTicket
+from .views import open_orders, open_positions, order_data, position_data
+
+jwt_auth = JWTAuthentication()
+
+
+# ---------------------------------------------------------
+# STREAM TICKET (single use, for ?ticket=)
+# ---------------------------------------------------------
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def stream_ticket(request):
+    now = timezone.now()
+    StreamTicket.objects.filter(expires_at__lt=now).delete()
+
+    ticket = StreamTicket.objects.create(
+        key=secrets.token_urlsafe(32),
+        user=request.user,
+        expires_at=now + timedelta(seconds=settings.FUTURES_STREAM_TICKET_TTL),
+        stream_until=datetime.fromtimestamp(request.auth["exp"], tz=dt_timezone.utc),
+    )
+    return Response({"ticket": ticket.key, "expires_in": settings.FUTURES_STREAM_TICKET_TTL})
+
+
+@require_GET
+async def account_stream(request):
+    # a ticket from stream_ticket(), or the access token in the header
+    # for clients that can send one
+    ticket, raw = request.GET.get("ticket"), _bearer(request)
+    if not ticket and not raw:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    try:
+        if ticket:
+            user, expires_at = await sync_to_async(_redeem)(ticket)
+        else:
+            user, expires_at = await sync_to_async(_authenticate)(raw)
+    except AuthenticationFailed as e:
+        return JsonResponse({"detail": str(e.detail)}, status=401)
+
+    response = StreamingHttpResponse(
+        account_events(user, expires_at), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def account_events(user, expires_at):
+    """ SSE frames for one connection, until the token expires or the client leaves """
+    watcher = _watcher()
+    changed = watcher.subscribe(user.id)
+
+    wallet, positions, orders = None, {}, []
+    marks = {}                # symbol -> mark-price version in the last pnl tick
+    next_pnl = 0
+    last_sent = time.monotonic()
+
+    try:
+        while time.time() < expires_at:
+            if changed.is_set():
+                changed.clear()
+                new_wallet, new_positions, new_orders = await _load(user)
+
+                if wallet is None:
+                    yield _event("snapshot", {
+                        "wallet": new_wallet,
+                        "positions": list(new_positions.values()),
+                        "orders": new_orders,
+                    })
+                else:
+                    if new_wallet != wallet:
+                        yield _event("wallet", new_wallet)
+                    upsert = [p for i, p in new_positions.items() if positions.get(i) != p]
+                    remove = [i for i in positions if i not in new_positions]
+                    if upsert or remove:
+                        yield _event("positions", {"upsert": upsert, "remove": remove})
+                    if new_orders != orders:
+                        yield _event("orders", new_orders)
+
+                wallet, positions, orders = new_wallet, new_positions, new_orders
+                marks = {}
+                last_sent = time.monotonic()
+
+            now = time.monotonic()
+            if positions and now >= next_pnl:
+                tick = _pnl_tick(positions, marks)
+                if tick:
+                    yield _event("pnl", tick)
+                    next_pnl = now + settings.FUTURES_STREAM_PNL_INTERVAL
+                    last_sent = now
+
+            if now - last_sent >= settings.FUTURES_STREAM_HEARTBEAT:
+                yield ": ping\n\n"
+                last_sent = now
+
+            timeout = settings.FUTURES_STREAM_HEARTBEAT
+            if positions:
+                timeout = max(next_pnl - now, settings.FUTURES_STREAM_POLL)
+            try:
+                await asyncio.wait_for(changed.wait(), min(timeout, expires_at - time.time()))
+            except asyncio.TimeoutError:
+                pass
+
+        yield _event("expired", {})
+    finally:
+        watcher.unsubscribe(user.id, changed)
+
+
+class Watcher:
+    """ Polls the account versions of every user streaming on this event loop """
+
+    def __init__(self):
+        self.waiters = defaultdict(set)   # user id -> {asyncio.Event}
+        self.versions = {}
+        self.fallback = {}                # user id -> next reload, users without a version
+        self.task = None
+
+    def subscribe(self, user_id):
+        event = asyncio.Event()
+        event.set()                       # first pass sends the snapshot
+        self.waiters[user_id].add(event)
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+        return event
+
+    def unsubscribe(self, user_id, event):
+        waiters = self.waiters.get(user_id)
+        if waiters is not None:
+            waiters.discard(event)
+            if not waiters:
+                del self.waiters[user_id]
+                self.versions.pop(user_id, None)
+                self.fallback.pop(user_id, None)
+
+    async def run(self):
+        try:
+            while self.waiters:
+                now = time.monotonic()
+                for user_id, waiters in list(self.waiters.items()):
+                    version = events.version(user_id)
+                    if version is None:
+                        # no record in a full events table: reload on a timer instead
+                        if now < self.fallback.get(user_id, 0):
+                            continue
+                        self.fallback[user_id] = now + settings.FUTURES_STREAM_FALLBACK_POLL
+                    elif self.versions.get(user_id) == version:
+                        continue
+
+                    self.versions[user_id] = version
+                    for event in waiters:
+                        event.set()
+                await asyncio.sleep(settings.FUTURES_STREAM_POLL)
+        finally:
+            self.task = None
+
+
+_watchers = weakref.WeakKeyDictionary()   # loop -> Watcher
+
+
+def _watcher():
+    loop = asyncio.get_running_loop()
+    watcher = _watchers.get(loop)
+    if watcher is None:
+        watcher = _watchers[loop] = Watcher()
+    return watcher
+
+
+# -------- helpers --------
+def _authenticate(raw):
+    """ (user, token expiry as epoch seconds) or AuthenticationFailed """
+    token = jwt_auth.get_validated_token(raw)
+    return jwt_auth.get_user(token), token["exp"]
+
+
+def _redeem(key):
+    """ (user, stream expiry as epoch seconds) for a ticket, used up here, or AuthenticationFailed """
+    ticket = (
+        StreamTicket.objects.select_related("user")
+        .filter(key=key, expires_at__gt=timezone.now())
+        .first()
+    )
+    # the delete is the claim: of two concurrent redeems only one deletes the row
+    if ticket is None or not StreamTicket.objects.filter(pk=ticket.pk).delete()[0]:
+        raise AuthenticationFailed("Invalid or expired stream ticket")
+    if not ticket.user.is_active:
+        raise AuthenticationFailed("User is inactive")
+    return ticket.user, ticket.stream_until.timestamp()
+
+
+def _bearer(request):
+    header = request.headers.get("Authorization", "")
+    return header[7:] if header.startswith("Bearer ") else None
+
+
+@sync_to_async
+def _load(user):
+    wallet, _ = FuturesWallet.objects.get_or_create(user=user)
+    return (
+        {"balance": str(wallet.balance)},
+        {p.id: position_data(p) for p in open_positions(user)},
+        [order_data(o) for o in open_orders(user)],
+    )
+
+
+def _pnl_tick(positions, marks):
+    """ Unrealized PnL of the positions whose symbol's mark price moved since the last tick """
+    table = markprice.reader()
+    if table is None:
+        return None
+
+    prices = {}
+    for symbol in {p["symbol"] for p in positions.values()}:
+        version = table.version(symbol)
+        if version == marks.get(symbol):
+            continue
+        price = markprice.table_mark_price(symbol)
+        if price is not None:
+            marks[symbol] = version
+            prices[symbol] = price
+
+    if not prices:
+        return None
+
+    moved = [p for p in positions.values() if p["symbol"] in prices]
+    book = valuation.Positions(
+        (p["id"], 0, p["symbol"], p["side"], p["entry_price"], p["amount"], p["initial_margin"],
+         p["liquidation_price"])
+        for p in moved
+    )
+    values = book.value({symbol: float(price) for symbol, price in prices.items()})
+
+    return {
+        "marks": {symbol: str(price) for symbol, price in prices.items()},
+        "positions": {
+            p["id"]: f"{pnl:.8f}" for p, pnl in zip(moved, values["unrealized_pnl"].tolist())
+        },
+        "roe": {
+            p["id"]: round(roe, 4) for p, roe in zip(moved, values["roe"].tolist())
+        },
+    }
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
@@ -0,0 +1,63 @@
+from datetime import timedelta
+from decimal import Decimal
+import json
+from unittest import mock
+import zlib
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from futures import archive
+from futures.models import FuturesPosition, FuturesWallet
+
+STATUSES = [FuturesPosition.CLOSED, FuturesPosition.LIQUIDATED]
+
+
+class ArchiveHistoryTests(TestCase):
+    """ Trade history across the hot table and the archive partitions """
+
+    def setUp(self):
+        self.user, = User.objects.bulk_create([User(username="archived")])
+        now = timezone.now()
+        # 10 days of 6 closes each; the first 5 days go to the archive
+        FuturesPosition.objects.bulk_create([
+            FuturesPosition(
+                user=self.user, symbol="BTCUSDT", side=FuturesPosition.LONG, entry_price=Decimal("100"),
+                amount=Decimal("1"), initial_margin=Decimal("10"), liquidation_price=Decimal("90"),
+                status=STATUSES[i % 2], closed_at=now - timedelta(days=day, hours=i),
+                margin_mode=FuturesWallet.CROSS if i % 3 == 0 else FuturesWallet.ISOLATED,
+            )
+            for day in range(10)
+            for i in range(6)
+        ])
+        self.all = sorted(
+            FuturesPosition.objects.filter(user=self.user).values_list("closed_at", "id", "margin_mode"),
+            reverse=True,
+        )
+        archive.archive(days=5, now=now)
+
+    def pages(self, limit):
+        rows, before = [], None
+        while True:
+            page = archive.history(self.user.id, STATUSES, before, limit)
+            rows += [(p.closed_at, p.id, p.margin_mode) for p in page[:limit]]
+            if len(page) <= limit:
+                return rows
+            before = (page[limit - 1].closed_at, page[limit - 1].id)
+
+    def test_pages_cover_both_tiers(self):
+        self.assertTrue(FuturesPosition.objects.filter(user=self.user).exists())
+        for limit in (1, 7, 50):
+            self.assertEqual(self.pages(limit), self.all)
+
+    def test_full_hot_page_skips_the_archive(self):
+        with mock.patch.object(archive, "unpack", side_effect=AssertionError("archive scanned")):
+            page = archive.history(self.user.id, STATUSES, None, 10)
+        self.assertEqual([(p.closed_at, p.id) for p in page], [row[:2] for row in self.all[:11]])
+
+    def test_old_partitions_default_the_margin_mode(self):
+        # packed before margin_mode was archived
+        blob = zlib.compress(json.dumps({"id": [1], "status": [FuturesPosition.CLOSED]}).encode())
+        position, = archive.unpack(blob, self.user.id)
+        self.assertEqual(position.margin_mode, FuturesWallet.ISOLATED)
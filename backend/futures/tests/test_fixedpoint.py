@@ -0,0 +1,149 @@
+from math import gcd
+
+from django.test import SimpleTestCase
+import numpy as np
+
+from futures import fixedpoint as fp
+from futures.fixedpoint import SCALE, from_fixed, to_fixed
+from futures.utils import calculate_contracts, calculate_pnl, liquidation_price
+
+SEED = 20240611
+N = 5000
+
+EDGES = [0, 1, SCALE - 1, SCALE, SCALE + 1, 10 ** 18, 4 * 10 ** 18, 2 ** 63 - 1]
+
+
+# -------- reference (Decimal, quantized to the column) --------
+def ref_contracts(margin, entry, leverage):
+    return to_fixed(calculate_contracts(from_fixed(margin), from_fixed(entry), leverage).quantize(fp.QUANTUM))
+
+
+def ref_liquidation(entry, leverage, long):
+    side = "LONG" if long else "SHORT"
+    return to_fixed(liquidation_price(from_fixed(entry), leverage, side).quantize(fp.QUANTUM))
+
+
+def ref_pnl(entry, current, long, amount):
+    side = "LONG" if long else "SHORT"
+    return to_fixed(
+        calculate_pnl(from_fixed(entry), from_fixed(current), side, from_fixed(amount)).quantize(fp.QUANTUM)
+    )
+
+
+# -------- inputs --------
+def fixed(rnd, n, low, high):
+    """ Scaled ints spread over 10**low .. 10**high units, with 0-8 significant decimals """
+    values = 10 ** rnd.uniform(low, high, n)
+    decimals = rnd.integers(0, 9, n)
+    return (np.round(values * 10.0 ** decimals) * 10 ** (8 - decimals)).astype(np.int64)
+
+
+def near_ties(rnd, n, low, high, margins):
+    """
+    (margin, entry, leverage) whose exact contracts are 1 / (2 * entry)
+    unit off a half-way point: margin * leverage * SCALE = q * entry +
+    (entry +- 1) / 2, solved for q modulo leverage * SCALE; entries in
+    low .. high, margins below `margins`.
+    """
+    rows = []
+    while len(rows) < n:
+        entry = int(rnd.integers(low, high)) | 1
+        leverage = int(rnd.integers(1, 126))
+        if gcd(entry, leverage * SCALE) != 1:
+            continue
+        step = leverage * SCALE
+        half = (entry + int(rnd.choice([-1, 1]))) // 2
+        q = -half * pow(entry, -1, step) % step
+        limit = margins * step // entry
+        if q >= limit:
+            continue
+        q += int(rnd.integers(0, (limit - q) // step + 1)) * step
+        rows.append(((q * entry + half) // step, entry, leverage))
+    return [np.array(c, dtype=np.int64) for c in zip(*rows)]
+
+
+class FixedPointTests(SimpleTestCase):
+    """ The int64 array paths give exactly the quantized Decimal results """
+
+    def setUp(self):
+        self.rnd = np.random.default_rng(SEED)
+
+    def assertMatchesDecimal(self, array, ref, *columns):
+        columns = np.broadcast_arrays(*(np.asarray(c) for c in columns))
+        expected = []
+        for row in zip(*(c.tolist() for c in columns)):
+            try:
+                expected.append(ref(*row))
+            except ArithmeticError:
+                expected.append(None)
+        # inputs whose Decimal result does not fit a column (or int64) are not compared
+        valid = np.array([x is not None and abs(x) < 2 ** 63 for x in expected])
+        self.assertTrue(valid.any())
+
+        got = array(*(c[valid] for c in columns)).tolist()
+        expected = [x for x in expected if x is not None and abs(x) < 2 ** 63]
+        wrong = [(row, x, y) for row, x, y in zip(zip(*(c[valid].tolist() for c in columns)), expected, got) if x != y]
+        self.assertEqual(wrong[:5], [], f"{len(wrong)} of {len(expected)} differ")
+
+    def random_columns(self, n):
+        rnd = self.rnd
+        leverage = rnd.integers(1, 126, n)
+        long = rnd.random(n) < 0.5
+        margin = fixed(rnd, n, -2, 7)
+        entry = np.maximum(fixed(rnd, n, -8, 10.9), 1)
+        current = np.minimum(entry * np.maximum(1 + rnd.normal(0, 0.1, n), 0), 9e18).astype(np.int64)
+        amount = fixed(rnd, n, -8, 10.9)
+        return margin, entry, current, amount, leverage, long
+
+    # ===================== RANDOM =====================
+
+    def test_random(self):
+        margin, entry, current, amount, leverage, long = self.random_columns(N)
+        self.assertMatchesDecimal(fp.contracts_array, ref_contracts, margin, entry, leverage)
+        self.assertMatchesDecimal(fp.liquidation_array, ref_liquidation, entry, leverage, long)
+        self.assertMatchesDecimal(fp.pnl_array, ref_pnl, entry, current, long, amount)
+
+    # ===================== TIES =====================
+
+    def test_exact_ties(self):
+        rnd, k = self.rnd, N // 5
+        long = rnd.random(k) < 0.5
+
+        # contracts: margin * leverage / (2 * leverage) = margin / 2, odd margins are ties
+        leverage = rnd.integers(1, 126, k)
+        margin = 2 * rnd.integers(0, 10 ** 12, k) + 1
+        self.assertMatchesDecimal(fp.contracts_array, ref_contracts, margin, 2 * leverage * SCALE, leverage)
+        # ...and one unit either side of them
+        entry = 2 * leverage * SCALE + rnd.choice([-1, 1], k)
+        self.assertMatchesDecimal(fp.contracts_array, ref_contracts, margin, entry, leverage)
+
+        # liquidation: entry = leverage / 2 (mod leverage) with an even leverage
+        even = 2 * rnd.integers(1, 63, k)
+        entry = rnd.integers(0, 10 ** 15, k) * even + even // 2
+        self.assertMatchesDecimal(fp.liquidation_array, ref_liquidation, entry, even, long)
+
+        # pnl: 0.5 contracts * an odd number of units
+        entry = np.maximum(fixed(rnd, k, -8, 9), 10 ** 9)
+        current = entry + 2 * rnd.integers(-10 ** 8, 10 ** 8, k) + 1
+        self.assertMatchesDecimal(fp.pnl_array, ref_pnl, entry, current, long, SCALE // 2)
+
+    def test_near_ties(self):
+        # within the int64 path: inside its tie guard, recomputed in Decimal
+        margin, entry, leverage = near_ties(self.rnd, N // 5, 10 ** 13, fp.LIMIT // 10 ** 4, 10 ** 13)
+        self.assertMatchesDecimal(fp.contracts_array, ref_contracts, margin, entry, leverage)
+        # past it, within 1e-16 of a half-way point, where Decimal's 28 digits decide
+        margin, entry, leverage = near_ties(self.rnd, N // 5, 10 ** 16, 9 * 10 ** 16, 9 * 10 ** 18)
+        self.assertMatchesDecimal(fp.contracts_array, ref_contracts, margin, entry, leverage)
+
+    # ===================== EDGES =====================
+
+    def test_edge_values(self):
+        # every pairing of zero, 1 unit, 1 contract and values past the int64 paths
+        a, b = (c.ravel() for c in np.meshgrid(np.array(EDGES, dtype=np.int64), np.array(EDGES, dtype=np.int64)))
+        for leverage in (1, 2, 125):
+            self.assertMatchesDecimal(fp.contracts_array, ref_contracts, a, np.maximum(b, 1), leverage)
+        for long in (True, False):
+            self.assertMatchesDecimal(fp.liquidation_array, ref_liquidation, a, 2, long)
+            self.assertMatchesDecimal(fp.liquidation_array, ref_liquidation, a, 125, long)
+            self.assertMatchesDecimal(fp.pnl_array, ref_pnl, a, b, long, SCALE + 1)
+            self.assertMatchesDecimal(fp.pnl_array, ref_pnl, SCALE, a, long, b)
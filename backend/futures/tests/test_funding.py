@@ -0,0 +1,56 @@
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from futures import settlement
+from futures.models import FuturesPosition, FuturesWallet
+from wallet import ledger
+
+FUNDING_TIME = datetime(2026, 1, 1, 8, tzinfo=dt_timezone.utc)
+
+
+class PayFundingTests(TestCase):
+    """ settlement.pay_funding: per-user totals, booked as the wallets move """
+
+    def setUp(self):
+        users = User.objects.bulk_create([User(username=name) for name in ("long", "short", "broke")])
+        self.long, self.short, self.broke = (u.id for u in users)
+        self.start = {self.long: Decimal("1000"), self.short: Decimal("1000"), self.broke: Decimal("0.50")}
+        FuturesWallet.objects.bulk_create([FuturesWallet(user_id=u, balance=b) for u, b in self.start.items()])
+        FuturesPosition.objects.bulk_create([
+            self.position(self.long, FuturesPosition.LONG, "0.01234567"),
+            self.position(self.long, FuturesPosition.LONG, "0.07654321"),
+            self.position(self.short, FuturesPosition.SHORT, "0.0888888"),
+            self.position(self.broke, FuturesPosition.LONG, "10"),
+        ])
+
+    def position(self, user_id, side, amount):
+        return FuturesPosition(
+            user_id=user_id, symbol="BTCUSDT", side=side, entry_price=Decimal("100000"), amount=Decimal(amount),
+            leverage=10, initial_margin=Decimal("100"), liquidation_price=Decimal("90000"),
+        )
+
+    def balance(self, user_id):
+        return FuturesWallet.objects.get(user_id=user_id).balance
+
+    def test_payments_and_floor(self):
+        rate, mark = Decimal("0.0001"), Decimal("100000.5")
+        round_, = settlement.pay_funding(FUNDING_TIME, [("BTCUSDT", rate, mark)])
+        self.assertEqual(round_.positions, 4)
+
+        # each user's positions paid / received, rounded once to the wallet's cents
+        paid = (Decimal("0.01234567") + Decimal("0.07654321")) * rate * mark
+        received = Decimal("0.0888888") * rate * mark
+        self.assertEqual(self.balance(self.long), Decimal("1000") - paid.quantize(Decimal("0.01")))
+        self.assertEqual(self.balance(self.short), Decimal("1000") + received.quantize(Decimal("0.01")))
+        # owes 100 with 0.50 in the wallet: only what is there is taken
+        self.assertEqual(self.balance(self.broke), Decimal("0"))
+
+        # the ledger holds exactly the movements (no opening entries here)
+        for user_id, start in self.start.items():
+            self.assertEqual(ledger.balance(user_id, ledger.FUTURES), self.balance(user_id) - start)
+
+        # the same funding time is only paid once
+        self.assertEqual(settlement.pay_funding(FUNDING_TIME, [("BTCUSDT", rate, mark)]), [])
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import socket
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from futures import events, markprice, risk, valuation
+from futures.management.commands import markprice_stub, stream_markprices
+from futures.models import FuturesPosition, FuturesWallet
+
+FRAMES = markprice_stub.FIXTURE.read_text().splitlines()[:5]
+
+
+def trader(balance=Decimal("0")):
+    """ A user with a futures wallet (bulk_create: no post_save signals) """
+    user, = User.objects.bulk_create([User(username="trader")])
+    FuturesWallet.objects.create(user=user, balance=balance)
+    return user
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class MarkPriceStreamTests(TransactionTestCase):
+    """ stream_markprices against the local markprice_stub, engines on """
+
+    def setUp(self):
+        tmp = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(
+            MARK_PRICE_TABLE_PATH=str(tmp / "mark.tbl"),
+            ACCOUNT_EVENTS_PATH=str(tmp / "events.tbl"),
+            ACCOUNT_RISK_PATH=str(tmp / "risk.tbl"),
+            EXPOSURE_PATH=str(tmp / "exposure.tbl"),
+        ))
+        # process-wide handles would still point at the default paths
+        for module in (markprice, events, risk, valuation):
+            self.enterContext(mock.patch.multiple(module, _reader=None, _writer=None))
+
+    def stream(self, frames):
+        port = free_port()
+        stub = {"host": "127.0.0.1", "port": port, "interval": 0, "loop": False}
+        options = {
+            "url": f"ws://127.0.0.1:{port}/",
+            "record": None,
+            "max_frames": len(frames),
+            "no_liquidations": False,
+        }
+
+        async def run():
+            server = asyncio.create_task(markprice_stub.Command().serve(frames, stub))
+            try:
+                await asyncio.wait_for(stream_markprices.Command().stream(options), 30)
+            finally:
+                server.cancel()
+
+        asyncio.run(run())
+
+    def test_table_follows_the_stream(self):
+        self.stream(FRAMES)
+
+        last = {u["s"]: u for u in json.loads(FRAMES[-1])}
+        table = markprice.reader()
+        self.assertEqual(set(table.keys()), set(last))
+        for symbol, u in last.items():
+            self.assertEqual(markprice.table_mark_price(symbol), Decimal(repr(float(u["p"]))))
+            self.assertEqual(table.version(symbol), len(FRAMES))
+            self.assertEqual(table.get(symbol)["event_time"], u["E"])
+
+    def test_open_position_fills_at_the_streamed_mark(self):
+        self.stream(FRAMES)
+        user = trader(Decimal("1000"))
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with mock.patch.object(markprice, "arest_mark_price", side_effect=AssertionError("REST call")):
+            response = client.post(
+                "/api/futures/open/",
+                {"symbol": "BTCUSDT", "side": "BUY", "margin": "100", "leverage": "5"},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, 200, response.data)
+        pos = FuturesPosition.objects.get(user=user)
+        self.assertEqual(pos.entry_price, markprice.table_mark_price("BTCUSDT"))
+
+    def test_batch_opens_fill_at_the_mark_only(self):
+        self.stream(FRAMES)
+        user = trader(Decimal("1000"))
+        client = APIClient()
+        client.force_authenticate(user)
+        order = {"symbol": "BTCUSDT", "side": "BUY", "margin": "100", "leverage": "5"}
+
+        response = client.post("/api/futures/batch/", {"open": [{**order, "price": "1"}]}, format="json")
+        self.assertEqual(response.status_code, 400, response.data)
+        self.assertFalse(FuturesPosition.objects.filter(user=user).exists())
+
+        response = client.post("/api/futures/batch/", {"open": [order]}, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        pos = FuturesPosition.objects.get(user=user)
+        self.assertEqual(pos.entry_price, markprice.table_mark_price("BTCUSDT"))
+
+    def test_stream_publishes_the_exposure(self):
+        self.stream(FRAMES)
+        user = trader(Decimal("1000"))
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post(
+            "/api/futures/open/",
+            {"symbol": "BTCUSDT", "side": "BUY", "margin": "100", "leverage": "5"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+
+        self.stream(FRAMES)
+
+        pos = FuturesPosition.objects.get(user=user)
+        mark = markprice.table_mark_price("BTCUSDT")
+        data = valuation.exposure()
+        self.assertEqual(data["total"]["positions"], 1)
+        btc, = data["symbols"]
+        self.assertEqual(btc["symbol"], "BTCUSDT")
+        self.assertEqual(btc["long"], f"{float(pos.amount * mark):.2f}")
+        self.assertEqual(btc["short"], "0.00")
+        self.assertAlmostEqual(float(btc["unrealized_pnl"]), float((mark - pos.entry_price) * pos.amount), 6)
+
+    def test_invalid_open_skips_the_price_fetch(self):
+        user = trader()
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with mock.patch("futures.views.aget_mark_price", side_effect=AssertionError("price fetched")):
+            for body in (
+                {"side": "HOLD", "leverage": "5", "margin": "100"},
+                {"side": "BUY", "leverage": "500", "margin": "100"},
+                {"side": "BUY", "leverage": "5", "margin": "-1"},
+            ):
+                response = client.post("/api/futures/open/", {"symbol": "BTCUSDT", **body}, format="json")
+                self.assertEqual(response.status_code, 400, body)
@@ -0,0 +1,60 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import OperationalError
+from django.test import TestCase
+
+from futures.liquidation import LiquidationEngine
+from futures.models import FuturesPosition, FuturesWallet
+from futures.risk import RiskEngine
+from wallet import ledger
+from wallet.models import LedgerEntry
+
+LOCKED = OperationalError("database is locked")
+
+
+class EngineSyncTests(TestCase):
+    """ A database error in an engine's periodic sync is retried, never raised into the stream """
+
+    def setUp(self):
+        self.user, = User.objects.bulk_create([User(username="synced")])
+        FuturesWallet.objects.bulk_create([
+            FuturesWallet(user=self.user, balance=Decimal("1000"), margin_mode=FuturesWallet.CROSS)
+        ])
+        FuturesPosition.objects.bulk_create([
+            FuturesPosition(
+                user=self.user, symbol="BTCUSDT", side=FuturesPosition.LONG, entry_price=Decimal("100000"),
+                amount=Decimal("0.01"), leverage=10, initial_margin=Decimal("100"),
+                liquidation_price=Decimal("90000"), margin_mode=FuturesWallet.CROSS,
+            )
+        ])
+
+    def test_failed_sync_keeps_next_sync(self):
+        engine = LiquidationEngine()
+        engine.load()
+        engine.next_sync = 0
+        with mock.patch.object(engine, "sync", side_effect=LOCKED) as sync:
+            self.assertEqual(engine.on_ticks([("BTCUSDT", {"mark_price": 100000.0})]), [])
+            self.assertEqual(engine.on_ticks([]), [])
+        self.assertEqual(sync.call_count, 2)
+        self.assertEqual(engine.next_sync, 0)
+
+    def test_failed_reload_is_synced_again(self):
+        engine = RiskEngine()
+        engine.load()
+        slot = engine.slots[self.user.id]
+
+        # a balance movement the sync has to pick up
+        FuturesWallet.objects.filter(user=self.user).update(balance=Decimal("1250"))
+        ledger.record([ledger.entry(self.user.id, ledger.FUTURES, LedgerEntry.DEPOSIT, Decimal("250"))])
+
+        engine.next_sync = 0
+        with mock.patch.object(engine, "reload", side_effect=LOCKED):
+            engine.on_ticks([])
+        self.assertEqual(engine.balance[slot], 1000)
+        self.assertEqual(engine.next_sync, 0)
+
+        engine.on_ticks([])
+        self.assertEqual(engine.balance[slot], 1250)
+        self.assertGreater(engine.next_sync, 0)
@@ -0,0 +1,334 @@
+# futures/triggers.py
+#
+# Take-profit / stop-loss / trailing stop orders, run inside
+# `manage.py stream_markprices` next to the liquidation engine.
+#
+# Each symbol has a TriggerBook of heaps keyed by trigger price: one for
+# the triggers that fire when the mark rises to them (long TP, short SL,
+# short trailing) and one for those that fire when it falls to them. A
+# tick only pops the triggers it crossed, so its cost does not depend on
+# how many orders are waiting. Trailing stops sit in one more heap keyed
+# by their best price (peak / trough): only the ones the mark went past
+# are moved. Replaced heap entries are skipped lazily (generation number)
+# and the heaps are rebuilt when they pile up.
+#
+# Fired triggers close their position through futures.settlement, the
+# same path as POST /close/.
+
+from datetime import timedelta
+from decimal import Decimal
+from heapq import heapify, heappop, heappush
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from . import clock, settlement
+from .models import FuturesPosition, TriggerOrder
+
+MIN_CALLBACK_RATE = Decimal("0.1")
+MAX_CALLBACK_RATE = Decimal("10")
+
+
+class Trigger:
+    __slots__ = ("id", "position_id", "symbol", "above", "price", "rate", "peak", "gen")
+
+    def __init__(self, id, position_id, symbol, above, price, rate=None, peak=None):
+        self.id = id
+        self.position_id = position_id
+        self.symbol = symbol
+        self.above = above       # fires when mark >= price, else when mark <= price
+        self.price = price
+        self.rate = rate         # trailing: callback rate as a fraction
+        self.peak = peak         # trailing: best mark seen
+        self.gen = 0
+
+    def entries(self):
+        return 1 if self.rate is None else 2
+
+
+class TriggerBook:
+    """ Waiting triggers of one symbol """
+
+    __slots__ = ("above", "below", "rise", "fall", "live")
+
+    def __init__(self):
+        self.above = []          # (price, id, gen)   min first
+        self.below = []          # (-price, id, gen)  max first
+        self.rise = []           # long trailing (peak, id, gen): moved when mark > peak
+        self.fall = []           # short trailing (-trough, id, gen): moved when mark < trough
+        self.live = 0            # entries belonging to live triggers
+
+    def push(self, t):
+        if t.above:
+            heappush(self.above, (t.price, t.id, t.gen))
+        else:
+            heappush(self.below, (-t.price, t.id, t.gen))
+
+        if t.rate is not None:
+            if t.above:
+                heappush(self.fall, (-t.peak, t.id, t.gen))
+            else:
+                heappush(self.rise, (t.peak, t.id, t.gen))
+
+    def tick(self, mark, orders):
+        """ (fired triggers, trailing triggers moved) at this mark """
+        moved = []
+
+        # trailing stops follow the mark first, so they can't fire on the
+        # tick that moved them
+        while self.rise and self.rise[0][0] < mark:
+            t = _live(heappop(self.rise), orders)
+            if t:
+                t.gen += 1
+                t.peak, t.price = mark, mark * (1 - t.rate)
+                self.push(t)
+                moved.append(t)
+
+        while self.fall and -self.fall[0][0] > mark:
+            t = _live(heappop(self.fall), orders)
+            if t:
+                t.gen += 1
+                t.peak, t.price = mark, mark * (1 + t.rate)
+                self.push(t)
+                moved.append(t)
+
+        fired = []
+        while self.above and self.above[0][0] <= mark:
+            t = _live(heappop(self.above), orders)
+            if t:
+                fired.append(t)
+
+        while self.below and -self.below[0][0] >= mark:
+            t = _live(heappop(self.below), orders)
+            if t:
+                fired.append(t)
+
+        return fired, moved
+
+    def size(self):
+        return len(self.above) + len(self.below) + len(self.rise) + len(self.fall)
+
+    def rebuild(self, triggers):
+        """ Drop the stale entries """
+        self.above = [(t.price, t.id, t.gen) for t in triggers if t.above]
+        self.below = [(-t.price, t.id, t.gen) for t in triggers if not t.above]
+        self.rise = [(t.peak, t.id, t.gen) for t in triggers if t.rate is not None and not t.above]
+        self.fall = [(-t.peak, t.id, t.gen) for t in triggers if t.rate is not None and t.above]
+        for heap in (self.above, self.below, self.rise, self.fall):
+            heapify(heap)
+
+
+class TriggerEngine:
+    def __init__(self):
+        self.books = {}          # symbol -> TriggerBook
+        self.orders = {}         # trigger id -> Trigger
+        self.moved = {}          # trailing triggers not written back yet
+        self.synced_at = None
+        self.next_sync = 0
+
+    def add(self, t):
+        if t.id in self.orders:
+            return
+        book = self.books.get(t.symbol)
+        if book is None:
+            book = self.books[t.symbol] = TriggerBook()
+        self.orders[t.id] = t
+        book.live += t.entries()
+        book.push(t)
+
+    def remove(self, trigger_id):
+        t = self.orders.pop(trigger_id, None)
+        if t is not None:
+            self.moved.pop(trigger_id, None)
+            self.books[t.symbol].live -= t.entries()
+        return t
+
+    # ===================== LOADING =====================
+
+    def load(self):
+        """ Index every active trigger (startup) """
+        self.synced_at = timezone.now()
+        for row in _active().iterator(chunk_size=10000):
+            self.add(_trigger(*row))
+        self.next_sync = clock.monotonic() + settings.LIQUIDATION_SYNC_INTERVAL
+        return len(self.orders)
+
+    def sync(self):
+        """ Pick up triggers created / finished since the last sync, write back trailing stops """
+        now = timezone.now()
+        since = self.synced_at - timedelta(seconds=settings.LIQUIDATION_SYNC_OVERLAP)
+
+        for row in _active().filter(created_at__gte=since):
+            self.add(_trigger(*row))
+
+        finished = TriggerOrder.objects.filter(finished_at__gte=since).exclude(
+            status=TriggerOrder.ACTIVE
+        ).values_list("id", flat=True)
+        for trigger_id in finished:
+            self.remove(trigger_id)
+
+        self.flush()
+        self.synced_at = now
+        self.next_sync = clock.monotonic() + settings.LIQUIDATION_SYNC_INTERVAL
+
+        by_symbol = {}
+        for symbol, book in self.books.items():
+            if book.size() > 2 * book.live + 1024:
+                by_symbol[symbol] = []
+        if by_symbol:
+            for t in self.orders.values():
+                if t.symbol in by_symbol:
+                    by_symbol[t.symbol].append(t)
+            for symbol, triggers in by_symbol.items():
+                self.books[symbol].rebuild(triggers)
+
+    def flush(self):
+        """ Persist trailing stops that moved """
+        if not self.moved:
+            return
+        TriggerOrder.objects.bulk_update(
+            [
+                TriggerOrder(id=t.id, peak=_decimal(t.peak), trigger_price=_decimal(t.price))
+                for t in self.moved.values()
+            ],
+            ["peak", "trigger_price"],
+            batch_size=500,
+        )
+        self.moved = {}
+
+    # ===================== TICKS =====================
+
+    def on_ticks(self, ticks):
+        """
+        Fire everything crossed by a batch of (symbol, {"mark_price"}) ticks.
+        Returns {position id: (pnl, user id)} closed.
+        """
+        if self.synced_at is not None and clock.monotonic() >= self.next_sync:
+            try:
+                self.sync()
+            except DatabaseError as e:
+                # next_sync is left as it was: the next tick retries
+                print("❌ TRIGGER SYNC ERROR:", e)
+
+        fired = []
+        for symbol, values in ticks:
+            book = self.books.get(symbol)
+            if book is None or values.get("mark_price") is None:
+                continue
+            mark = float(values["mark_price"])
+            hits, moved = book.tick(mark, self.orders)
+            for t in moved:
+                self.moved[t.id] = t
+            fired += [(t, values["mark_price"]) for t in hits]
+
+        if not fired:
+            return {}
+
+        fills, seen = [], set()
+        for t, price in fired:
+            self.remove(t.id)
+            if t.position_id not in seen:
+                seen.add(t.position_id)
+                fills.append((t.position_id, Decimal(price), t.id))
+
+        try:
+            return settlement.close_many(fills)
+        except Exception as e:
+            # put them back, the next tick retries
+            print("❌ TRIGGER SETTLEMENT ERROR:", e)
+            for t, _ in fired:
+                self.add(t)
+            return {}
+
+
+# ===================== ORDERS (views) =====================
+
+KINDS = {
+    "take_profit": TriggerOrder.TAKE_PROFIT,
+    "stop_loss": TriggerOrder.STOP_LOSS,
+    "trailing_stop": TriggerOrder.TRAILING_STOP,
+}
+
+
+def parse(data, side, reference, liq_price):
+    """
+    {kind: value or None} for the take_profit / stop_loss / trailing_stop
+    keys present in data (None = remove). Prices are checked against the
+    reference price (entry or current mark) and the liquidation price;
+    trailing_stop is a callback rate in percent. Raises ValueError.
+    """
+    parsed = {}
+    for key, kind in KINDS.items():
+        if key not in data:
+            continue
+        value = data[key]
+        if value in (None, ""):
+            parsed[kind] = None
+            continue
+
+        try:
+            value = Decimal(str(value))
+        except ArithmeticError:
+            raise ValueError(f"Invalid {key}")
+        if not value.is_finite() or value <= 0:
+            raise ValueError(f"Invalid {key}")
+
+        long = side == FuturesPosition.LONG
+        if kind == TriggerOrder.TAKE_PROFIT:
+            if (value <= reference) if long else (value >= reference):
+                raise ValueError(f"Take profit must be {'above' if long else 'below'} {reference}")
+        elif kind == TriggerOrder.STOP_LOSS:
+            if not (liq_price < value < reference if long else reference < value < liq_price):
+                raise ValueError("Stop loss must be between the price and the liquidation price")
+        elif not (MIN_CALLBACK_RATE <= value <= MAX_CALLBACK_RATE):
+            raise ValueError(f"Trailing stop must be {MIN_CALLBACK_RATE}-{MAX_CALLBACK_RATE}%")
+
+        parsed[kind] = value
+    return parsed
+
+
+def build(pos, parsed, reference):
+    """ Unsaved TriggerOrders for the non-None entries of parse() """
+    orders = []
+    for kind, value in parsed.items():
+        if value is None:
+            continue
+        order = TriggerOrder(position=pos, symbol=pos.symbol, kind=kind, trigger_price=value)
+        if kind == TriggerOrder.TRAILING_STOP:
+            rate = value / 100
+            order.callback_rate = value
+            order.peak = reference
+            order.trigger_price = (
+                reference * (1 - rate) if pos.side == FuturesPosition.LONG else reference * (1 + rate)
+            ).quantize(Decimal("1e-8"))
+        orders.append(order)
+    return orders
+
+
+# -------- helpers --------
+def _active():
+    return TriggerOrder.objects.filter(status=TriggerOrder.ACTIVE).values_list(
+        "id", "position_id", "symbol", "kind", "position__side",
+        "trigger_price", "callback_rate", "peak",
+    )
+
+
+def _trigger(trigger_id, position_id, symbol, kind, side, price, rate, peak):
+    above = (kind == TriggerOrder.TAKE_PROFIT) == (side == FuturesPosition.LONG)
+    return Trigger(
+        trigger_id, position_id, symbol, above, float(price),
+        float(rate) / 100 if rate is not None else None,
+        float(peak) if peak is not None else None,
+    )
+
+
+def _live(entry, orders):
+    """ The trigger of a heap entry, or None if it was replaced / removed """
+    _, trigger_id, gen = entry
+    t = orders.get(trigger_id)
+    return t if t is not None and t.gen == gen else None
+
+
+def _decimal(value):
+    return Decimal(repr(round(value, 8)))
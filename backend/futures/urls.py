@@ -1,9 +1,25 @@
 from django.urls import path
-from .views import open_position, get_open_positions, close_position, get_wallet
+from .views import (
+    open_position, get_open_positions, close_position, get_wallet, get_account, set_triggers,
+    limit_orders, cancel_limit_order, get_history, get_stats, batch_orders, set_margin_mode,
+    get_exposure,
+)
+from .stream import account_stream, stream_ticket
 
 urlpatterns = [
     path("open/", open_position),
     path("positions/", get_open_positions),
     path("close/<int:position_id>/", close_position),
+    path("batch/", batch_orders),
+    path("positions/<int:position_id>/triggers/", set_triggers),
     path("wallet/", get_wallet),
+    path("account/", get_account),
+    path("margin-mode/", set_margin_mode),
+    path("history/", get_history),
+    path("stats/", get_stats),
+    path("exposure/", get_exposure),
+    path("orders/", limit_orders),
+    path("orders/<int:order_id>/cancel/", cancel_limit_order),
+    path("stream/", account_stream),
+    path("stream/ticket/", stream_ticket),
 ]
\ No newline at end of file
@@ -0,0 +1,383 @@
+# futures/valuation.py
+#
+# Mark-to-market of open positions in one vectorized pass. Positions are
+# loaded into NumPy columns (symbol code, side sign, entry, amount,
+# margin, liquidation price); a tick gathers one mark per symbol code and
+# revalues every position with a handful of array operations, instead of
+# one Decimal calculate_pnl() per position.
+#
+#   unrealized_pnl        sign * (mark - entry) * amount
+#   roe                   unrealized PnL / initial margin, %
+#   margin_ratio          share of the margin already lost, % (100 = liquidation)
+#   liquidation_distance  how far the mark can still move against the position, %
+#
+# Floats: these are display / risk numbers. Money that moves between
+# wallets is still computed in Decimal by futures.settlement.
+#
+# ValuationEngine runs inside `manage.py stream_markprices` next to the
+# other engines: it holds every open position in one Positions book
+# (synced from the DB like the liquidation engine), revalues the whole
+# book on every frame and publishes the platform exposure per symbol to
+# a shared table, read by exposure() in any worker.
+
+from datetime import timedelta
+import math
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+import numpy as np
+
+from markets.pricetable import SharedTable
+
+from . import clock, markprice
+from .models import FuturesPosition
+
+# Positions row, as read from the DB
+ROW = ("id", "user_id", "symbol", "side", "entry_price", "amount", "initial_margin", "liquidation_price")
+
+# table key of the platform totals; its updated_at is the engine's heartbeat
+TOTAL = "*"
+
+
+class Positions:
+    """ Open positions as NumPy columns """
+
+    __slots__ = ("ids", "user_ids", "symbols", "code", "sign", "entry", "amount", "margin", "liq")
+
+    def __init__(self, rows):
+        """ rows: (id, user id, symbol, side, entry price, amount, initial margin, liquidation price) """
+        rows = list(rows)
+        if rows:
+            ids, user_ids, symbols, sides, entry, amount, margin, liq = zip(*rows)
+        else:
+            ids = user_ids = symbols = sides = entry = amount = margin = liq = ()
+
+        n = len(rows)
+        codes = {}
+        self.ids = np.fromiter(ids, np.int64, n)
+        self.user_ids = np.fromiter(user_ids, np.int64, n)
+        self.code = np.fromiter((codes.setdefault(s, len(codes)) for s in symbols), np.int64, n)
+        self.symbols = np.array(list(codes), dtype=str)
+        self.sign = np.fromiter((1.0 if s == FuturesPosition.LONG else -1.0 for s in sides), float, n)
+        self.entry = np.fromiter(map(float, entry), float, n)
+        self.amount = np.fromiter(map(float, amount), float, n)
+        self.margin = np.fromiter(map(float, margin), float, n)
+        self.liq = np.fromiter(map(float, liq), float, n)
+
+    @classmethod
+    def from_models(cls, positions):
+        return cls(
+            (p.id, p.user_id, p.symbol, p.side, p.entry_price, p.amount, p.initial_margin, p.liquidation_price)
+            for p in positions
+        )
+
+    @classmethod
+    def load(cls, queryset=None):
+        """ Every open position (or those of queryset) """
+        queryset = FuturesPosition.objects.filter(status=FuturesPosition.OPEN) if queryset is None else queryset
+        return cls(queryset.values_list(*ROW).iterator(chunk_size=10000))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def merged(self, other):
+        """ A book of these positions and other's """
+        codes = {s: i for i, s in enumerate(self.symbols.tolist())}
+        remap = np.fromiter(
+            (codes.setdefault(s, len(codes)) for s in other.symbols.tolist()), np.int64, len(other.symbols)
+        )
+        book = Positions(())
+        for name in self.__slots__:
+            if name not in ("symbols", "code"):
+                setattr(book, name, np.concatenate([getattr(self, name), getattr(other, name)]))
+        book.code = np.concatenate([self.code, remap[other.code]])
+        book.symbols = np.array(list(codes), dtype=str)
+        return book
+
+    def subset(self, keep):
+        """ A book of the positions where the boolean array keep is set (symbols unchanged) """
+        book = Positions(())
+        for name in self.__slots__:
+            setattr(book, name, getattr(self, name) if name == "symbols" else getattr(self, name)[keep])
+        return book
+
+    def marks(self, prices):
+        """ Mark per symbol code from {symbol: price}; NaN where unknown """
+        return np.array([prices.get(s, np.nan) for s in self.symbols.tolist()], dtype=float)
+
+    def value(self, prices):
+        """ {metric: array per position} at {symbol: mark price} """
+        mark = self.marks(prices)[self.code]
+        pnl = self.sign * (mark - self.entry) * self.amount
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "mark_price": mark,
+                "unrealized_pnl": pnl,
+                "roe": pnl / self.margin * 100,
+                "margin_ratio": np.maximum(-pnl, 0) / self.margin * 100,
+                "liquidation_distance": self.sign * (mark - self.liq) / mark * 100,
+                "notional": self.amount * mark,
+            }
+
+    def exposure(self, values):
+        """ Per symbol: open positions, long / short notional, unrealized PnL """
+        n = len(self.symbols)
+        long = self.sign > 0
+        notional = np.nan_to_num(values["notional"])
+        pnl = np.nan_to_num(values["unrealized_pnl"])
+        return {
+            "symbols": self.symbols,
+            "positions": np.bincount(self.code, minlength=n),
+            "long": np.bincount(self.code, weights=notional * long, minlength=n),
+            "short": np.bincount(self.code, weights=notional * ~long, minlength=n),
+            "unrealized_pnl": np.bincount(self.code, weights=pnl, minlength=n),
+        }
+
+
+def current_marks(symbols):
+    """ {symbol: float mark} from the mark-price table; stale / missing symbols are left out """
+    prices = {}
+    for symbol in set(symbols):
+        price = markprice.table_mark_price(symbol)
+        if price is not None:
+            prices[symbol] = float(price)
+    return prices
+
+
+# ===================== PLATFORM (stream_markprices) =====================
+
+class Exposure(SharedTable):
+    """ Binance symbol -> open positions, long / short notional and unrealized PnL at the mark """
+
+    MAGIC = b"CFX1"
+    KEY_SIZE = 24
+    TAG_SIZE = 8
+    FIELDS = ("positions", "long", "short", "unrealized_pnl", "mark_price", "updated_at")
+
+
+class ValuationEngine:
+    def __init__(self, table=None):
+        self.table = table       # Exposure to publish to (None: keep it in memory)
+        self.book = Positions(())
+        self.marks = {}          # symbol -> last mark
+        self.values = None       # value() of the book at the last frame
+        self.exposure = None
+
+        self.synced_at = None
+        self.next_sync = 0
+        self.next_publish = 0
+        self.recent = {}         # position id -> opened_at, for the sync overlap
+
+    def __len__(self):
+        return len(self.book)
+
+    def load(self):
+        """ Every open position (startup) """
+        self.synced_at = timezone.now()
+        self.book = Positions.load()
+        self.marks.update(current_marks(self.book.symbols.tolist()))
+        self.next_sync = clock.monotonic() + settings.LIQUIDATION_SYNC_INTERVAL
+        return len(self)
+
+    def sync(self):
+        """ Pick up positions opened / closed since the last sync """
+        now = timezone.now()
+        since = self.synced_at - timedelta(seconds=settings.LIQUIDATION_SYNC_OVERLAP)
+
+        opened = []
+        rows = FuturesPosition.objects.filter(status=FuturesPosition.OPEN, opened_at__gte=since).values_list(
+            *ROW, "opened_at"
+        )
+        for *row, opened_at in rows:
+            if row[0] not in self.recent:
+                self.recent[row[0]] = opened_at
+                opened.append(row)
+
+        closed = list(
+            FuturesPosition.objects.filter(closed_at__gte=since).exclude(status=FuturesPosition.OPEN)
+            .values_list("id", flat=True)
+        )
+        if closed:
+            self.book = self.book.subset(~np.isin(self.book.ids, closed))
+        if opened:
+            self.book = self.book.merged(Positions(opened))
+
+        self.recent = {p: t for p, t in self.recent.items() if t >= since}
+        self.synced_at = now
+        self.next_sync = clock.monotonic() + settings.LIQUIDATION_SYNC_INTERVAL
+
+    def on_ticks(self, ticks):
+        """
+        Revalue every open position at the marks after a batch of (symbol,
+        {"mark_price"}) ticks. Returns the exposure per symbol (Positions.exposure()).
+        """
+        if self.synced_at is not None and clock.monotonic() >= self.next_sync:
+            try:
+                self.sync()
+            except DatabaseError as e:
+                # next_sync is left as it was: the next tick retries
+                print("❌ VALUATION SYNC ERROR:", e)
+
+        for symbol, values in ticks:
+            if values.get("mark_price") is not None:
+                self.marks[symbol] = float(values["mark_price"])
+
+        self.values = self.book.value(self.marks)
+        self.exposure = self.book.exposure(self.values)
+        if self.table is not None and clock.monotonic() >= self.next_publish:
+            self.publish()
+        return self.exposure
+
+    def flush(self):
+        """ Publish the last frame's exposure now (shutdown) """
+        if self.table is not None and self.exposure is not None:
+            self.publish()
+
+    def publish(self):
+        """ Write every symbol's exposure and the platform totals (the heartbeat) """
+        now = time.time()
+        e = self.exposure
+        marks = self.book.marks(self.marks)
+        rows = [
+            (symbol, None, {
+                "positions": e["positions"][i], "long": e["long"][i], "short": e["short"][i],
+                "unrealized_pnl": e["unrealized_pnl"][i], "mark_price": marks[i], "updated_at": now,
+            })
+            for i, symbol in enumerate(e["symbols"].tolist())
+        ]
+        rows.append((TOTAL, None, {
+            "positions": len(self.book), "long": e["long"].sum(), "short": e["short"].sum(),
+            "unrealized_pnl": e["unrealized_pnl"].sum(), "updated_at": now,
+        }))
+
+        self.table.upsert(rows)
+        self.next_publish = clock.monotonic() + settings.EXPOSURE_PUBLISH_INTERVAL
+        return len(rows) - 1
+
+
+def exposure():
+    """
+    {"total": {...}, "symbols": [{...}]} as last published by the engine,
+    largest gross notional first; None when the engine is not running
+    """
+    table = reader()
+    total = table.get(TOTAL) if table else None
+    if total is None or time.time() - total["updated_at"] > settings.EXPOSURE_MAX_AGE:
+        return None
+
+    symbols = []
+    for symbol in table.keys():
+        record = table.get(symbol) if symbol != TOTAL else None
+        if record and record["positions"]:
+            symbols.append(_exposure_data(record, symbol=symbol, mark_price=_money(record["mark_price"])))
+    symbols.sort(key=lambda r: -(float(r["long"]) + float(r["short"])))
+    return {"total": _exposure_data(total), "symbols": symbols, "updated_at": total["updated_at"]}
+
+
+def _exposure_data(record, **extra):
+    return {
+        **extra,
+        "positions": int(record["positions"]),
+        "long": f"{record['long']:.2f}",
+        "short": f"{record['short']:.2f}",
+        "net": f"{record['long'] - record['short']:.2f}",
+        "unrealized_pnl": f"{record['unrealized_pnl']:.8f}",
+    }
+
+
+# ===================== PER USER (views) =====================
+
+def position_values(positions):
+    """ [{metric: value}] for a few position models, None where there is no fresh mark """
+    positions = list(positions)
+    if not positions:
+        return []
+
+    book = Positions.from_models(positions)
+    values = book.value(current_marks(book.symbols.tolist()))
+    return [
+        {
+            "mark_price": _money(values["mark_price"][i]),
+            "unrealized_pnl": _money(values["unrealized_pnl"][i]),
+            "roe": _num(values["roe"][i], 4),
+            "margin_ratio": _num(values["margin_ratio"][i], 4),
+            "liquidation_distance": _num(values["liquidation_distance"][i], 4),
+        }
+        for i in range(len(positions))
+    ]
+
+
+def account_summary(balance, positions, reserved=0):
+    """
+    Totals of one futures account: balance, margin in positions and in
+    open orders, unrealized PnL, equity and per-symbol exposure.
+    """
+    positions = list(positions)
+    balance = float(balance)
+    book = Positions.from_models(positions)
+    values = book.value(current_marks(book.symbols.tolist()))
+
+    priced = ~np.isnan(values["mark_price"])
+    margin = float(book.margin.sum())
+    pnl = float(values["unrealized_pnl"][priced].sum())
+    exposure = book.exposure(values)
+    distance = values["liquidation_distance"][priced]
+
+    return {
+        "balance": f"{balance:.2f}",
+        "position_margin": f"{margin:.8f}",
+        "order_margin": f"{float(reserved):.8f}",
+        "unrealized_pnl": f"{pnl:.8f}",
+        "equity": f"{balance + margin + float(reserved) + pnl:.8f}",
+        "roe": _num(pnl / margin * 100, 4) if margin else None,
+        "open_positions": len(book),
+        "unpriced_positions": int((~priced).sum()),
+        "closest_liquidation": _num(distance.min(), 4) if len(distance) else None,
+        "exposure": [
+            {
+                "symbol": symbol,
+                "positions": int(exposure["positions"][i]),
+                "long": f"{exposure['long'][i]:.2f}",
+                "short": f"{exposure['short'][i]:.2f}",
+                "net": f"{exposure['long'][i] - exposure['short'][i]:.2f}",
+                "unrealized_pnl": f"{exposure['unrealized_pnl'][i]:.8f}",
+            }
+            for i, symbol in enumerate(exposure["symbols"].tolist())
+        ],
+    }
+
+
+# -------- helpers --------
+def _num(value, digits):
+    value = float(value)
+    return None if math.isnan(value) or math.isinf(value) else round(value, digits)
+
+
+def _money(value):
+    value = float(value)
+    return None if math.isnan(value) else f"{value:.8f}"
+
+
+# ===================== PROCESS-WIDE HANDLES =====================
+
+_reader = None
+_writer = None
+
+
+def reader():
+    global _reader
+    if _reader is None:
+        try:
+            _reader = Exposure(settings.EXPOSURE_PATH)
+        except (FileNotFoundError, ValueError):
+            return None
+    return _reader
+
+
+def writer():
+    global _writer
+    if _writer is None:
+        _writer = Exposure(settings.EXPOSURE_PATH, capacity=settings.EXPOSURE_CAPACITY, writable=True)
+    return _writer
@@ -1,13 +1,23 @@
+from adrf.decorators import api_view as async_api_view
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
 from decimal import Decimal, InvalidOperation
+import asyncio
+import binascii
+import math
 
-import requests
-
-from .models import FuturesWallet, FuturesPosition
-from .utils import calculate_contracts, liquidation_price, calculate_pnl
+from .models import FuturesWallet, FuturesPosition, LimitOrder, TriggerOrder
+from . import archive, events, markprice, risk, settlement, triggers, valuation
+from .utils import calculate_contracts, calculate_pnl, liquidation_price
+from .markprice import aget_mark_price
+from wallet import services
 
 
 # ---------------------------------------------------------
@@ -32,117 +42,362 @@ def get_wallet(request):
 def get_open_positions(request):
     user = request.user
 
+    positions = list(open_positions(user))
+    values = valuation.position_values(positions)
+
+    return Response([{**position_data(p), **v} for p, v in zip(positions, values)])
+
+
+# ---------------------------------------------------------
+# ACCOUNT SUMMARY (equity, margin, unrealized PnL, exposure)
+# ---------------------------------------------------------
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_account(request):
+    user = request.user
+    wallet, _ = FuturesWallet.objects.get_or_create(user=user)
+
     positions = FuturesPosition.objects.filter(user=user, status="OPEN")
+    reserved = sum(open_orders(user).values_list("margin", flat=True), Decimal("0"))
+
+    return Response({
+        **valuation.account_summary(wallet.balance, positions, reserved),
+        "margin_mode": wallet.margin_mode,
+        # published by the risk engine: one record read, not a pass over the positions
+        "cross": risk_data(risk.current(user.id, wallet.balance)),
+    })
 
-    return Response([
-        {
-            "id": p.id,
-            "symbol": p.symbol,
-            "side": p.side,
-            "entry_price": str(p.entry_price),
-            "amount": str(p.amount),
-            "leverage": p.leverage,
-            "initial_margin": str(p.initial_margin),
-            "liquidation_price": str(p.liquidation_price),
-        }
-        for p in positions
-    ])
+
+def risk_data(r):
+    ratio = r["margin_ratio"]
+    return {
+        "equity": f"{r['equity']:.8f}",
+        "position_margin": f"{r['margin']:.8f}",
+        "unrealized_pnl": f"{r['unrealized_pnl']:.8f}",
+        "maintenance_margin": f"{r['maintenance']:.8f}",
+        # None: nothing left to cover the maintenance
+        "margin_ratio": round(ratio, 4) if math.isfinite(ratio) else None,
+        "positions": int(r["positions"]),
+    }
 
 
 # ---------------------------------------------------------
-# OPEN NEW POSITION
+# MARGIN MODE (ISOLATED / CROSS), for the positions opened from now on
 # ---------------------------------------------------------
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
-def open_position(request):
+def set_margin_mode(request):
     user = request.user
 
-    required = ["symbol", "side", "margin", "leverage", "price"]
+    mode = request.data.get("margin_mode")
+    if mode not in (FuturesWallet.ISOLATED, FuturesWallet.CROSS):
+        return Response({"error": "margin_mode must be ISOLATED or CROSS"}, status=400)
+
+    FuturesWallet.objects.get_or_create(user=user)
+    with transaction.atomic():
+        # the wallet row first: takes the write lock before the checks
+        FuturesWallet.objects.filter(user=user).update(margin_mode=mode)
+        if open_orders(user).exists() or FuturesPosition.objects.filter(
+            user=user, status=FuturesPosition.OPEN
+        ).exclude(margin_mode=mode).exists():
+            transaction.set_rollback(True)
+            return Response({"error": "Close your positions and orders before switching margin mode"}, status=400)
+
+    return Response({"margin_mode": mode})
+
+
+def open_positions(user):
+    """ Open positions with their active triggers prefetched (for position_data) """
+    return FuturesPosition.objects.filter(user=user, status="OPEN").order_by("id").prefetch_related(
+        Prefetch(
+            "triggers",
+            queryset=TriggerOrder.objects.filter(status=TriggerOrder.ACTIVE),
+            to_attr="active_triggers",
+        )
+    )
+
+
+def position_data(p):
+    active = {t.kind: t for t in getattr(p, "active_triggers", ())}
+    tp = active.get(TriggerOrder.TAKE_PROFIT)
+    sl = active.get(TriggerOrder.STOP_LOSS)
+    trailing = active.get(TriggerOrder.TRAILING_STOP)
+
+    return {
+        "id": p.id,
+        "symbol": p.symbol,
+        "side": p.side,
+        "entry_price": str(p.entry_price),
+        "amount": str(p.amount),
+        "leverage": p.leverage,
+        "initial_margin": str(p.initial_margin),
+        "liquidation_price": str(p.liquidation_price),
+        "accrued_funding": str(p.accrued_funding),
+        "margin_mode": p.margin_mode,
+        "take_profit": str(tp.trigger_price) if tp else None,
+        "stop_loss": str(sl.trigger_price) if sl else None,
+        "trailing_stop": str(trailing.callback_rate) if trailing else None,
+        "trailing_stop_price": str(trailing.trigger_price) if trailing else None,
+    }
+
+
+# ---------------------------------------------------------
+# TRADE HISTORY (closed / liquidated positions, newest first)
+# keyset pages: ?cursor= is the "next" of the previous page, so every
+# page is one range of the (user, status, closed_at, id) index, then of
+# the archive partitions once it reaches positions older than the hot table
+# ---------------------------------------------------------
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 200
+
+HISTORY_STATUSES = {
+    "closed": [FuturesPosition.CLOSED],
+    "liquidated": [FuturesPosition.LIQUIDATED],
+    "all": [FuturesPosition.CLOSED, FuturesPosition.LIQUIDATED],
+}
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_history(request):
+    user = request.user
+
+    statuses = HISTORY_STATUSES.get(request.query_params.get("status", "all").lower())
+    if statuses is None:
+        return Response({"error": "status must be closed, liquidated or all"}, status=400)
+
+    try:
+        limit = int(request.query_params.get("limit", HISTORY_PAGE_SIZE))
+        before = decode_cursor(request.query_params.get("cursor"))
+    except (ValueError, TypeError):
+        return Response({"error": "Invalid cursor or limit"}, status=400)
+    limit = max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+
+    # open-ended: spans the hot table and the archived partitions (futures/archive.py)
+    page = archive.history(user.id, statuses, before, limit)
+    more = len(page) > limit
+    page = page[:limit]
+
+    return Response({
+        "results": [history_data(p) for p in page],
+        "next": encode_cursor(page[-1]) if more else None,
+    })
+
+
+def history_data(p):
+    return {
+        **position_data(p),
+        "status": p.status,
+        "pnl": str(p.pnl),
+        "roe": str((p.pnl / p.initial_margin * 100).quantize(Decimal("0.01"))) if p.initial_margin else None,
+        "opened_at": p.opened_at.isoformat(),
+        "closed_at": p.closed_at.isoformat(),
+    }
+
+
+def encode_cursor(p):
+    return urlsafe_b64encode(f"{p.closed_at.isoformat()}|{p.id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """ (closed_at, id) of a cursor, None for the first page; ValueError if malformed """
+    if not cursor:
+        return None
+    try:
+        closed_at, position_id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError("malformed cursor") from e
+    return datetime.fromisoformat(closed_at), int(position_id)
+
+
+# ---------------------------------------------------------
+# TRADING STATS (per-day trades, volume and realized PnL)
+# ?days=N: the last N days, everything when left out
+# ---------------------------------------------------------
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_stats(request):
+    user = request.user
+
+    since = None
+    if request.query_params.get("days"):
+        try:
+            days = int(request.query_params["days"])
+        except ValueError:
+            return Response({"error": "days must be an integer"}, status=400)
+        since = (timezone.now() - timedelta(days=max(days, 1) - 1)).date()
+
+    rows = archive.daily(user.id, since)
+    total = {
+        "closed": sum(r["closed"] for r in rows),
+        "liquidated": sum(r["liquidated"] for r in rows),
+        "volume": str(sum((r["volume"] for r in rows), Decimal("0"))),
+        "pnl": str(sum((r["pnl"] for r in rows), Decimal("0"))),
+    }
+
+    return Response({
+        "days": [
+            {**r, "day": r["day"].isoformat(), "volume": str(r["volume"]), "pnl": str(r["pnl"])} for r in rows
+        ],
+        "total": total,
+    })
+
+
+# ---------------------------------------------------------
+# PLATFORM EXPOSURE (admin)
+# open positions, long / short notional and unrealized PnL per
+# symbol, as last published by stream_markprices
+# ---------------------------------------------------------
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def get_exposure(request):
+    data = valuation.exposure()
+    if data is None:
+        return Response({"error": "Valuation engine is not running"}, status=503)
+    return Response(data)
+
+
+# ---------------------------------------------------------
+# OPEN NEW POSITION
+# (async: may wait on a mark-price REST fallback)
+# ---------------------------------------------------------
+@async_api_view(["POST"])
+@permission_classes([IsAuthenticated])
+async def open_position(request):
+    user = request.user
+
+    required = ["symbol", "side", "margin", "leverage"]
     for field in required:
         if not request.data.get(field):
             return Response({"error": f"{field} is required"}, status=400)
 
-    symbol = request.data["symbol"]
-    side = request.data["side"]
-    margin = request.data["margin"]
-    leverage = request.data["leverage"]
-    entry_price = request.data["price"]
+    # cheap checks first: an invalid request never waits on a mark price
+    try:
+        parse_order(request.data)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    symbol = str(request.data["symbol"])
+
+    # Frontend may send price — otherwise fill at the current mark price
+    entry_price = request.data.get("price") or await aget_mark_price(symbol)
+    if entry_price is None:
+        return Response({"error": "Unable to fetch live price"}, status=500)
 
+    try:
+        fields, orders = parse_open(request.data, entry_price)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    wallet, _ = await FuturesWallet.objects.aget_or_create(user=user)
+    fields["margin_mode"] = wallet.margin_mode
+
+    # Cross: unrealized losses of the other cross positions are spoken for
+    if wallet.margin_mode == FuturesWallet.CROSS:
+        account = await sync_to_async(risk.current)(user.id, wallet.balance)
+        available = wallet.balance + min(Decimal(repr(account["unrealized_pnl"])), Decimal("0"))
+        if fields["initial_margin"] > available:
+            return Response({"error": "Insufficient margin", "available": str(available)}, status=400)
+
+    # Margin debit (guarded UPDATE), position and triggers in one transaction
+    pos = await sync_to_async(settlement.open_position)(user.id, orders, **fields)
+    if pos is None:
+        return Response({"error": "Insufficient balance"}, status=400)
+
+    return Response({
+        "message": "Position opened successfully",
+        "position": opened_data(pos, orders),
+    })
+
+
+def opened_data(pos, orders):
+    return {
+        "id": pos.id,
+        "symbol": pos.symbol,
+        "side": pos.side,
+        "entry_price": str(pos.entry_price),
+        "contracts": str(pos.amount),
+        "leverage": pos.leverage,
+        "margin_used": str(pos.initial_margin),
+        "liquidation_price": str(pos.liquidation_price),
+        **{key: str(orders[kind]) for key, kind in triggers.KINDS.items() if orders.get(kind)},
+    }
+
+
+def parse_order(data):
+    """
+    (side, leverage, margin) of an open request — the checks that need no
+    price, done before any mark-price fetch; ValueError for the client
+    """
     # BUY / SELL → LONG / SHORT
     side_map = {"BUY": "LONG", "SELL": "SHORT"}
-    if side not in side_map:
-        return Response({"error": "Side must be BUY or SELL"}, status=400)
-
-    backend_side = side_map[side]
+    if str(data["side"]) not in side_map:
+        raise ValueError("Side must be BUY or SELL")
+    side = side_map[str(data["side"])]
 
     # Validate leverage
     try:
-        leverage = int(leverage)
-        if not (1 <= leverage <= 125):
-            return Response({"error": "Leverage must be between 1 and 125"}, status=400)
-    except:
-        return Response({"error": "Leverage must be an integer"}, status=400)
+        leverage = int(data["leverage"])
+    except (TypeError, ValueError):
+        raise ValueError("Leverage must be an integer")
+    if not (1 <= leverage <= 125):
+        raise ValueError("Leverage must be between 1 and 125")
 
-    # Validate amounts
+    # Validate margin
     try:
-        margin = Decimal(margin)
-        entry_price = Decimal(entry_price)
-    except:
-        return Response({"error": "Invalid numeric values"}, status=400)
+        margin = Decimal(str(data["margin"]))
+    except ArithmeticError:
+        raise ValueError("Invalid numeric values")
+    if not margin.is_finite() or margin <= 0:
+        raise ValueError("Margin must be positive")
+    # taken from the wallet as is: no finer than its balance column
+    if margin != services.quantize(FuturesWallet, margin):
+        raise ValueError("Margin has too many decimal places")
 
-    if margin <= 0:
-        return Response({"error": "Margin must be positive"}, status=400)
+    return side, leverage, margin
 
-    wallet, _ = FuturesWallet.objects.get_or_create(user=user)
 
-    if wallet.balance < margin:
-        return Response({"error": "Insufficient balance"}, status=400)
+def parse_open(data, entry_price):
+    """
+    (position fields, triggers.parse() output) of an open request filled
+    at entry_price; ValueError with the message for the client
+    """
+    side, leverage, margin = parse_order(data)
 
-    # Deduct
-    wallet.balance -= margin
-    wallet.save()
-
-    # Compute contract size
-    contracts = calculate_contracts(margin, entry_price, leverage)
-    liq_price = liquidation_price(entry_price, leverage, backend_side)
-
-    # Create DB entry
-    pos = FuturesPosition.objects.create(
-        user=user,
-        symbol=symbol.upper(),
-        side=backend_side,
-        entry_price=entry_price,
-        amount=contracts,
-        leverage=leverage,
-        initial_margin=margin,
-        liquidation_price=liq_price,
-    )
+    try:
+        entry_price = Decimal(str(entry_price))
+    except ArithmeticError:
+        raise ValueError("Invalid numeric values")
 
-    return Response({
-        "message": "Position opened successfully",
-        "position": {
-            "id": pos.id,
-            "symbol": pos.symbol,
-            "side": pos.side,
-            "entry_price": str(pos.entry_price),
-            "contracts": str(pos.amount),
-            "leverage": pos.leverage,
-            "margin_used": str(pos.initial_margin),
-            "liquidation_price": str(pos.liquidation_price),
-        }
-    })
+    if not entry_price.is_finite() or entry_price <= 0:
+        raise ValueError("Price must be positive")
+
+    # Optional TP / SL / trailing stop (callback %)
+    liq_price = liquidation_price(entry_price, leverage, side)
+    orders = triggers.parse(data, side, entry_price, liq_price)
+
+    fields = {
+        "symbol": str(data["symbol"]).upper(),
+        "side": side,
+        "entry_price": entry_price,
+        "amount": calculate_contracts(margin, entry_price, leverage),
+        "leverage": leverage,
+        "initial_margin": margin,
+        "liquidation_price": liq_price,
+    }
+    return fields, orders
 
 
 # ---------------------------------------------------------
 # CLOSE POSITION (AUTO-FETCHES LIVE PRICE)
 # ---------------------------------------------------------
-@api_view(["POST"])
+@async_api_view(["POST"])
 @permission_classes([IsAuthenticated])
-def close_position(request, position_id):
+async def close_position(request, position_id):
     user = request.user
 
     try:
-        pos = FuturesPosition.objects.get(id=position_id, user=user, status="OPEN")
+        pos = await FuturesPosition.objects.aget(id=position_id, user=user, status="OPEN")
     except FuturesPosition.DoesNotExist:
         return Response({"error": "Position not found"}, status=404)
 
@@ -156,33 +411,254 @@ def close_position(request, position_id):
             return Response({"error": "Invalid price"}, status=400)
 
     else:
-        # AUTO-FETCH LIVE PRICE FROM BINANCE
-        try:
-            data = requests.get(
-                f"https://fapi.binance.com/fapi/v1/ticker/price?symbol={pos.symbol}"
-            ).json()
-
-            current_price = Decimal(data["price"])
-        except:
+        # MARK PRICE TABLE (stream_markprices), REST FALLBACK WHEN STALE
+        current_price = await aget_mark_price(pos.symbol)
+        if current_price is None:
             return Response({"error": "Unable to fetch live price"}, status=500)
 
-    # Calculate final realized PnL
-    pnl = calculate_pnl(pos.entry_price, current_price, pos.side, pos.amount)
+    # Realize PnL, return margin + PnL to the wallet (only if still open:
+    # a trigger or a liquidation may have got there first)
+    closed = await sync_to_async(settlement.close)(pos.id, current_price)
+    if closed is None:
+        return Response({"error": "Position already closed"}, status=409)
 
-    # Close the position
-    pos.status = "CLOSED"
-    pos.closed_at = timezone.now()
-    pos.pnl = pnl
-    pos.save()
-
-    # Return money + PnL to wallet
-    wallet = FuturesWallet.objects.get(user=user)
-    wallet.balance += pos.initial_margin + pnl
-    wallet.save()
+    pnl, balance = closed
 
     return Response({
         "message": "Position closed successfully",
         "pnl": str(pnl),
-        "wallet_balance": str(wallet.balance),
+        "wallet_balance": str(balance),
         "closed_price": str(current_price),
-    })
\ No newline at end of file
+    })
+
+
+# ---------------------------------------------------------
+# BATCH: close and open many positions in one request
+# body: {"close": [position ids] | "all" | {"symbol": "BTCUSDT"},
+#        "open": [{symbol, side, margin, leverage, take_profit?, ...}]}
+# Closes go first (their margin + PnL can pay for the opens). Opens fill
+# at the mark price only (no client price: limit orders are /orders/).
+# Every mark price is fetched once, and the batch is one transaction:
+# nothing is done if any part of it is invalid.
+# ---------------------------------------------------------
+BATCH_MAX_ITEMS = 100
+
+
+@async_api_view(["POST"])
+@permission_classes([IsAuthenticated])
+async def batch_orders(request):
+    user = request.user
+
+    opens = request.data.get("open") or []
+    close = request.data.get("close") or []
+    if not opens and not close:
+        return Response({"error": "open or close is required"}, status=400)
+    if not isinstance(opens, list) or not all(isinstance(data, dict) for data in opens):
+        return Response({"error": "open must be a list of orders"}, status=400)
+
+    for i, data in enumerate(opens):
+        for field in ["symbol", "side", "margin", "leverage"]:
+            if not data.get(field):
+                return Response({"error": f"open[{i}]: {field} is required"}, status=400)
+        if "price" in data:
+            return Response({"error": f"open[{i}]: batch opens fill at the mark price, price is not accepted"},
+                            status=400)
+        # cheap checks first: an invalid batch never waits on a mark price
+        try:
+            parse_order(data)
+        except ValueError as e:
+            return Response({"error": f"open[{i}]: {e}"}, status=400)
+
+    try:
+        positions = await sync_to_async(batch_positions)(user, close)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    if len(opens) + len(positions) > BATCH_MAX_ITEMS:
+        return Response({"error": f"At most {BATCH_MAX_ITEMS} opens and closes per batch"}, status=400)
+
+    # one mark price per symbol, fetched concurrently
+    symbols = sorted({p.symbol for p in positions} | {str(o["symbol"]).upper() for o in opens})
+    prices = dict(zip(symbols, await asyncio.gather(*(aget_mark_price(symbol) for symbol in symbols))))
+    missing = [symbol for symbol, price in prices.items() if price is None]
+    if missing:
+        return Response({"error": f"Unable to fetch live price: {', '.join(missing)}"}, status=500)
+
+    parsed = []
+    for i, data in enumerate(opens):
+        try:
+            parsed.append(parse_open(data, prices[str(data["symbol"]).upper()]))
+        except ValueError as e:
+            return Response({"error": f"open[{i}]: {e}"}, status=400)
+
+    # the whole batch against one wallet read (the debit itself stays guarded)
+    wallet, _ = await FuturesWallet.objects.aget_or_create(user=user)
+    pnl = {p.id: calculate_pnl(p.entry_price, prices[p.symbol], p.side, p.amount) for p in positions}
+    available = wallet.balance + sum((p.initial_margin + pnl[p.id] for p in positions), Decimal("0"))
+    if wallet.margin_mode == FuturesWallet.CROSS:
+        # minus the unrealized loss of the cross positions that stay open
+        account = await sync_to_async(risk.current)(user.id, wallet.balance)
+        closing = sum((pnl[p.id] for p in positions if p.margin_mode == FuturesWallet.CROSS), Decimal("0"))
+        available += min(Decimal(repr(account["unrealized_pnl"])) - closing, Decimal("0"))
+    for fields, _ in parsed:
+        fields["margin_mode"] = wallet.margin_mode
+    required = sum((fields["initial_margin"] for fields, _ in parsed), Decimal("0"))
+    if required > available:
+        return Response({"error": "Insufficient balance", "required": str(required), "available": str(available)}, status=400)
+
+    result = await sync_to_async(settlement.batch)(
+        user.id, [(p.id, prices[p.symbol]) for p in positions], parsed
+    )
+    if result is None:
+        return Response({"error": "Insufficient balance"}, status=400)
+
+    closed, opened = result
+    balance = await FuturesWallet.objects.filter(user=user).values_list("balance", flat=True).afirst()
+
+    return Response({
+        "closed": [
+            {"id": p.id, "symbol": p.symbol, "pnl": str(closed[p.id][0]), "closed_price": str(prices[p.symbol])}
+            for p in positions if p.id in closed
+        ],
+        # settled meanwhile by a trigger or a liquidation
+        "already_closed": [p.id for p in positions if p.id not in closed],
+        "opened": [opened_data(pos, orders) for pos, (_, orders) in zip(opened, parsed)],
+        "wallet_balance": str(balance),
+    }, status=201 if opened else 200)
+
+
+def batch_positions(user, close):
+    """ The open positions a batch's "close" selects; ValueError if it names any that are not open """
+    positions = FuturesPosition.objects.filter(user=user, status=FuturesPosition.OPEN).order_by("id")
+    if close == "all":
+        return list(positions)
+    if isinstance(close, dict) and close.get("symbol"):
+        return list(positions.filter(symbol=str(close["symbol"]).upper()))
+
+    if not isinstance(close, list) or not all(type(i) is int for i in close):
+        raise ValueError('close must be a list of position ids, "all" or {"symbol": ...}')
+    found = list(positions.filter(id__in=close))
+    missing = set(close) - {p.id for p in found}
+    if missing:
+        raise ValueError(f"Positions not open: {sorted(missing)}")
+    return found
+
+
+# ---------------------------------------------------------
+# SET / REPLACE / REMOVE TP, SL, TRAILING STOP
+# body: any of take_profit, stop_loss, trailing_stop (callback %);
+# null removes it
+# ---------------------------------------------------------
+@async_api_view(["POST"])
+@permission_classes([IsAuthenticated])
+async def set_triggers(request, position_id):
+    user = request.user
+
+    try:
+        pos = await FuturesPosition.objects.aget(id=position_id, user=user, status="OPEN")
+    except FuturesPosition.DoesNotExist:
+        return Response({"error": "Position not found"}, status=404)
+
+    mark = await aget_mark_price(pos.symbol)
+    if mark is None:
+        return Response({"error": "Unable to fetch live price"}, status=500)
+
+    try:
+        orders = triggers.parse(request.data, pos.side, mark, pos.liquidation_price)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    if not await sync_to_async(replace_triggers)(pos, orders, mark):
+        return Response({"error": "Position already closed"}, status=409)
+    events.emit(user.id)
+
+    pos = await open_positions(user).filter(id=pos.id).afirst()
+    return Response(position_data(pos))
+
+
+def replace_triggers(pos, orders, mark):
+    """ Cancel the position's active triggers of the given kinds, create the new ones """
+    with transaction.atomic():
+        if not FuturesPosition.objects.select_for_update().filter(id=pos.id, status="OPEN").exists():
+            return False
+
+        TriggerOrder.objects.filter(
+            position=pos, kind__in=list(orders), status=TriggerOrder.ACTIVE
+        ).update(status=TriggerOrder.CANCELLED, finished_at=timezone.now())
+        TriggerOrder.objects.bulk_create(triggers.build(pos, orders, mark))
+    return True
+
+
+# ---------------------------------------------------------
+# LIMIT ORDERS
+# margin is reserved when placed; the order opens a position at its
+# price once the mark price reaches it (futures/orderbook.py)
+# ---------------------------------------------------------
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticated])
+def limit_orders(request):
+    user = request.user
+
+    if request.method == "GET":
+        return Response([order_data(o) for o in open_orders(user)])
+
+    required = ["symbol", "side", "price", "margin", "leverage"]
+    for field in required:
+        if not request.data.get(field):
+            return Response({"error": f"{field} is required"}, status=400)
+
+    try:
+        side, leverage, margin = parse_order(request.data)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    try:
+        price = Decimal(str(request.data["price"]))
+    except ArithmeticError:
+        return Response({"error": "Invalid numeric values"}, status=400)
+    if not price.is_finite() or price <= 0:
+        return Response({"error": "Price must be positive"}, status=400)
+
+    # only symbols on the mark-price stream can ever fill
+    symbol = str(request.data["symbol"]).upper()
+    if not markprice.listed(symbol):
+        return Response({"error": f"Unknown symbol: {symbol}"}, status=400)
+
+    order = settlement.place_order(
+        user.id,
+        symbol=symbol,
+        side=side,
+        price=price,
+        margin=margin,
+        leverage=leverage,
+    )
+    if order is None:
+        return Response({"error": "Insufficient balance"}, status=400)
+
+    return Response({"message": "Order placed", "order": order_data(order)}, status=201)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def cancel_limit_order(request, order_id):
+    if not settlement.cancel_order(order_id, request.user.id):
+        return Response({"error": "Order not found or already filled"}, status=404)
+
+    wallet = FuturesWallet.objects.get(user=request.user)
+    return Response({"message": "Order cancelled", "wallet_balance": str(wallet.balance)})
+
+
+def open_orders(user):
+    return LimitOrder.objects.filter(user=user, status=LimitOrder.OPEN).order_by("id")
+
+
+def order_data(o):
+    return {
+        "id": o.id,
+        "symbol": o.symbol,
+        "side": o.side,
+        "price": str(o.price),
+        "margin": str(o.margin),
+        "leverage": o.leverage,
+        "created_at": o.created_at.isoformat(),
+    }
@@ -0,0 +1,223 @@
+# markets/cache.py
+#
+# Per-process stale-while-revalidate cache with single-flight loading.
+# Only one load per key runs at a time; everyone else either gets the
+# stale value straight away or waits for that one load to finish.
+#
+# Keys whose number depends on user input (one per coin id) go in a
+# `group`; a group holds at most settings.MARKET_CACHE_LIMITS[group]
+# entries and evicts the least frequently used one when full. Keys
+# cached without a group share the DEFAULT_GROUP, so nothing is kept
+# unbounded.
+
+from collections import defaultdict
+import asyncio
+import threading
+import time
+
+from django.conf import settings
+
+_entries = {}      # key -> (value, fresh_until)
+_inflight = {}     # key -> threading.Event of the running load
+_tasks = {}        # key -> asyncio.Task of the running async load
+_groups = {}       # group -> LFU of its keys
+_lock = threading.Lock()
+
+DEFAULT_GROUP = "default"
+
+stats = {"hit": 0, "stale": 0, "miss": 0, "load": 0, "fail": 0, "evict": 0}
+
+
+class LFU:
+    """
+    Key set capped at `size`. Adding past the cap drops the least
+    frequently used key (the oldest of those on a tie). O(1) per call.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.count = {}                       # key -> uses
+        self.by_count = defaultdict(dict)     # uses -> {key: None}, oldest first
+        self.lowest = 0
+
+    def touch(self, key):
+        n = self.count.get(key)
+        if n is None:
+            return
+        self._unlink(key, n)
+        self.count[key] = n + 1
+        self.by_count[n + 1][key] = None
+
+    def add(self, key):
+        """ Track `key`; returns the key evicted to make room, if any """
+        if key in self.count:
+            self.touch(key)
+            return None
+
+        evicted = None
+        if len(self.count) >= self.size:
+            evicted = next(iter(self.by_count[self.lowest]))
+            self._unlink(evicted, self.lowest)
+            del self.count[evicted]
+
+        self.count[key] = 1
+        self.by_count[1][key] = None
+        self.lowest = 1
+        return evicted
+
+    def discard(self, key):
+        n = self.count.pop(key, None)
+        if n is not None:
+            self._unlink(key, n)
+
+    def _unlink(self, key, n):
+        bucket = self.by_count[n]
+        del bucket[key]
+        if not bucket:
+            del self.by_count[n]
+            if self.lowest == n:
+                self.lowest = n + 1
+
+    def __len__(self):
+        return len(self.count)
+
+
+def cached(key, loader, ttl, stale_ttl=0, wait=10, group=None):
+    """
+    Return loader() cached under `key` for `ttl` seconds.
+
+    - fresh value: returned as-is
+    - stale for less than `stale_ttl`: returned immediately while one
+      background refresh runs
+    - missing / too stale: one caller loads, concurrent callers wait
+      up to `wait` seconds for that result
+
+    A loader that raises or returns None is a failure: the last good value
+    is kept (and returned) instead of caching the failure.
+    """
+    group = group or DEFAULT_GROUP
+    now = time.monotonic()
+    entry = _entries.get(key)
+
+    if entry and now < entry[1]:
+        stats["hit"] += 1
+        _touch(group, key)
+        return entry[0]
+
+    if entry and now < entry[1] + stale_ttl:
+        stats["stale"] += 1
+        _touch(group, key)
+        event, leader = _claim(key)
+        if leader:
+            threading.Thread(
+                target=_load, args=(key, loader, ttl, event, group), daemon=True
+            ).start()
+        return entry[0]
+
+    stats["miss"] += 1
+    event, leader = _claim(key)
+    if leader:
+        return _load(key, loader, ttl, event, group)
+
+    event.wait(wait)
+    entry = _entries.get(key)
+    return entry[0] if entry else None
+
+
+async def acached(key, loader, ttl, group=None):
+    """
+    cached() for a coroutine loader: concurrent awaiters in the event loop
+    share one load task. Same failure rule — None never replaces a value.
+    """
+    group = group or DEFAULT_GROUP
+    entry = _entries.get(key)
+    if entry and time.monotonic() < entry[1]:
+        stats["hit"] += 1
+        _touch(group, key)
+        return entry[0]
+
+    stats["miss"] += 1
+    task = _tasks.get(key)
+    if task is None:
+        task = _tasks[key] = asyncio.ensure_future(_aload(key, loader, ttl, group))
+    return await asyncio.shield(task)
+
+
+def invalidate(key):
+    _entries.pop(key, None)
+    with _lock:
+        for lfu in _groups.values():
+            lfu.discard(key)
+
+
+# -------- helpers --------
+def _claim(key):
+    """ (event, True) if we are the one to load `key`, else the running load's event """
+    with _lock:
+        event = _inflight.get(key)
+        if event:
+            return event, False
+
+        event = _inflight[key] = threading.Event()
+        return event, True
+
+
+def _load(key, loader, ttl, event, group):
+    stats["load"] += 1
+    try:
+        value = loader()
+    except Exception as e:
+        print("❌ CACHE LOAD ERROR:", key, e)
+        value = None
+
+    if value is None:
+        stats["fail"] += 1
+    else:
+        _entries[key] = (value, time.monotonic() + ttl)
+        _admit(group, key)
+
+    with _lock:
+        _inflight.pop(key, None)
+    event.set()
+
+    entry = _entries.get(key)
+    return entry[0] if entry else None
+
+
+async def _aload(key, loader, ttl, group):
+    stats["load"] += 1
+    try:
+        value = await loader()
+    except Exception as e:
+        print("❌ CACHE LOAD ERROR:", key, e)
+        value = None
+    finally:
+        _tasks.pop(key, None)
+
+    if value is None:
+        stats["fail"] += 1
+    else:
+        _entries[key] = (value, time.monotonic() + ttl)
+        _admit(group, key)
+
+    entry = _entries.get(key)
+    return entry[0] if entry else None
+
+
+def _touch(group, key):
+    with _lock:
+        lfu = _groups.get(group)
+        if lfu:
+            lfu.touch(key)
+
+
+def _admit(group, key):
+    with _lock:
+        lfu = _groups.get(group)
+        if lfu is None:
+            lfu = _groups[group] = LFU(settings.MARKET_CACHE_LIMITS[group])
+        evicted = lfu.add(key)
+
+    if evicted is not None:
+        stats["evict"] += 1
+        _entries.pop(evicted, None)
@@ -0,0 +1,249 @@
+# markets/catalog.py
+#
+# Local coin catalog: CoinGecko id <-> symbol <-> name, plus the Binance
+# USDT-M futures symbol of each coin that has one. The ingest worker
+# keeps the Coin table up to date; every process loads it once into a
+# CoinIndex for lookups and search.
+#
+#   lookup(coin_id)      coin dict or None — unknown ids never reach upstream
+#   search(q, limit)     prefix matches first, then fuzzy (trigram) ones
+
+from bisect import bisect_left
+from collections import Counter, defaultdict
+import re
+
+from django.conf import settings
+
+from .cache import cached
+from .models import Coin, CoinPrice
+
+COIN_ID = re.compile(r"^[a-z0-9][a-z0-9.-]{0,99}$")
+
+# Binance lists small-priced coins per 1000 / 1M units (1000PEPEUSDT)
+BINANCE_MULTIPLIER = re.compile(r"^(1000000|10000|1000|100)(?=[A-Z])")
+
+
+class CoinIndex:
+    """ In-memory search index over the catalog """
+
+    def __init__(self, rows):
+        self.coins = {}
+        self.by_binance = {}
+        self.ids = []
+
+        terms = []
+        grams = defaultdict(list)
+        for i, (coin_id, symbol, name, rank, binance) in enumerate(rows):
+            coin = {
+                "id": coin_id,
+                "symbol": symbol,
+                "name": name,
+                "market_cap_rank": rank,
+                "binance_symbol": binance,
+            }
+            self.coins[coin_id] = coin
+            self.ids.append(coin_id)
+            if binance:
+                self.by_binance[binance] = coin_id
+
+            words = {symbol.lower(), coin_id, name.lower(), *name.lower().split()}
+            terms.extend((w, i) for w in words if w)
+            for g in {g for w in (symbol.lower(), name.lower()) for g in _trigrams(w)}:
+                grams[g].append(i)
+
+        terms.sort()
+        self.terms = [t for t, _ in terms]
+        self.term_ids = [i for _, i in terms]
+        self.grams = {g: tuple(ids) for g, ids in grams.items()}
+
+    def __contains__(self, coin_id):
+        return coin_id in self.coins
+
+    def __len__(self):
+        return len(self.coins)
+
+    def prefix(self, q):
+        """ Coin positions with a symbol, id, name or name word starting with q """
+        lo = bisect_left(self.terms, q)
+        hi = bisect_left(self.terms, q + "\uffff", lo)
+        return set(self.term_ids[lo:hi])
+
+    def fuzzy(self, q, min_score=0.4):
+        """ {coin position: share of q's trigrams it contains} above min_score """
+        grams = _trigrams(q)
+        hits = Counter()
+        for g in grams:
+            hits.update(self.grams.get(g, ()))
+        return {i: n / len(grams) for i, n in hits.items() if n / len(grams) >= min_score}
+
+    def search(self, q, limit=10):
+        q = q.strip().lower()
+        if not q:
+            return []
+
+        def rank(i):
+            coin = self.coins[self.ids[i]]
+            exact = q in (coin["symbol"].lower(), coin["id"])
+            return (not exact, coin["market_cap_rank"] is None, coin["market_cap_rank"] or 0, len(coin["name"]))
+
+        found = sorted(self.prefix(q), key=rank)[:limit]
+        if len(found) < limit and len(q) >= 3:
+            seen = set(found)
+            scores = self.fuzzy(q)
+            found += sorted(
+                (i for i in scores if i not in seen),
+                key=lambda i: (-scores[i], *rank(i)[1:]),
+            )[: limit - len(found)]
+
+        return [self.coins[self.ids[i]] for i in found]
+
+
+# ===================== READS =====================
+
+def index():
+    """ This process's CoinIndex, rebuilt in the background every MARKET_CATALOG_RELOAD """
+    return cached(
+        "catalog:index",
+        _build_index,
+        ttl=settings.MARKET_CATALOG_RELOAD,
+        stale_ttl=86400,
+    )
+
+
+def lookup(coin_id):
+    """
+    Catalog entry for a coin id, or None. Ids missing from this process's
+    index are checked against the DB once (the worker may have added the
+    coin since) and the miss is cached for MARKET_CATALOG_MISS_TTL.
+    """
+    if not coin_id or not COIN_ID.match(coin_id):
+        return None
+
+    idx = index()
+    if idx and coin_id in idx:
+        return idx.coins[coin_id]
+
+    return cached(
+        f"catalog:coin:{coin_id}",
+        lambda: _load_coin(coin_id),
+        ttl=settings.MARKET_CATALOG_MISS_TTL,
+        group="catalog",
+    ) or None
+
+
+def search(q, limit=10):
+    idx = index()
+    return idx.search(q, limit) if idx else []
+
+
+def coin_for_binance(symbol):
+    """ CoinGecko coin for a Binance futures symbol ("BTCUSDT"), or None """
+    idx = index()
+    coin_id = idx.by_binance.get(symbol.upper()) if idx else None
+    return idx.coins[coin_id] if coin_id else None
+
+
+def _build_index():
+    return CoinIndex(
+        Coin.objects.order_by("coin_id").values_list(
+            "coin_id", "symbol", "name", "market_cap_rank", "binance_symbol"
+        )
+    )
+
+
+def _load_coin(coin_id):
+    row = (
+        Coin.objects.filter(coin_id=coin_id)
+        .values("coin_id", "symbol", "name", "market_cap_rank", "binance_symbol")
+        .first()
+    )
+    if not row:
+        return {}   # cached miss — None would not be cached
+
+    row["id"] = row.pop("coin_id")
+    return row
+
+
+# ===================== WRITES (ingest worker) =====================
+
+def save_coins(coins):
+    """ Upsert a /coins/list response (id, symbol, name) """
+    Coin.objects.bulk_create(
+        [
+            Coin(coin_id=c["id"], symbol=c.get("symbol") or "", name=c.get("name") or c["id"])
+            for c in coins
+            if c.get("id") and COIN_ID.match(c["id"])
+        ],
+        update_conflicts=True,
+        unique_fields=["coin_id"],
+        update_fields=["symbol", "name", "updated_at"],
+        batch_size=1000,
+    )
+
+
+def save_markets(coins):
+    """ Upsert top100 coins with their rank; coins that left it lose theirs """
+    ids = [c["id"] for c in coins if c.get("id")]
+    Coin.objects.exclude(coin_id__in=ids).filter(market_cap_rank__isnull=False).update(
+        market_cap_rank=None
+    )
+    Coin.objects.bulk_create(
+        [
+            Coin(
+                coin_id=c["id"],
+                symbol=c.get("symbol") or "",
+                name=c.get("name") or c["id"],
+                market_cap_rank=c.get("market_cap_rank"),
+            )
+            for c in coins
+            if c.get("id")
+        ],
+        update_conflicts=True,
+        unique_fields=["coin_id"],
+        update_fields=["symbol", "name", "market_cap_rank", "updated_at"],
+    )
+
+
+def save_binance_symbols(symbols):
+    """
+    Map Binance USDT-M perpetuals ({"symbol", "baseAsset"}) to coins. A
+    symbol shared by several coins goes to the one with the largest
+    market cap we know of.
+    """
+    bases = {}
+    for s in symbols:
+        base = BINANCE_MULTIPLIER.sub("", s["baseAsset"]).lower()
+        bases.setdefault(base, s["symbol"])
+
+    candidates = defaultdict(list)
+    for coin_id, symbol in Coin.objects.filter(symbol__in=list(bases)).values_list("coin_id", "symbol"):
+        candidates[symbol].append(coin_id)
+
+    caps = dict(
+        CoinPrice.objects.filter(
+            coin_id__in=[c for ids in candidates.values() for c in ids],
+            market_cap__isnull=False,
+        ).values_list("coin_id", "market_cap")
+    )
+
+    mapping = {}
+    for symbol, ids in candidates.items():
+        priced = [c for c in ids if c in caps]
+        if priced:
+            mapping[max(priced, key=caps.get)] = bases[symbol]
+        elif len(ids) == 1:
+            mapping[ids[0]] = bases[symbol]
+
+    Coin.objects.exclude(coin_id__in=list(mapping)).filter(binance_symbol__isnull=False).update(
+        binance_symbol=None
+    )
+    rows = list(Coin.objects.filter(coin_id__in=list(mapping)))
+    for coin in rows:
+        coin.binance_symbol = mapping[coin.coin_id]
+    Coin.objects.bulk_update(rows, ["binance_symbol"], batch_size=500)
+
+
+# -------- helper --------
+def _trigrams(word):
+    word = f"  {word} "
+    return {word[i:i + 3] for i in range(len(word) - 2)}
@@ -0,0 +1,59 @@
+# markets/coingecko.py
+
+from django.conf import settings
+from urllib.parse import urlencode
+import os
+
+from core import upstream
+from .cache import acached
+
+# ============= COINGECKO CONFIG =============
+API_KEY = os.getenv("COINGECKO_API_KEY")
+
+
+def cg(endpoint, params=None):
+    """ Safe CoinGecko call """
+    try:
+        return upstream.get(
+            "coingecko",
+            f"{settings.COINGECKO_BASE_URL}{endpoint}",
+            params=params,
+            headers={"x-cg-demo-api-key": API_KEY},
+            name=route(endpoint),
+        )
+    except upstream.UpstreamError as e:
+        print("❌ COINGECKO ERROR:", e)
+        return None
+
+
+async def acg(endpoint, params=None):
+    """ Safe CoinGecko call for async code — same contract as cg() """
+    try:
+        return await upstream.aget(
+            "coingecko",
+            f"{settings.COINGECKO_BASE_URL}{endpoint}",
+            params=params,
+            headers={"x-cg-demo-api-key": API_KEY},
+            name=route(endpoint),
+        )
+    except upstream.UpstreamError as e:
+        print("❌ COINGECKO ERROR:", e)
+        return None
+
+
+async def acg_cached(endpoint, params=None, ttl=60):
+    """
+    acg() behind the single-flight cache: concurrent callers share one
+    upstream request per key and a failed call never replaces a good value.
+    """
+    key = f"cg:{endpoint}?{urlencode(sorted((params or {}).items()))}"
+    return await acached(key, lambda: acg(endpoint, params), ttl=ttl)
+
+
+# -------- helper --------
+def route(endpoint):
+    """ Metrics label: /coins/bitcoin/market_chart -> /coins/{id}/market_chart """
+    parts = endpoint.split("/")
+    if len(parts) > 2 and parts[1] == "coins" and parts[2] not in ("markets", "list"):
+        parts[2] = "{id}"
+    return "/".join(parts)
@@ -0,0 +1,274 @@
+# markets/history.py
+#
+# Per-coin price history as OHLC bars at three resolutions (5m / 1h / 1d),
+# one PriceHistory row per coin and resolution holding packed NumPy
+# columns. The ingest worker folds new price points into every resolution
+# they are fine enough for, so each resolution is a precomputed rollup
+# and a chart range is a slice of one row — no rescanning of raw points.
+#
+#   record({coin_id: [[ms, price], ...]})   fold points in (worker)
+#   record_markets(coins)                   buffer one point per coin, fold per 5m bar
+#   chart(coin_id, "7d")                    read a range (views)
+
+from datetime import datetime
+import time
+
+from django.conf import settings
+import numpy as np
+
+from .models import PriceHistory
+
+RESOLUTIONS = {"5m": 300, "1h": 3600, "1d": 86400}
+
+# range -> (resolution, seconds back; None = everything)
+RANGES = {
+    "1d": ("5m", 86400),
+    "7d": ("1h", 7 * 86400),
+    "30d": ("1h", 30 * 86400),
+    "1y": ("1d", 365 * 86400),
+    "max": ("1d", None),
+}
+
+# CoinGecko /market_chart `days` that returns each resolution's granularity
+BACKFILL_DAYS = {"5m": 1, "1h": 90, "1d": None}   # None: MARKET_HISTORY_MAX_DAYS
+
+COLUMNS = ("start", "open", "high", "low", "close")
+
+
+class Bars:
+    """ OHLC columns of one resolution, oldest bar first """
+
+    __slots__ = COLUMNS
+
+    def __init__(self, start, open, high, low, close):
+        self.start = start
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, "<i8"), *(np.empty(0, "<f8") for _ in range(4)))
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            np.frombuffer(bytes(row.start), "<i8"),
+            *(np.frombuffer(bytes(getattr(row, c)), "<f8") for c in COLUMNS[1:]),
+        )
+
+    @classmethod
+    def from_points(cls, ts, prices, seconds):
+        """ Bars of `seconds` from sorted (epoch seconds, price) points """
+        if not len(ts):
+            return cls.empty()
+
+        start = (ts // seconds).astype("<i8") * seconds
+        first = np.flatnonzero(np.r_[True, start[1:] != start[:-1]])
+        last = np.r_[first[1:] - 1, len(ts) - 1]
+        return cls(
+            start[first],
+            prices[first],
+            np.maximum.reduceat(prices, first),
+            np.minimum.reduceat(prices, first),
+            prices[last],
+        )
+
+    def columns(self):
+        """ {column: bytes} for a PriceHistory row """
+        return {c: getattr(self, c).astype("<i8" if c == "start" else "<f8").tobytes() for c in COLUMNS}
+
+    def since(self, ts):
+        i = np.searchsorted(self.start, ts)
+        return Bars(*(getattr(self, c)[i:] for c in COLUMNS))
+
+    def __len__(self):
+        return len(self.start)
+
+
+def fold(bars, last_ts, ts, prices, seconds):
+    """
+    (bars, last_ts) with the points that extend the history folded in:
+    points older than the first bar are prepended, points newer than
+    last_ts appended (merging into the open last bar). Anything in
+    between is already covered and skipped.
+    """
+    if not len(bars):
+        return Bars.from_points(ts, prices, seconds), float(ts[-1])
+
+    older = ts < bars.start[0]
+    newer = (ts > last_ts) & (ts >= bars.start[-1])
+    head = Bars.from_points(ts[older], prices[older], seconds)
+    tail = Bars.from_points(ts[newer], prices[newer], seconds)
+
+    if len(tail) and tail.start[0] == bars.start[-1]:
+        bars = Bars(
+            bars.start,
+            bars.open,
+            np.r_[bars.high[:-1], max(bars.high[-1], tail.high[0])],
+            np.r_[bars.low[:-1], min(bars.low[-1], tail.low[0])],
+            np.r_[bars.close[:-1], tail.close[0]],
+        )
+        tail = tail.since(tail.start[0] + 1)
+
+    merged = Bars(*(np.concatenate([getattr(b, c) for b in (head, bars, tail)]) for c in COLUMNS))
+    return merged, max(last_ts, float(ts[-1]))
+
+
+# ===================== WRITES =====================
+
+def record(series, backfilled=None):
+    """
+    Fold {coin_id: [[ms, price], ...]} into the stored history. Points go
+    into every resolution at least as coarse as their spacing (hourly
+    points are not turned into 5m bars). `backfilled` marks a resolution
+    as fully fetched for these coins.
+    """
+    rows = {
+        (r.coin_id, r.resolution): r
+        for r in PriceHistory.objects.filter(coin_id__in=list(series))
+    }
+    now = time.time()
+    out = []
+
+    for coin_id, points in series.items():
+        points = np.array(
+            [p[:2] for p in points or [] if p[1] is not None], dtype="<f8"
+        ).reshape(-1, 2)
+        if not len(points):
+            continue
+        points = points[np.argsort(points[:, 0], kind="stable")]
+        ts, prices = points[:, 0] / 1000, points[:, 1]
+        spacing = np.median(np.diff(ts)) if len(ts) > 1 else 0
+
+        for name, seconds in RESOLUTIONS.items():
+            if spacing > seconds * 1.5:
+                continue
+
+            row = rows.get((coin_id, name))
+            bars, last_ts = fold(
+                Bars.from_row(row) if row else Bars.empty(),
+                row.last_ts if row else 0,
+                ts, prices, seconds,
+            )
+            keep = settings.MARKET_HISTORY_KEEP[name]
+            if keep:
+                bars = bars.since(now - keep)
+
+            out.append(PriceHistory(
+                coin_id=coin_id,
+                resolution=name,
+                last_ts=last_ts,
+                backfilled=(row.backfilled if row else False) or name == backfilled,
+                **bars.columns(),
+            ))
+
+    if out:
+        PriceHistory.objects.bulk_create(
+            out,
+            update_conflicts=True,
+            unique_fields=["coin_id", "resolution"],
+            update_fields=[*COLUMNS, "last_ts", "backfilled", "updated_at"],
+        )
+
+
+_pending = {}        # coin_id -> [[ms, price], ...] not folded in yet
+_pending_bar = None  # 5m bar the pending points fall in
+
+
+def record_markets(coins):
+    """
+    One point per coin from a /coins/markets list (every ingest cycle).
+    A fold rewrites the coin's rows, so the points are buffered in this
+    process and folded in once per 5m bar instead of every cycle.
+    """
+    global _pending_bar
+    bar = int(time.time() // RESOLUTIONS["5m"])
+    if bar != _pending_bar:
+        flush()
+        _pending_bar = bar
+
+    for c in coins:
+        if c.get("id") and c.get("current_price") is not None:
+            ts = _epoch_ms(c.get("last_updated")) or time.time() * 1000
+            _pending.setdefault(c["id"], []).append([ts, c["current_price"]])
+
+
+def flush():
+    """ Fold the points buffered by record_markets() in now """
+    global _pending
+    series, _pending = _pending, {}
+    if series:
+        record(series)
+
+
+def mark_backfilled(coin_id, name):
+    """
+    Mark a resolution fetched although upstream had no points for it, so
+    it is not fetched again; the delta fetches start from now.
+    """
+    row, created = PriceHistory.objects.get_or_create(
+        coin_id=coin_id, resolution=name,
+        defaults={"backfilled": True, "last_ts": time.time()},
+    )
+    if not created and not row.backfilled:
+        row.backfilled = True
+        row.last_ts = row.last_ts or time.time()
+        row.save(update_fields=["backfilled", "last_ts", "updated_at"])
+
+
+def status(coin_id):
+    """ {resolution: (last_ts, backfilled)} of what is stored for a coin """
+    return {
+        name: (last_ts, backfilled)
+        for name, last_ts, backfilled in PriceHistory.objects
+        .filter(coin_id=coin_id)
+        .values_list("resolution", "last_ts", "backfilled")
+    }
+
+
+# ===================== READS =====================
+
+def chart(coin_id, range="7d"):
+    """
+    {"range", "resolution", "prices": [[ms, close]], "ohlc": [[ms, o, h, l, c]]}
+    for a coin, or None if nothing is stored. Uses the range's resolution,
+    or the next coarser one if that is all there is.
+    """
+    name, span = RANGES[range]
+    names = [n for n in RESOLUTIONS if RESOLUTIONS[n] >= RESOLUTIONS[name]]
+    rows = {
+        r.resolution: r
+        for r in PriceHistory.objects.filter(coin_id=coin_id, resolution__in=names)
+        .only("resolution", *COLUMNS)
+    }
+
+    for name in names:
+        if name not in rows:
+            continue
+        bars = Bars.from_row(rows[name])
+        if span:
+            bars = bars.since(time.time() - span)
+        if len(bars) < 2 and name != names[-1]:
+            continue
+
+        ms = (bars.start * 1000).tolist()
+        ohlc = np.column_stack([bars.open, bars.high, bars.low, bars.close]).tolist()
+        return {
+            "range": range,
+            "resolution": name,
+            "prices": [[t, c[3]] for t, c in zip(ms, ohlc)],
+            "ohlc": [[t, *c] for t, c in zip(ms, ohlc)],
+        }
+    return None
+
+
+# -------- helper --------
+def _epoch_ms(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000
+    except ValueError:
+        return None
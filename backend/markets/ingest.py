@@ -0,0 +1,211 @@
+# markets/ingest.py
+#
+# One ingestion cycle: pull CoinGecko in bulk and write the local store.
+# Driven by `python manage.py ingest_markets`. Upstream calls that do not
+# depend on each other are issued concurrently.
+
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from core import upstream
+from . import catalog, history, store
+from .coingecko import acg, acg_cached
+
+TOP8_IDS = (
+    "bitcoin,ethereum,solana,ripple,cardano,"
+    "binancecoin,polkadot,matic-network"
+)
+
+
+async def refresh_top100():
+    data = await acg(
+        "/coins/markets",
+        params={
+            "vs_currency": "usd",
+            "order": "market_cap_desc",
+            "per_page": 100,
+            "page": 1,
+            "sparkline": "true",
+            "price_change_percentage": "24h",
+        },
+    )
+    if data is None:
+        return None
+
+    await sync_to_async(store.save_top100)(data)
+    await sync_to_async(catalog.save_markets)(data)
+    await sync_to_async(history.record_markets)(data)
+    await sync_to_async(store.save_market_prices)(data, publish=True)
+    return data
+
+
+async def refresh_top8():
+    data = await acg(
+        "/coins/markets",
+        params={"vs_currency": "usd", "ids": TOP8_IDS, "sparkline": "false"},
+    )
+    if data is None:
+        return None
+
+    await sync_to_async(store.save_snapshot)(store.TOP8, data)
+    await sync_to_async(store.save_market_prices)(data, publish=True)
+    return data
+
+
+async def refresh_prices(skip=()):
+    """ /simple/price for held/requested coins not already covered by top100 """
+    tracked = await sync_to_async(store.tracked_price_ids)()
+    ids = sorted(tracked - set(skip))
+    if not ids:
+        return {}
+
+    data = await acg(
+        "/simple/price",
+        params={
+            "ids": ",".join(ids),
+            "vs_currencies": "usd",
+            "include_market_cap": "true",
+            "include_24hr_vol": "true",
+            "include_24hr_change": "true",
+        },
+    )
+    if data is None:
+        return None
+
+    await sync_to_async(store.save_simple_prices)(data, publish=True)
+    return data
+
+
+async def refresh_detail(coin_id):
+    # coin info (description, links, supply) changes slowly and is fetched
+    # every info TTL; the chart comes from the local history store, which
+    # only ever fetches the points it is missing.
+    info, _ = await asyncio.gather(
+        acg_cached(
+            f"/coins/{coin_id}",
+            params={
+                "localization": "false",
+                "market_data": "true",
+                "sparkline": "true",
+            },
+            ttl=settings.MARKET_DETAIL_INFO_TTL,
+        ),
+        refresh_history(coin_id),
+    )
+    if info is None:
+        return None
+
+    chart = await sync_to_async(history.chart)(coin_id, "7d")
+    payload = {"info": info, "chart": chart}
+    await sync_to_async(store.save_snapshot)(store.detail_key(coin_id), payload)
+    return payload
+
+
+_backfill_after = {}   # coin_id -> (no backfill before, delay) after a failed fetch
+
+
+async def refresh_history(coin_id):
+    """
+    Backfill every resolution of a coin's history once, afterwards fetch
+    only the points since the newest stored one.
+    """
+    stored = await sync_to_async(history.status)(coin_id)
+
+    missing = [name for name in history.RESOLUTIONS if not stored.get(name, (0, False))[1]]
+    if missing and time.time() < _backfill_after.get(coin_id, (0, 0))[0]:
+        return
+    if missing:
+        charts = await asyncio.gather(*(
+            acg(
+                f"/coins/{coin_id}/market_chart",
+                params={
+                    "vs_currency": "usd",
+                    "days": history.BACKFILL_DAYS[name] or settings.MARKET_HISTORY_MAX_DAYS,
+                },
+            )
+            for name in missing
+        ))
+        # finest first: coarser data only extends what finer data covered
+        for name, chart in zip(missing, charts):
+            if chart and chart.get("prices"):
+                await sync_to_async(history.record)(
+                    {coin_id: chart.get("prices")}, backfilled=name
+                )
+            elif chart is not None:
+                # upstream has nothing for this range: asking again won't help
+                await sync_to_async(history.mark_backfilled)(coin_id, name)
+
+        # failed fetches are retried with a doubling delay, not every cycle
+        if any(chart is None for chart in charts):
+            delay = min(_backfill_after.get(coin_id, (0, 30))[1] * 2, 3600)
+            _backfill_after[coin_id] = (time.time() + delay, delay)
+        else:
+            _backfill_after.pop(coin_id, None)
+        return
+
+    since = stored["5m"][0]
+    now = time.time()
+    if now - since < settings.MARKET_HISTORY_DELTA:
+        return
+
+    chart = await acg(
+        f"/coins/{coin_id}/market_chart/range",
+        params={"vs_currency": "usd", "from": int(since), "to": int(now)},
+    )
+    if chart:
+        await sync_to_async(history.record)({coin_id: chart.get("prices")})
+
+
+_catalog_at = 0
+
+
+async def refresh_catalog():
+    """ Coin list + Binance futures symbols, once per MARKET_CATALOG_TTL """
+    global _catalog_at
+    if time.time() - _catalog_at < settings.MARKET_CATALOG_TTL:
+        return None
+
+    coins, futures = await asyncio.gather(acg("/coins/list"), binance_perpetuals())
+    if not isinstance(coins, list):
+        return None
+
+    await sync_to_async(catalog.save_coins)(coins)
+    if futures is not None:
+        await sync_to_async(catalog.save_binance_symbols)(futures)
+        _catalog_at = time.time()
+    return coins
+
+
+async def binance_perpetuals():
+    """ Trading USDT-M perpetuals from Binance /exchangeInfo, or None """
+    try:
+        data = await upstream.aget(
+            "binance",
+            f"{settings.BINANCE_FAPI_URL}/fapi/v1/exchangeInfo",
+            name="/fapi/v1/exchangeInfo",
+            deadline=15,   # large, rarely fetched response
+        )
+    except upstream.UpstreamError as e:
+        print("❌ BINANCE EXCHANGE INFO ERROR:", e)
+        return None
+
+    return [
+        s for s in data.get("symbols", [])
+        if s.get("contractType") == "PERPETUAL"
+        and s.get("quoteAsset") == "USDT"
+        and s.get("status") == "TRADING"
+    ]
+
+
+async def run_cycle():
+    top, _ = await asyncio.gather(refresh_top100(), refresh_top8())
+    demanded = await sync_to_async(store.demanded_details)()
+
+    await asyncio.gather(
+        refresh_prices(skip={c.get("id") for c in top or []}),
+        refresh_catalog(),
+        *(refresh_detail(coin_id) for coin_id in demanded),
+    )
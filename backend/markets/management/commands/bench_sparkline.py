@@ -0,0 +1,135 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from markets import payloads, sparkline, store, views
+
+MARKETS_PAGE = (
+    "sparkline=48&fields=id,symbol,name,image,current_price,"
+    "price_change_percentage_24h,sparkline_in_7d"
+)
+
+
+def fake_top100(points=168):
+    """ /coins/markets-shaped list (random-walk sparklines) """
+    rnd = random.Random(7)
+    coins = []
+    for rank in range(1, 101):
+        price = 10 ** rnd.uniform(-2, 5)
+        line = []
+        for _ in range(points):
+            price *= 1 + rnd.gauss(0, 0.01)
+            line.append(price)
+        coins.append({
+            "id": f"coin-{rank}",
+            "symbol": f"c{rank}",
+            "name": f"Coin {rank}",
+            "image": f"https://coin-images.coingecko.com/coins/images/{rank}/large/coin.png",
+            "current_price": price,
+            "market_cap": price * 1e9,
+            "market_cap_rank": rank,
+            "fully_diluted_valuation": price * 1.2e9,
+            "total_volume": price * 1e8,
+            "high_24h": price * 1.03,
+            "low_24h": price * 0.97,
+            "price_change_24h": price * 0.01,
+            "price_change_percentage_24h": rnd.uniform(-8, 8),
+            "market_cap_change_24h": price * 1e7,
+            "market_cap_change_percentage_24h": rnd.uniform(-8, 8),
+            "circulating_supply": 1e9,
+            "total_supply": 1.2e9,
+            "max_supply": None,
+            "ath": price * 2,
+            "ath_change_percentage": -50.0,
+            "ath_date": "2024-03-14T07:10:36.635Z",
+            "atl": price / 20,
+            "atl_change_percentage": 1900.0,
+            "atl_date": "2015-10-20T00:00:00.000Z",
+            "roi": None,
+            "last_updated": "2024-12-11T12:00:00.000Z",
+            "sparkline_in_7d": {"price": line},
+            "price_change_percentage_24h_in_currency": rnd.uniform(-8, 8),
+        })
+    return coins
+
+
+class Command(BaseCommand):
+    help = "Payload size and server CPU per top100 request, full vs downsampled/projected"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per variant")
+        parser.add_argument(
+            "--from-db", action="store_true", help="Use the stored top100 snapshot instead of synthetic data"
+        )
+
+    def handle(self, *args, **options):
+        coins = store.get_snapshot(store.TOP100) if options["from_db"] else fake_top100()
+        if not coins:
+            print("❌ no top100 snapshot stored, run ingest_markets or drop --from-db")
+            return
+
+        n = options["requests"]
+
+        # --- once per refresh: LTTB for every resolution ---
+        started = time.process_time()
+        for _ in range(20):
+            for points in store.settings.MARKET_SPARKLINE_POINTS:
+                sparkline.downsample_markets(coins, points)
+        refresh = (time.process_time() - started) / 20
+        print(f"downsampling, all resolutions: {refresh * 1000:.2f} ms CPU per ingest cycle\n")
+
+        variants = [
+            ("full (before)", ""),
+            ("sparkline=84", "sparkline=84"),
+            ("sparkline=48", "sparkline=48"),
+            ("sparkline=24", "sparkline=24"),
+            ("sparkline=0", "sparkline=0"),
+            ("markets page", MARKETS_PAGE),
+        ]
+
+        factory = RequestFactory()
+        print(f"{'variant':16} {'raw KB':>8} {'gzip KB':>8} {'br KB':>8} {'µs/req':>8} {'encode µs':>10}")
+
+        with transaction.atomic():
+            store.save_top100(coins)
+
+            for label, query in variants:
+                def request():
+                    return factory.get(
+                        f"/api/markets/top100/?{query}", HTTP_ACCEPT_ENCODING="gzip, br"
+                    )
+
+                response = views.top_100(request())  # warm the process cache
+                enc = store.get_top100_encoded(
+                    views.parse_sparkline(request().GET.get("sparkline")),
+                    views.parse_fields(request().GET.get("fields")),
+                )
+
+                started = time.process_time()
+                for _ in range(n):
+                    response = views.top_100(request())
+                per_request = (time.process_time() - started) / n
+
+                # what the same response costs when built per request
+                started = time.process_time()
+                for _ in range(20):
+                    req = request()
+                    points = views.parse_sparkline(req.GET.get("sparkline"))
+                    fields = views.parse_fields(req.GET.get("fields"))
+                    data = coins if points is None else sparkline.downsample_markets(coins, points)
+                    payloads.encode(sparkline.project(data, fields) if fields else data)
+                per_request_encode = (time.process_time() - started) / 20
+
+                assert response.status_code == 200
+                print(
+                    f"{label:16} {len(enc.body) / 1024:8.1f} {len(enc.gzip) / 1024:8.1f} "
+                    f"{len(enc.br or b'') / 1024:8.1f} {per_request * 1e6:8.1f} "
+                    f"{per_request_encode * 1e6:10.0f}"
+                )
+
+            transaction.set_rollback(True)
+
+        print("\nµs/req: view CPU serving the stored bytes (br); encode µs: building the same body per request")
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import upstream
+from markets.coingecko import cg, acg
+
+
+class SlowUpstream(BaseHTTPRequestHandler):
+    """ CoinGecko stand-in that answers every GET after `delay` seconds """
+
+    delay = 0.1
+    body = json.dumps({"bitcoin": {"usd": 97000.0}}).encode()
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Compare sync and async upstream throughput against a local slow-upstream stub"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delay", type=float, default=0.1, help="Upstream latency in seconds")
+        parser.add_argument("--requests", type=int, default=200, help="Upstream calls per run")
+        parser.add_argument(
+            "--pool-size", type=int, default=200, help="CoinGecko pool size (in-flight limit) for the run"
+        )
+
+    def handle(self, *args, **options):
+        SlowUpstream.delay = options["delay"]
+        ThreadingHTTPServer.request_queue_size = 1024
+        server = ThreadingHTTPServer(("127.0.0.1", 0), SlowUpstream)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        settings.COINGECKO_BASE_URL = f"http://127.0.0.1:{server.server_port}"
+        settings.UPSTREAMS["coingecko"]["pool_size"] = options["pool_size"]
+
+        n = options["requests"]
+        print(f"upstream delay {options['delay'] * 1000:.0f} ms, {n} calls per run\n")
+
+        # --- coin detail: /coins/{id} + /market_chart ---
+        started = time.perf_counter()
+        cg("/coins/bitcoin")
+        cg("/coins/bitcoin/market_chart")
+        sync_detail = time.perf_counter() - started
+
+        async def detail():
+            await acg("/ping")  # warm the loop's client
+            started = time.perf_counter()
+            await asyncio.gather(acg("/coins/bitcoin"), acg("/coins/bitcoin/market_chart"))
+            elapsed = time.perf_counter() - started
+            await upstream.aclose()
+            return elapsed
+
+        async_detail = asyncio.run(detail())
+
+        print(f"coin detail   sync {sync_detail * 1000:7.1f} ms   async {async_detail * 1000:7.1f} ms")
+
+        # --- throughput: one sync worker vs one event loop ---
+        started = time.perf_counter()
+        for _ in range(n):
+            cg("/simple/price")
+        sync_elapsed = time.perf_counter() - started
+
+        async def burst():
+            await acg("/ping")
+            started = time.perf_counter()
+            await asyncio.gather(*(acg("/simple/price") for _ in range(n)))
+            elapsed = time.perf_counter() - started
+            await upstream.aclose()
+            return elapsed
+
+        async_elapsed = asyncio.run(burst())
+
+        print(f"throughput    sync {n / sync_elapsed:7.1f} req/s   async {n / async_elapsed:7.1f} req/s")
+        print(f"speedup       {sync_elapsed / async_elapsed:.1f}x")
+
+        print()
+        for endpoint, s in upstream.stats().items():
+            print(f"{endpoint:36} n={s['count']:<5} avg {s['avg_ms']:7.1f} ms  max {s['max_ms']:7.1f} ms  errors {s['errors']}")
+
+        server.shutdown()
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import upstream
+from markets import history
+from markets.ingest import run_cycle
+
+
+class Command(BaseCommand):
+    help = "Periodically pull CoinGecko market data into the local market store"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.MARKET_INGEST_INTERVAL,
+            help="Seconds between ingestion cycles",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run a single cycle and exit",
+        )
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        """ One event loop for the worker's lifetime, so its upstream pools are reused """
+        interval = options["interval"]
+
+        try:
+            while True:
+                started = time.monotonic()
+
+                try:
+                    await run_cycle()
+                except Exception as e:
+                    print("❌ INGEST ERROR:", e)
+
+                if options["once"]:
+                    return
+
+                elapsed = time.monotonic() - started
+                await asyncio.sleep(max(0.0, interval - elapsed))
+        finally:
+            await sync_to_async(history.flush)()
+            await upstream.aclose()
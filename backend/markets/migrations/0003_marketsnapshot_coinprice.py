@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('markets', '0002_spotasset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoinPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coin_id', models.CharField(max_length=50, unique=True)),
+                ('symbol', models.CharField(blank=True, max_length=20)),
+                ('price', models.DecimalField(blank=True, decimal_places=10, max_digits=30, null=True)),
+                ('change_24h', models.FloatField(blank=True, null=True)),
+                ('market_cap', models.FloatField(blank=True, null=True)),
+                ('volume', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MarketSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=120, unique=True)),
+                ('payload', models.JSONField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
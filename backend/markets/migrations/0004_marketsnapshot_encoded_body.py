@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('markets', '0003_marketsnapshot_coinprice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marketsnapshot',
+            name='body',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='marketsnapshot',
+            name='body_br',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='marketsnapshot',
+            name='body_gzip',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='marketsnapshot',
+            name='etag',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
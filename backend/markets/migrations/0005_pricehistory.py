@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('markets', '0004_marketsnapshot_encoded_body'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coin_id', models.CharField(max_length=50)),
+                ('resolution', models.CharField(max_length=4)),
+                ('start', models.BinaryField(default=b'')),
+                ('open', models.BinaryField(default=b'')),
+                ('high', models.BinaryField(default=b'')),
+                ('low', models.BinaryField(default=b'')),
+                ('close', models.BinaryField(default=b'')),
+                ('last_ts', models.FloatField(default=0)),
+                ('backfilled', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('coin_id', 'resolution')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('markets', '0005_pricehistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Coin',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coin_id', models.CharField(max_length=100, unique=True)),
+                ('symbol', models.CharField(db_index=True, max_length=50)),
+                ('name', models.CharField(max_length=200)),
+                ('market_cap_rank', models.PositiveIntegerField(blank=True, null=True)),
+                ('binance_symbol', models.CharField(blank=True, db_index=True, max_length=30, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -45,4 +45,98 @@ class SpotAsset(models.Model):
         unique_together = ("user", "coin_id")
 
     def __str__(self):
-        return f"{self.user.username} {self.symbol} {self.amount}"
\ No newline at end of file
+        return f"{self.user.username} {self.symbol} {self.amount}"
+
+# -----------------------------------------
+# MARKET SNAPSHOT (written by ingest_markets)
+# -----------------------------------------
+class MarketSnapshot(models.Model):
+    key = models.CharField(max_length=120, unique=True)
+    payload = models.JSONField(null=True, blank=True)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    # payload pre-encoded at write time (see markets/payloads.py)
+    etag = models.CharField(max_length=64, blank=True)
+    body = models.BinaryField(null=True, blank=True)
+    body_gzip = models.BinaryField(null=True, blank=True)
+    body_br = models.BinaryField(null=True, blank=True)
+
+    # set by the request path, read by the ingest worker
+    requested_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.key} @ {self.updated_at}"
+
+
+# -----------------------------------------
+# COIN PRICE (normalized latest price per coin)
+# -----------------------------------------
+class CoinPrice(models.Model):
+    coin_id = models.CharField(max_length=50, unique=True)
+    symbol = models.CharField(max_length=20, blank=True)
+
+    # null until the ingest worker has priced a requested coin
+    price = models.DecimalField(
+        max_digits=30,
+        decimal_places=10,
+        null=True,
+        blank=True
+    )
+
+    change_24h = models.FloatField(null=True, blank=True)
+    market_cap = models.FloatField(null=True, blank=True)
+    volume = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.coin_id} ${self.price}"
+
+
+# -----------------------------------------
+# PRICE HISTORY (OHLC bars, see markets/history.py)
+# -----------------------------------------
+class PriceHistory(models.Model):
+    """ One resolution of one coin's price history, stored as packed columns """
+
+    coin_id = models.CharField(max_length=50)
+    resolution = models.CharField(max_length=4)   # "5m" / "1h" / "1d"
+
+    # little-endian arrays, one value per bar: int64 bar start (epoch
+    # seconds), float64 open/high/low/close
+    start = models.BinaryField(default=b"")
+    open = models.BinaryField(default=b"")
+    high = models.BinaryField(default=b"")
+    low = models.BinaryField(default=b"")
+    close = models.BinaryField(default=b"")
+
+    # epoch seconds of the newest price point folded in
+    last_ts = models.FloatField(default=0)
+    # full range for this resolution fetched once from CoinGecko
+    backfilled = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("coin_id", "resolution")
+
+    def __str__(self):
+        return f"{self.coin_id} {self.resolution} history"
+
+
+# -----------------------------------------
+# COIN CATALOG (see markets/catalog.py)
+# -----------------------------------------
+class Coin(models.Model):
+    coin_id = models.CharField(max_length=100, unique=True)
+    symbol = models.CharField(max_length=50, db_index=True)
+    name = models.CharField(max_length=200)
+
+    # top100 rank when the coin is in it, null otherwise
+    market_cap_rank = models.PositiveIntegerField(null=True, blank=True)
+
+    # Binance USDT-M perpetual for this coin (e.g. "BTCUSDT"), if any
+    binance_symbol = models.CharField(max_length=30, null=True, blank=True, db_index=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.coin_id} ({self.symbol})"
@@ -0,0 +1,89 @@
+# markets/payloads.py
+#
+# Market payloads are encoded once, when they are written, into JSON bytes
+# plus gzip/brotli variants and a content hash. Views send those bytes as
+# they are: no per-request serialization, and a matching If-None-Match
+# gets an empty 304.
+
+from dataclasses import dataclass
+import gzip
+import hashlib
+import json
+
+from django.http import HttpResponse, HttpResponseNotModified
+
+try:
+    import brotli
+except ImportError:  # brotli is optional — gzip is always available
+    brotli = None
+
+
+@dataclass(frozen=True)
+class Encoded:
+    etag: str
+    body: bytes
+    gzip: bytes
+    br: bytes = None
+
+
+def encode(payload):
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    return Encoded(
+        etag=f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+        body=body,
+        gzip=gzip.compress(body, compresslevel=6, mtime=0),
+        br=brotli.compress(body, quality=5) if brotli else None,
+    )
+
+
+def respond(request, encoded):
+    """ 304 if the client has this version, else the best encoding it accepts """
+    headers = {
+        "ETag": encoded.etag,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache",
+    }
+
+    if _etag_matches(request.headers.get("If-None-Match", ""), encoded.etag):
+        response = HttpResponseNotModified()
+    else:
+        accept = request.headers.get("Accept-Encoding", "")
+        if encoded.br and _accepts(accept, "br"):
+            body, coding = encoded.br, "br"
+        elif _accepts(accept, "gzip"):
+            body, coding = encoded.gzip, "gzip"
+        else:
+            body, coding = encoded.body, None
+
+        response = HttpResponse(body, content_type="application/json")
+        if coding:
+            headers["Content-Encoding"] = coding
+
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+# -------- helpers --------
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def _accepts(header, coding):
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() != coding:
+            continue
+        q = params.strip()
+        if not q.startswith("q="):
+            return True
+        try:
+            return float(q[2:]) > 0
+        except ValueError:
+            return False
+    return False
@@ -0,0 +1,164 @@
+# markets/prices.py
+#
+# get_prices(ids): batched price lookups for the wallet and convert views.
+# Hits come from the local store (shared table, then DB). Misses from all
+# concurrent requests in this worker are collected for a short window and
+# fetched with a single /simple/price call (DataLoader-style) and saved
+# to the DB; the shared price table is left to the ingest worker.
+# aget_prices() is the same for async views, batching within the event loop.
+
+from decimal import Decimal
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import store
+from .coingecko import cg, acg
+
+
+class _Batch:
+    def __init__(self):
+        self.ids = set()
+        self.result = {}
+        self.done = threading.Event()
+
+        # async batches only
+        self.loop = None
+        self.future = None
+
+
+_lock = threading.Lock()
+_current = None
+_acurrent = None
+
+stats = {"lookups": 0, "hits": 0, "batches": 0, "upstream_ids": 0}
+
+
+def get_prices(coin_ids):
+    """ {coin_id: Decimal price} for every id we could price """
+    coin_ids = set(coin_ids)
+    stats["lookups"] += len(coin_ids)
+
+    prices = store.get_prices(coin_ids, max_age=settings.PRICE_TABLE_MAX_AGE)
+    stats["hits"] += len(prices)
+
+    missing = coin_ids - prices.keys()
+    if missing:
+        prices.update(_load_missing(missing))
+
+    return prices
+
+
+async def aget_prices(coin_ids):
+    """ get_prices() for async views """
+    coin_ids = set(coin_ids)
+    stats["lookups"] += len(coin_ids)
+
+    prices = await sync_to_async(store.get_prices)(
+        coin_ids, max_age=settings.PRICE_TABLE_MAX_AGE
+    )
+    stats["hits"] += len(prices)
+
+    missing = coin_ids - prices.keys()
+    if missing:
+        prices.update(await _aload_missing(missing))
+
+    return prices
+
+
+# -------- helpers --------
+def _load_missing(coin_ids):
+    """ Join (or open) the current batch and wait for its single upstream call """
+    global _current
+
+    with _lock:
+        batch = _current
+        leader = batch is None or len(batch.ids) >= settings.PRICE_BATCH_MAX_IDS
+        if leader:
+            batch = _current = _Batch()
+        batch.ids.update(coin_ids)
+
+    if leader:
+        time.sleep(settings.PRICE_BATCH_WINDOW)
+        with _lock:
+            if _current is batch:
+                _current = None
+        try:
+            batch.result = _fetch(batch.ids)
+        finally:
+            batch.done.set()
+    else:
+        batch.done.wait(settings.PRICE_BATCH_TIMEOUT)
+
+    return {c: batch.result[c] for c in coin_ids if c in batch.result}
+
+
+async def _aload_missing(coin_ids):
+    """ _load_missing() within one event loop — no locks, the batch is a Future """
+    global _acurrent
+
+    loop = asyncio.get_running_loop()
+    batch = _acurrent
+    leader = (
+        batch is None
+        or batch.loop is not loop
+        or len(batch.ids) >= settings.PRICE_BATCH_MAX_IDS
+    )
+    if leader:
+        batch = _acurrent = _Batch()
+        batch.loop = loop
+        batch.future = loop.create_future()
+    batch.ids.update(coin_ids)
+
+    if leader:
+        await asyncio.sleep(settings.PRICE_BATCH_WINDOW)
+        if _acurrent is batch:
+            _acurrent = None
+        try:
+            data = await acg("/simple/price", params=_params(batch.ids))
+            batch.result = await sync_to_async(_save)(batch.ids, data)
+        finally:
+            batch.future.set_result(None)
+    else:
+        try:
+            await asyncio.wait_for(
+                asyncio.shield(batch.future), settings.PRICE_BATCH_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            pass
+
+    return {c: batch.result[c] for c in coin_ids if c in batch.result}
+
+
+def _fetch(coin_ids):
+    return _save(coin_ids, cg("/simple/price", params=_params(coin_ids)))
+
+
+def _params(coin_ids):
+    stats["batches"] += 1
+    stats["upstream_ids"] += len(coin_ids)
+
+    return {
+        "ids": ",".join(sorted(coin_ids)),
+        "vs_currencies": "usd",
+        "include_market_cap": "true",
+        "include_24hr_vol": "true",
+        "include_24hr_change": "true",
+    }
+
+
+def _save(coin_ids, data):
+    if not data:
+        # let the ingest worker keep trying
+        store.request_prices(coin_ids)
+        return {}
+
+    store.save_simple_prices(data)
+    return {
+        coin_id: Decimal(str(p["usd"]))
+        for coin_id, p in data.items()
+        if p.get("usd") is not None
+    }
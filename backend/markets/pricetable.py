@@ -0,0 +1,314 @@
+# markets/pricetable.py
+#
+# Fixed-size price records in a memory-mapped file, shared by every
+# worker on the node. The ingest worker writes records in place; web
+# workers map the same file read-only and unpack straight out of the
+# page cache, so lookups are a dict hit plus one struct unpack and the
+# memory cost does not grow with the number of workers.
+#
+# File layout
+#   header:  magic(4s) capacity(I) count(I) generation(Q)
+#   record:  seq(Q) key(48s) tag(16s) <FIELDS as float64>
+#
+# `seq` is a per-record seqlock: odd while a write is in progress.
+# `generation` changes whenever records are appended, telling readers to
+# rebuild their key -> slot index. A writer that replaces the file (to
+# grow it) sets the old file's generation to RETIRED, telling readers to
+# map the new one.
+
+import fcntl
+import mmap
+import os
+import struct
+import time
+
+from django.conf import settings
+
+
+class SharedTable:
+    MAGIC = b"CFT1"
+    KEY_SIZE = 48
+    TAG_SIZE = 16
+    FIELDS = ()
+
+    HEADER = struct.Struct("<4sIIQ")
+    RETIRED = 0             # generation of a file replaced by a bigger one
+    READ_RETRIES = 100      # seqlock attempts before a slot counts as missing
+
+    def __init__(self, path, capacity=None, writable=False):
+        self.path = str(path)
+        self.writable = writable
+        self.record = struct.Struct(
+            f"<Q{self.KEY_SIZE}s{self.TAG_SIZE}s{len(self.FIELDS)}d"
+        )
+        self._fields = struct.Struct(f"<{len(self.FIELDS)}d")
+        self._fields_offset = 8 + self.KEY_SIZE + self.TAG_SIZE
+
+        if writable:
+            self._create(capacity)
+        self._open()
+
+    # ===================== READS =====================
+
+    def get(self, key):
+        """ dict of FIELDS for `key`, or None """
+        values = self.values(key)
+        return dict(zip(self.FIELDS, values)) if values else None
+
+    def values(self, key):
+        """ Raw FIELDS tuple for `key`, or None — the hot-path lookup """
+        slot = self._slots().get(key)
+        if slot is None:
+            return None
+        return self.read_slot(slot)
+
+    def get_by_tag(self, tag):
+        slot = self._tag_slots().get(tag)
+        if slot is None:
+            return None
+        values = self.read_slot(slot)
+        return dict(zip(self.FIELDS, values)) if values else None
+
+    def read_slot(self, slot):
+        """
+        Field tuple of a slot, retried until a consistent copy is read. None
+        after READ_RETRIES attempts: a writer that died mid-write leaves the
+        slot odd forever, and readers (some on an event loop) must not spin.
+        """
+        offset = self.HEADER.size + slot * self.record.size
+        mm = self.mm
+
+        for _ in range(self.READ_RETRIES):
+            seq = struct.unpack_from("<Q", mm, offset)[0]
+            if seq & 1:
+                os.sched_yield()    # let the writer finish
+                continue
+            values = self._fields.unpack_from(mm, offset + self._fields_offset)
+            if struct.unpack_from("<Q", mm, offset)[0] == seq:
+                return values
+        return None
+
+    def version(self, key):
+        """ Number of writes to `key` so far """
+        slot = self._slots().get(key)
+        if slot is None:
+            return 0
+        offset = self.HEADER.size + slot * self.record.size
+        return struct.unpack_from("<Q", self.mm, offset)[0] // 2
+
+    def keys(self):
+        return list(self._slots())
+
+    def __len__(self):
+        return len(self._slots())
+
+    # ===================== WRITES =====================
+
+    def upsert(self, rows):
+        """
+        Write [(key, tag, {field: value})] in place, appending unknown keys.
+        A None tag or field keeps the value already stored. Writers from
+        different processes are serialized with flock. Returns the keys
+        left out: the table is full, or the key / tag is longer than its
+        column (KEY_SIZE / TAG_SIZE bytes of UTF-8).
+        """
+        if not self.writable:
+            raise RuntimeError("table opened read-only")
+
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            index = self._slots()
+            _, _, count, generation = self.HEADER.unpack_from(self.mm, 0)
+            appended = False
+            full, oversize = [], []
+
+            for key, tag, values in rows:
+                if not self._fits(key, tag):
+                    oversize.append(key)
+                    continue
+                slot = index.get(key)
+                if slot is None:
+                    if count >= self.capacity:
+                        full.append(key)
+                        continue
+                    slot = index[key] = count
+                    count += 1
+                    appended = True
+
+                self._write_slot(slot, key, tag, values)
+
+            if appended:
+                self.HEADER.pack_into(
+                    self.mm, 0, self.MAGIC, self.capacity, count, generation + 1
+                )
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+        if full:
+            print(f"❌ TABLE FULL: {self.path} ({self.capacity} records), "
+                  f"{len(full)} keys not stored:", full[:10])
+        if oversize:
+            print(f"❌ KEY / TAG TOO LONG: {self.path}, "
+                  f"{len(oversize)} keys not stored:", oversize[:10])
+        return full + oversize
+
+    def _write_slot(self, slot, key, tag, values):
+        offset = self.HEADER.size + slot * self.record.size
+        seq = struct.unpack_from("<Q", self.mm, offset)[0]
+        seq += seq & 1      # left odd by a writer that died mid-write
+
+        _, _, old_tag = struct.unpack_from(
+            f"<Q{self.KEY_SIZE}s{self.TAG_SIZE}s", self.mm, offset
+        )
+        old = self._fields.unpack_from(self.mm, offset + self._fields_offset)
+        merged = [
+            float(values[f]) if values.get(f) is not None else old[i]
+            for i, f in enumerate(self.FIELDS)
+        ]
+
+        struct.pack_into("<Q", self.mm, offset, seq + 1)
+        self.record.pack_into(
+            self.mm, offset, seq + 1,
+            key.encode(),
+            tag.encode() if tag is not None else old_tag,
+            *merged,
+        )
+        struct.pack_into("<Q", self.mm, offset, seq + 2)
+
+    # -------- helpers --------
+    def _fits(self, key, tag):
+        """
+        A key / tag cut to its column would be stored under another name
+        (or mid-character, which no reader could decode): they must fit
+        """
+        return len(key.encode()) <= self.KEY_SIZE and (
+            tag is None or len(tag.encode()) <= self.TAG_SIZE
+        )
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDWR if self.writable else os.O_RDONLY)
+        try:
+            self.mm = mmap.mmap(
+                fd, 0, access=mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ
+            )
+        finally:
+            os.close(fd)
+
+        magic, self.capacity, _, _ = self.HEADER.unpack_from(self.mm, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f"{self.path} is not a {type(self).__name__} file")
+
+        self._generation = None
+        self._index = {}
+        self._tags = {}
+        self._tag_index = None
+
+    def _create(self, capacity):
+        capacity = capacity or 4096
+        size = self.HEADER.size + capacity * self.record.size
+
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= size:
+            return
+
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, capacity, 0, 1))
+            f.truncate(size)
+
+        try:
+            old = os.open(self.path, os.O_RDWR)
+        except FileNotFoundError:
+            old = None
+        os.replace(tmp, self.path)
+        if old is None:
+            return
+
+        # readers still map the old file: retire it so they reopen the path
+        try:
+            with mmap.mmap(old, self.HEADER.size) as mm:
+                magic, old_capacity, count, _ = self.HEADER.unpack_from(mm, 0)
+                self.HEADER.pack_into(mm, 0, magic, old_capacity, count, self.RETIRED)
+        except (ValueError, struct.error):
+            pass    # too short to be a table: nobody maps it
+        finally:
+            os.close(old)
+
+    def _slots(self):
+        """ key -> slot, rebuilt only when the header generation changes """
+        _, _, count, generation = self.HEADER.unpack_from(self.mm, 0)
+        if generation == self._generation:
+            return self._index
+        if generation == self.RETIRED:
+            self._open()
+            _, _, count, generation = self.HEADER.unpack_from(self.mm, 0)
+
+        index, tags = {}, {}
+        for slot in range(count):
+            offset = self.HEADER.size + slot * self.record.size
+            _, key, tag = struct.unpack_from(
+                f"<Q{self.KEY_SIZE}s{self.TAG_SIZE}s", self.mm, offset
+            )
+            index[key.rstrip(b"\0").decode()] = slot
+            tags.setdefault(tag.rstrip(b"\0").decode(), []).append(slot)
+
+        self._index, self._tags, self._generation = index, tags, generation
+        self._tag_index = None
+        return index
+
+    def _tag_slots(self):
+        self._slots()
+        if self._tag_index is None:
+            self._tag_index = {
+                tag: self._pick_tag_slot(slots) for tag, slots in self._tags.items()
+            }
+        return self._tag_index
+
+    def _pick_tag_slot(self, slots):
+        return slots[0]
+
+
+class PriceTable(SharedTable):
+    """ CoinGecko id -> latest market record, tagged with the coin symbol """
+
+    MAGIC = b"CFP1"
+    FIELDS = ("price", "change_24h", "market_cap", "volume", "updated_at")
+
+    def _pick_tag_slot(self, slots):
+        # several coins share a ticker symbol — the largest market cap wins
+        return max(slots, key=lambda s: (self.read_slot(s) or (0, 0, 0))[2])
+
+
+# ===================== PROCESS-WIDE HANDLES =====================
+
+_reader = None
+_writer = None
+
+
+def reader():
+    """ Read-only handle, or None until the ingest worker has created the file """
+    global _reader
+    if _reader is None:
+        try:
+            _reader = PriceTable(settings.PRICE_TABLE_PATH)
+        except (FileNotFoundError, ValueError):
+            return None
+    return _reader
+
+
+def writer():
+    global _writer
+    if _writer is None:
+        _writer = PriceTable(
+            settings.PRICE_TABLE_PATH,
+            capacity=settings.PRICE_TABLE_CAPACITY,
+            writable=True,
+        )
+    return _writer
+
+
+def fresh(record, max_age=None):
+    """ True if a record was updated within max_age seconds """
+    max_age = settings.PRICE_TABLE_MAX_AGE if max_age is None else max_age
+    return record is not None and time.time() - record["updated_at"] <= max_age
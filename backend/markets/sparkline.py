@@ -0,0 +1,88 @@
+# markets/sparkline.py
+#
+# Sparkline downsampling for the top100 list. CoinGecko sends ~168 hourly
+# points per coin; the markets page draws a ~100px line. Largest-Triangle-
+# Three-Buckets keeps the points that define the visible shape (peaks,
+# dips) instead of every n-th one.
+#
+# LTTB walks the buckets left to right, but each step is computed for every
+# coin at once with NumPy, so a whole top100 list costs `points` array ops.
+
+import numpy as np
+
+
+def lttb(series, points):
+    """
+    Downsample each row of `series` (rows x n float array, x = index)
+    to `points` columns. Rows are independent; first and last points kept.
+    """
+    series = np.asarray(series, dtype=np.float64)
+    rows, n = series.shape
+    if points >= n or points < 3:
+        return series if points >= n else series[:, [0, -1]][:, :points]
+
+    # bucket i (1 .. points-2) covers columns edges[i-1]:edges[i]
+    edges = np.floor(np.linspace(1, n - 1, points - 1)).astype(int)
+    edges[-1] = n - 1
+
+    picked = np.empty((rows, points), dtype=int)
+    picked[:, 0] = 0
+    picked[:, -1] = n - 1
+    row = np.arange(rows)
+
+    a_x = np.zeros(rows)
+    a_y = series[:, 0]
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # average of the next bucket (the last point for the last bucket)
+        n_start = end
+        n_end = edges[i + 2] if i + 2 < len(edges) else n
+        c_x = (n_start + n_end - 1) / 2
+        c_y = series[:, n_start:n_end].mean(axis=1)
+
+        xs = np.arange(start, end)
+        ys = series[:, start:end]
+        area = np.abs(
+            (a_x - c_x)[:, None] * (ys - a_y[:, None])
+            - (a_x[:, None] - xs[None, :]) * (c_y - a_y)[:, None]
+        )
+        best = start + area.argmax(axis=1)
+
+        picked[:, i + 1] = best
+        a_x = best.astype(np.float64)
+        a_y = series[row, best]
+
+    return np.take_along_axis(series, picked, axis=1)
+
+
+def downsample_markets(coins, points):
+    """
+    Copy of a /coins/markets list with `sparkline_in_7d.price` reduced to
+    `points` values (points=0 drops the sparkline). Coins are grouped by
+    sparkline length so each group is one lttb() call.
+    """
+    out = [dict(c) for c in coins]
+
+    if not points:
+        for c in out:
+            c.pop("sparkline_in_7d", None)
+        return out
+
+    groups = {}
+    for i, c in enumerate(out):
+        prices = [p for p in (c.get("sparkline_in_7d") or {}).get("price") or [] if p is not None]
+        if prices:
+            groups.setdefault(len(prices), []).append((i, prices))
+
+    for rows in groups.values():
+        reduced = lttb([prices for _, prices in rows], points)
+        for (i, _), line in zip(rows, reduced.tolist()):
+            out[i]["sparkline_in_7d"] = {"price": line}
+
+    return out
+
+
+def project(coins, fields):
+    """ Only `fields` of every coin """
+    return [{f: c[f] for f in fields if f in c} for c in coins]
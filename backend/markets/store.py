@@ -0,0 +1,380 @@
+# markets/store.py
+#
+# Local market-data store. The ingest worker (manage.py ingest_markets)
+# writes here and the views read from here. The only upstream call left
+# on the request path is prices.get_prices() filling in missing prices;
+# those are saved to the DB only. The shared price table has a single
+# writer, the ingest worker (publish=True).
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import MarketSnapshot, CoinPrice, SpotAsset
+from .cache import cached, invalidate
+from . import catalog, history, pricetable, sparkline
+from .payloads import Encoded, encode
+
+
+TOP100 = "top100"
+TOP8 = "top8"
+
+
+def detail_key(coin_id):
+    return f"detail:{coin_id}"
+
+
+def top100_key(points=None):
+    """ Snapshot key of the top100 list with `points` sparkline points (None = as fetched) """
+    return TOP100 if points is None else f"{TOP100}:spark{points}"
+
+
+# ===================== SNAPSHOTS =====================
+
+def get_snapshot(key):
+    """ Snapshot payload, re-read from the DB at most once per TTL per process """
+    return cached(
+        f"snapshot:{key}",
+        lambda: _read_snapshot(key),
+        ttl=settings.MARKET_SNAPSHOT_TTL,
+        stale_ttl=settings.MARKET_SNAPSHOT_STALE_TTL,
+    )
+
+
+def get_encoded(key, group=None):
+    """ Pre-encoded snapshot (payloads.Encoded), same caching as get_snapshot() """
+    return cached(
+        f"encoded:{key}",
+        lambda: _read_encoded(key),
+        ttl=settings.MARKET_SNAPSHOT_TTL,
+        stale_ttl=settings.MARKET_SNAPSHOT_STALE_TTL,
+        group=group,
+    )
+
+
+def save_snapshot(key, payload):
+    enc = encode(payload)
+    MarketSnapshot.objects.update_or_create(
+        key=key,
+        defaults={
+            "payload": payload,
+            "updated_at": timezone.now(),
+            "etag": enc.etag,
+            "body": enc.body,
+            "body_gzip": enc.gzip,
+            "body_br": enc.br,
+        },
+    )
+    invalidate(f"snapshot:{key}")
+    invalidate(f"encoded:{key}")
+
+
+def _read_snapshot(key):
+    row = MarketSnapshot.objects.filter(key=key).only("payload").first()
+    return row.payload if row else None
+
+
+def _read_encoded(key):
+    row = (
+        MarketSnapshot.objects
+        .filter(key=key, body__isnull=False)
+        .only("etag", "body", "body_gzip", "body_br")
+        .first()
+    )
+    if not row:
+        return None
+
+    return Encoded(
+        etag=row.etag,
+        body=bytes(row.body),
+        gzip=bytes(row.body_gzip),
+        br=bytes(row.body_br) if row.body_br else None,
+    )
+
+
+# ===================== TOP 100 =====================
+
+def save_top100(coins):
+    """ The list as fetched plus one downsampled copy per sparkline resolution """
+    save_snapshot(TOP100, coins)
+    for points in settings.MARKET_SPARKLINE_POINTS:
+        save_snapshot(top100_key(points), sparkline.downsample_markets(coins, points))
+
+
+def get_top100_encoded(points=None, fields=None):
+    """
+    Pre-encoded top100 at a sparkline resolution. A `fields` projection is
+    encoded on first use and then cached like the snapshot itself, in the
+    capped "projection" group: clients pick the field sets.
+    """
+    key = top100_key(points)
+    if not fields:
+        return get_encoded(key) or cached(
+            f"encoded:derived:{key}",
+            lambda: _encode_top100(points),
+            ttl=settings.MARKET_SNAPSHOT_TTL,
+        )
+
+    return cached(
+        f"encoded:{key}:fields={','.join(fields)}",
+        lambda: _encode_top100(points, fields),
+        ttl=settings.MARKET_SNAPSHOT_TTL,
+        stale_ttl=settings.MARKET_SNAPSHOT_STALE_TTL,
+        group="projection",
+    )
+
+
+def _encode_top100(points, fields=None):
+    coins = get_snapshot(top100_key(points))
+    if coins is None and points is not None:
+        # resolution not stored yet (worker not restarted since it was added)
+        coins = sparkline.downsample_markets(get_snapshot(TOP100) or [], points)
+    if coins is None:
+        return None
+
+    return encode(sparkline.project(coins, fields) if fields else coins)
+
+
+# ===================== COIN DETAIL =====================
+
+def get_detail_encoded(coin_id):
+    """
+    Stored detail payload for a coin, pre-encoded. If the worker has not
+    fetched it yet, a payload is built from the top100 snapshot so the page
+    still renders. Either way the coin is flagged so the worker keeps its
+    detail fresh.
+    """
+    request_detail(coin_id)
+    return get_encoded(detail_key(coin_id), group="detail") or cached(
+        f"encoded:from-markets:{coin_id}",
+        lambda: encode(detail_from_markets(coin_id)),
+        ttl=settings.MARKET_SNAPSHOT_TTL,
+        group="detail",
+    )
+
+
+def get_chart_encoded(coin_id, range):
+    """
+    Pre-encoded price chart for a history range (see history.RANGES),
+    read from the local history store. Flags the coin like a detail view.
+    """
+    request_detail(coin_id)
+    return cached(
+        f"encoded:chart:{coin_id}:{range}",
+        lambda: encode(
+            history.chart(coin_id, range)
+            or {"range": range, "resolution": None, "prices": [], "ohlc": []}
+        ),
+        ttl=settings.MARKET_SNAPSHOT_TTL,
+        stale_ttl=settings.MARKET_SNAPSHOT_STALE_TTL,
+        group="detail",
+    )
+
+
+def request_detail(coin_id):
+    """
+    Flag a coin as viewed — one DB write per coin per TTL per process.
+    Ids missing from the catalog are never stored (nor fetched upstream).
+    """
+    if not catalog.lookup(coin_id):
+        return
+    cached(
+        f"demand:{coin_id}",
+        lambda: _flag_detail(coin_id),
+        ttl=settings.MARKET_DETAIL_TTL,
+        group="detail",
+    )
+
+
+def _flag_detail(coin_id):
+    MarketSnapshot.objects.update_or_create(
+        key=detail_key(coin_id), defaults={"requested_at": timezone.now()}
+    )
+    return True
+
+
+def demanded_details():
+    """ Coin ids viewed recently whose detail is missing or older than the TTL """
+    now = timezone.now()
+    window = now - timedelta(seconds=settings.MARKET_DETAIL_DEMAND_WINDOW)
+    expired = now - timedelta(seconds=settings.MARKET_DETAIL_TTL)
+
+    rows = (
+        MarketSnapshot.objects
+        .filter(key__startswith="detail:", requested_at__gte=window)
+        .exclude(updated_at__gte=expired)
+        .order_by("-requested_at")
+        .values_list("key", flat=True)[: settings.MARKET_DETAIL_BATCH]
+    )
+    return [k.split(":", 1)[1] for k in rows]
+
+
+def detail_from_markets(coin_id):
+    """ CoinGecko /coins/{id}-shaped payload built from a /coins/markets row """
+    coin = next(
+        (c for c in get_snapshot(TOP100) or [] if c.get("id") == coin_id),
+        None,
+    )
+    if not coin:
+        return {"info": None, "chart": None}
+
+    info = {
+        "id": coin["id"],
+        "symbol": coin.get("symbol"),
+        "name": coin.get("name"),
+        "image": {"large": coin.get("image"), "small": coin.get("image")},
+        "description": {"en": ""},
+        "market_data": {
+            "current_price": {"usd": coin.get("current_price")},
+            "price_change_percentage_24h": coin.get("price_change_percentage_24h"),
+            "market_cap": {"usd": coin.get("market_cap")},
+            "total_volume": {"usd": coin.get("total_volume")},
+            "circulating_supply": coin.get("circulating_supply"),
+            "max_supply": coin.get("max_supply"),
+        },
+    }
+
+    # 7d hourly sparkline, newest point at last_updated
+    spark = (coin.get("sparkline_in_7d") or {}).get("price") or []
+    end = _parse_ts(coin.get("last_updated")) or timezone.now()
+    end_ms = int(end.timestamp() * 1000)
+    step_ms = 3600 * 1000
+    chart = {
+        "prices": [
+            [end_ms - (len(spark) - 1 - i) * step_ms, p]
+            for i, p in enumerate(spark)
+        ]
+    }
+
+    return {"info": info, "chart": chart}
+
+
+# ===================== PRICES =====================
+
+def get_prices(coin_ids, max_age=None):
+    """
+    {coin_id: Decimal price} for the ids we have a price for.
+    Fresh prices come from the shared price table, the rest from the DB.
+    With max_age set, DB prices older than max_age seconds are left out.
+    """
+    coin_ids = list(coin_ids)
+    prices = {}
+
+    table = pricetable.reader()
+    if table:
+        oldest = time.time() - settings.PRICE_TABLE_MAX_AGE
+        for coin_id in coin_ids:
+            values = table.values(coin_id)
+            if values and values[4] >= oldest:
+                prices[coin_id] = Decimal(repr(values[0]))
+
+    missing = [c for c in coin_ids if c not in prices]
+    if missing:
+        rows = CoinPrice.objects.filter(coin_id__in=missing, price__isnull=False)
+        if max_age is not None:
+            rows = rows.filter(
+                updated_at__gte=timezone.now() - timedelta(seconds=max_age)
+            )
+        prices.update(rows.values_list("coin_id", "price"))
+
+    return prices
+
+
+def request_prices(coin_ids):
+    """ Ask the worker to start pricing catalog coins we have no price for yet """
+    CoinPrice.objects.bulk_create(
+        [CoinPrice(coin_id=c) for c in coin_ids if catalog.lookup(c)],
+        ignore_conflicts=True,
+    )
+
+
+def tracked_price_ids():
+    """ Held coins plus coins requested through request_prices() """
+    held = SpotAsset.objects.values_list("coin_id", flat=True).distinct()
+    pending = CoinPrice.objects.filter(price__isnull=True).values_list(
+        "coin_id", flat=True
+    )
+    # rows stored before ids were checked against the catalog are not polled
+    return set(held) | {c for c in pending if catalog.lookup(c)}
+
+
+def save_market_prices(coins, publish=False):
+    """ Normalize a /coins/markets list into CoinPrice rows (publish: also to the price table) """
+    now = timezone.now()
+    _upsert_prices([
+        CoinPrice(
+            coin_id=c["id"],
+            symbol=(c.get("symbol") or "").upper(),
+            price=Decimal(str(c["current_price"])),
+            change_24h=c.get("price_change_percentage_24h"),
+            market_cap=c.get("market_cap"),
+            volume=c.get("total_volume"),
+            updated_at=now,
+        )
+        for c in coins
+        if c.get("id") and c.get("current_price") is not None
+    ], publish=publish)
+
+
+def save_simple_prices(prices, publish=False):
+    """ Normalize a /simple/price response into CoinPrice rows (publish: also to the price table) """
+    now = timezone.now()
+    _upsert_prices([
+        CoinPrice(
+            coin_id=coin_id,
+            price=Decimal(str(p["usd"])),
+            change_24h=p.get("usd_24h_change"),
+            market_cap=p.get("usd_market_cap"),
+            volume=p.get("usd_24h_vol"),
+            updated_at=now,
+        )
+        for coin_id, p in prices.items()
+        if p.get("usd") is not None
+    ], fields=["price", "change_24h", "market_cap", "volume", "updated_at"], publish=publish)
+
+
+def _upsert_prices(objs, fields=None, publish=False):
+    if not objs:
+        return
+
+    CoinPrice.objects.bulk_create(
+        objs,
+        update_conflicts=True,
+        unique_fields=["coin_id"],
+        update_fields=fields or [
+            "symbol", "price", "change_24h", "market_cap", "volume", "updated_at"
+        ],
+    )
+
+    if not publish:
+        return
+
+    # publish to the shared table read by every worker on this node
+    # (ingest worker only: the table's seqlock assumes one writer)
+    pricetable.writer().upsert([
+        (
+            p.coin_id,
+            p.symbol or None,
+            {
+                "price": p.price,
+                "change_24h": p.change_24h,
+                "market_cap": p.market_cap,
+                "volume": p.volume,
+                "updated_at": p.updated_at.timestamp(),
+            },
+        )
+        for p in objs
+    ])
+
+
+# -------- helper --------
+def _parse_ts(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
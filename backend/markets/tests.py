@@ -1,3 +1,78 @@
-from django.test import TestCase
+from decimal import Decimal
+from pathlib import Path
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from markets import cache, prices, pricetable, store
+from markets.pricetable import PriceTable
+
+
+class PriceTableTests(SimpleTestCase):
+    """ The shared price table: keys and tags must fit their columns """
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.table = PriceTable(Path(tmp.name) / "prices.bin", capacity=8, writable=True)
+
+    def test_oversize_keys_and_tags_are_skipped(self):
+        long_key = "x" * (PriceTable.KEY_SIZE + 1)
+        # fits in characters, not in bytes: cut, it would end mid-character
+        wide_key = "é" * (PriceTable.KEY_SIZE // 2 + 1)
+        wide_tag = "€" * (PriceTable.TAG_SIZE // 3 + 1)
+        key = "k" * PriceTable.KEY_SIZE
+
+        rows = [
+            (long_key, "btc", {"price": 1}),
+            (wide_key, "eth", {"price": 2}),
+            ("tagged", wide_tag, {"price": 3}),
+            (key, "sol", {"price": 4}),
+        ]
+        self.assertEqual(self.table.upsert(rows), [long_key, wide_key, "tagged"])
+        self.assertEqual(self.table.upsert(rows), [long_key, wide_key, "tagged"])
+
+        # the key that fits exactly takes one slot, and every reader can decode the table
+        reader = PriceTable(self.table.path)
+        self.assertEqual(reader.keys(), [key])
+        self.assertEqual(reader.get(key)["price"], 4)
+        self.assertEqual(reader.version(key), 2)
+        self.assertIsNone(reader.values(long_key))
+
+
+class RequestPathPriceTests(TestCase):
+    """ Prices fetched on the request path go to the DB only: the ingest worker is the table's one writer """
+
+    DATA = {"bitcoin": {"usd": 97000.5, "usd_24h_change": 1.5}}
+
+    def test_request_path_does_not_write_the_table(self):
+        with mock.patch.object(pricetable, "writer") as writer, \
+                mock.patch.object(pricetable, "reader", return_value=None):
+            self.assertEqual(prices._save({"bitcoin"}, self.DATA), {"bitcoin": Decimal("97000.5")})
+            writer.assert_not_called()
+            # ...and is served from the DB until the worker publishes it
+            self.assertEqual(store.get_prices(["bitcoin"], max_age=60), {"bitcoin": Decimal("97000.5")})
+
+            store.save_simple_prices(self.DATA, publish=True)
+            writer.return_value.upsert.assert_called_once()
+
+
+@override_settings(MARKET_CACHE_LIMITS={"default": 2})
+class CacheLimitTests(SimpleTestCase):
+    """ Keys cached without a group are capped like a group's """
+
+    def setUp(self):
+        for state in (cache._entries, cache._groups):
+            patcher = mock.patch.dict(state, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_ungrouped_keys_are_evicted(self):
+        cache.cached("a", lambda: 1, ttl=60)
+        cache.cached("b", lambda: 2, ttl=60)
+        cache.cached("a", lambda: 1, ttl=60)     # a hit: b is now the least used
+        cache.cached("c", lambda: 3, ttl=60)
+
+        self.assertEqual(sorted(cache._entries), ["a", "c"])
+        self.assertEqual(cache.cached("a", lambda: None, ttl=60), 1)
@@ -14,6 +14,10 @@ urlpatterns = [
     # MARKETS
     path("top100/", views.top_100),
     path("top8/", views.top8),
+    path("search/", views.search),
+    path("upstream-stats/", views.upstream_stats),
+
+    path("<str:coin_id>/chart/", views.market_chart),
 
     # MUST BE LAST – catches anything else as a coin_id
     path("<str:coin_id>/", views.market_detail),
@@ -1,121 +1,147 @@
 from decimal import Decimal
-from django.core.cache import cache
+from asgiref.sync import sync_to_async
+from adrf.decorators import api_view as async_api_view
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from core import upstream
+from wallet import services
 from .models import SpotWallet, SpotAsset
-import requests
-import os
+from . import catalog, history, payloads, store
+from .prices import aget_prices
 
-# ============= COINGECKO CONFIG =============
-API_KEY = os.getenv("COINGECKO_API_KEY")
-BASE = "https://api.coingecko.com/api/v3"
 
+# -------- helper --------
+def get_or_create_wallet(user):
+    wallet, _ = SpotWallet.objects.get_or_create(user=user)
+    return wallet
 
-def cg(endpoint, params=None):
-    """ Safe CoinGecko call """
-    headers = {"x-cg-demo-api-key": API_KEY}
-    url = f"{BASE}{endpoint}"
 
-    try:
-        r = requests.get(url, headers=headers, params=params, timeout=10)
-        r.raise_for_status()
-        return r.json()
-    except Exception as e:
-        print("❌ COINGECKO ERROR:", e)
+async def aget_or_create_wallet(user):
+    wallet, _ = await SpotWallet.objects.aget_or_create(user=user)
+    return wallet
+
+
+alookup = sync_to_async(catalog.lookup)
+aconvert = sync_to_async(services.convert)
+
+
+def unknown_coin():
+    """ Ids missing from the coin catalog get this, never an upstream call """
+    return JsonResponse({"error": "Unknown coin"}, status=404)
+
+
+def parse_sparkline(value):
+    if value is None or value.lower() in ("true", "full"):
         return None
+    if value.lower() == "false":
+        return 0
+    if value.isdigit() and int(value) in settings.MARKET_SPARKLINE_POINTS:
+        return int(value)
+    raise ValueError(
+        "sparkline must be one of: "
+        + ", ".join(map(str, settings.MARKET_SPARKLINE_POINTS)) + ", full"
+    )
 
 
-# -------- helper --------
-def get_or_create_wallet(user):
-    wallet, _ = SpotWallet.objects.get_or_create(user=user)
-    return wallet
+def parse_fields(value):
+    """ Sorted, de-duplicated field list, or None for every field """
+    if not value:
+        return None
+    fields = sorted({f.strip() for f in value.split(",") if f.strip()})
+    unknown = [f for f in fields if f not in settings.TOP100_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return fields or None
 
 
 # ===================== MARKETS =====================
+# All market data comes from the local store filled by
+# `manage.py ingest_markets`. Only prices the store is missing are
+# fetched, batched across requests (see prices.get_prices).
+
+# Payloads are pre-encoded when the worker writes them, so these are
+# plain Django views that send stored bytes (with ETag / 304, gzip, br).
+EMPTY_LIST = payloads.encode([])
+
 
 # TOP 100
-@api_view(["GET"])
+#   ?sparkline=<points>  one of MARKET_SPARKLINE_POINTS (0 / false = none),
+#                        omitted = the full 7d hourly line
+#   ?fields=id,symbol,…  only these fields (from TOP100_FIELDS)
+@require_GET
 def top_100(request):
-    cached = cache.get("top100_cache")
-    if cached:
-        return Response(cached)
-
-    data = cg(
-        "/coins/markets",
-        params={
-            "vs_currency": "usd",
-            "order": "market_cap_desc",
-            "per_page": 100,
-            "page": 1,
-            "sparkline": "true",
-            "price_change_percentage": "24h",
-        },
-    )
+    try:
+        points = parse_sparkline(request.GET.get("sparkline"))
+        fields = parse_fields(request.GET.get("fields"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
-    cache.set("top100_cache", data, timeout=60)
-    return Response(data)
+    return payloads.respond(
+        request, store.get_top100_encoded(points, fields) or EMPTY_LIST
+    )
 
 
 # TOP 8 for homepage
-@api_view(["GET"])
+@require_GET
 def top8(request):
-    cached = cache.get("top8_cache")
-    if cached:
-        return Response(cached)
-
-    data = cg(
-        "/coins/markets",
-        params={
-            "vs_currency": "usd",
-            "ids": (
-                "bitcoin,ethereum,solana,ripple,cardano,"
-                "binancecoin,polkadot,matic-network"
-            ),
-            "sparkline": "false",
-        },
-    )
+    return payloads.respond(request, store.get_encoded(store.TOP8) or EMPTY_LIST)
+
+
+# COIN SEARCH  ?q=<prefix or approximate name>&limit=10
+@require_GET
+def search(request):
+    try:
+        limit = min(int(request.GET.get("limit", 10)), 50)
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit"}, status=400)
 
-    cache.set("top8_cache", data, timeout=45)
-    return Response(data)
+    return JsonResponse(catalog.search(request.GET.get("q", ""), limit), safe=False)
 
 
 # COIN DETAIL
-@api_view(["GET"])
+@require_GET
 def market_detail(request, coin_id):
-    cache_key = f"coin_detail_{coin_id}"
-    cached = cache.get(cache_key)
-    if cached:
-        return Response(cached)
-
-    info = cg(
-        f"/coins/{coin_id}",
-        params={
-            "localization": "false",
-            "market_data": "true",
-            "sparkline": "true",
-        },
-    )
+    if not catalog.lookup(coin_id):
+        return unknown_coin()
+    return payloads.respond(request, store.get_detail_encoded(coin_id))
+
+
+# COIN PRICE HISTORY  ?range=1d|7d|30d|1y|max
+@require_GET
+def market_chart(request, coin_id):
+    range = request.GET.get("range", "7d")
+    if range not in history.RANGES:
+        return JsonResponse(
+            {"error": f"range must be one of: {', '.join(history.RANGES)}"},
+            status=400,
+        )
+    if not catalog.lookup(coin_id):
+        return unknown_coin()
+    return payloads.respond(request, store.get_chart_encoded(coin_id, range))
 
-    chart = cg(
-        f"/coins/{coin_id}/market_chart",
-        params={"vs_currency": "usd", "days": 7},
-    )
 
-    payload = {"info": info, "chart": chart}
-    cache.set(cache_key, payload, timeout=60)
-    return Response(payload)
+# UPSTREAM CLIENT COUNTERS (this worker)
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def upstream_stats(request):
+    return Response(upstream.stats())
 
 
 # ===================== SPOT WALLET =====================
+# Views that may wait on upstream prices are async (served by the ASGI
+# worker), so one worker can hold many of those waits at once.
 
-@api_view(["GET"])
+@async_api_view(["GET"])
 @permission_classes([IsAuthenticated])
-def spot_wallet(request):
-    wallet = get_or_create_wallet(request.user)
-    assets = SpotAsset.objects.filter(user=request.user)
+async def spot_wallet(request):
+    wallet = await aget_or_create_wallet(request.user)
+    assets = [a async for a in SpotAsset.objects.filter(user=request.user)]
 
-    if not assets.exists():
+    if not assets:
         return Response(
             {
                 "balance": str(wallet.balance),
@@ -124,18 +150,7 @@ def spot_wallet(request):
             }
         )
 
-    coin_ids = ",".join(a.coin_id for a in assets)
-
-    market_data = cg(
-        "/coins/markets",
-        params={"vs_currency": "usd", "ids": coin_ids},
-    ) or []
-
-    price_map = {
-        c["id"]: Decimal(str(c["current_price"]))
-        for c in market_data
-        if "id" in c and "current_price" in c
-    }
+    price_map = await aget_prices(a.coin_id for a in assets)
 
     total_value = Decimal("0")
     asset_list = []
@@ -170,21 +185,20 @@ def spot_wallet(request):
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def deposit(request):
-    wallet = get_or_create_wallet(request.user)
+    get_or_create_wallet(request.user)
 
     try:
         amt = Decimal(request.data.get("amount"))
     except Exception:
         return Response({"error": "Invalid amount"}, status=400)
 
-    if amt <= 0:
+    if not amt.is_finite() or amt <= 0:
         return Response({"error": "Amount must be positive"}, status=400)
 
-    wallet.balance += amt
-    wallet.save()
+    balance = services.deposit(request.user.id, amt)
 
     return Response(
-        {"message": "Deposit successful", "balance": str(wallet.balance)}
+        {"message": "Deposit successful", "balance": str(balance)}
     )
 
 
@@ -193,24 +207,22 @@ def deposit(request):
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def withdraw(request):
-    wallet = get_or_create_wallet(request.user)
+    get_or_create_wallet(request.user)
 
     try:
         amt = Decimal(request.data.get("amount"))
     except Exception:
         return Response({"error": "Invalid amount"}, status=400)
 
-    if amt <= 0:
+    if not amt.is_finite() or amt <= 0:
         return Response({"error": "Amount must be positive"}, status=400)
 
-    if amt > wallet.balance:
+    balance = services.withdraw(request.user.id, amt)
+    if balance is None:
         return Response({"error": "Insufficient balance"}, status=400)
 
-    wallet.balance -= amt
-    wallet.save()
-
     return Response(
-        {"message": "Withdraw successful", "balance": str(wallet.balance)}
+        {"message": "Withdraw successful", "balance": str(balance)}
     )
 
 
@@ -219,7 +231,7 @@ def withdraw(request):
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def buy(request):
-    wallet = get_or_create_wallet(request.user)
+    get_or_create_wallet(request.user)
 
     coin_id = request.data.get("coin_id")
     symbol = request.data.get("symbol")
@@ -235,29 +247,15 @@ def buy(request):
     except Exception:
         return Response({"error": "Invalid numbers"}, status=400)
 
-    if amount_usd <= 0:
+    if not (amount_usd.is_finite() and price.is_finite()) or amount_usd <= 0 or price <= 0:
         return Response({"error": "Amount must be positive"}, status=400)
 
-    if wallet.balance < amount_usd:
+    # debit + asset row in one guarded transaction (wallet/services.py)
+    balance = services.buy(request.user.id, coin_id, symbol, amount_usd, price)
+    if balance is None:
         return Response({"error": "Insufficient balance"}, status=400)
 
-    qty = amount_usd / price
-    wallet.balance -= amount_usd
-    wallet.save()
-
-    asset, _ = SpotAsset.objects.get_or_create(
-        user=request.user, coin_id=coin_id, defaults={"symbol": symbol}
-    )
-
-    total_before = asset.amount * asset.avg_price
-    total_after = total_before + amount_usd
-    new_qty = asset.amount + qty
-
-    asset.avg_price = total_after / new_qty
-    asset.amount = new_qty
-    asset.save()
-
-    return Response({"message": "Buy successful"})
+    return Response({"message": "Buy successful", "balance": str(balance)})
 
 
 # ===================== SELL =====================
@@ -265,7 +263,7 @@ def buy(request):
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def sell(request):
-    wallet = get_or_create_wallet(request.user)
+    get_or_create_wallet(request.user)
 
     coin_id = request.data.get("coin_id")
     amount = request.data.get("amount")
@@ -280,35 +278,25 @@ def sell(request):
     except Exception:
         return Response({"error": "Invalid numbers"}, status=400)
 
-    if amount <= 0:
+    if not (amount.is_finite() and price.is_finite()) or amount <= 0 or price < 0:
         return Response({"error": "Amount must be positive"}, status=400)
 
-    asset = SpotAsset.objects.filter(user=request.user, coin_id=coin_id).first()
-    if not asset:
+    if not SpotAsset.objects.filter(user=request.user, coin_id=coin_id).exists():
         return Response({"error": "No such asset"}, status=400)
 
-    if amount > asset.amount:
+    sold = services.sell(request.user.id, coin_id, amount, price)
+    if sold is None:
         return Response({"error": "Not enough coins"}, status=400)
 
-    usd_value = amount * price
-    asset.amount -= amount
-
-    if asset.amount <= 0:
-        asset.delete()
-    else:
-        asset.save()
-
-    wallet.balance += usd_value
-    wallet.save()
-
-    return Response({"message": "Sell successful", "returned": str(usd_value)})
+    usd_value, balance = sold
+    return Response({"message": "Sell successful", "returned": str(usd_value), "balance": str(balance)})
 
 
 # ===================== CONVERT PREVIEW =====================
 
-@api_view(["GET"])
+@async_api_view(["GET"])
 @permission_classes([IsAuthenticated])
-def convert_preview(request):
+async def convert_preview(request):
     from_id = request.query_params.get("from")
     to_id = request.query_params.get("to")
     amount = request.query_params.get("amount")
@@ -321,24 +309,25 @@ def convert_preview(request):
     except Exception:
         return Response({"error": "Invalid amount"}, status=400)
 
-    prices = cg(
-        "/simple/price",
-        params={"ids": f"{from_id},{to_id}", "vs_currencies": "usd"},
-    )
+    to_coin = await alookup(to_id)
+    if not to_coin or not await alookup(from_id):
+        return Response({"error": "Unknown coin"}, status=400)
+
+    prices = await aget_prices([from_id, to_id])
 
-    if not prices or from_id not in prices or to_id not in prices:
+    if from_id not in prices or to_id not in prices:
         return Response({"error": "Price data unavailable"}, status=400)
 
-    p_from = Decimal(str(prices[from_id]["usd"]))
-    p_to = Decimal(str(prices[to_id]["usd"]))
+    p_from = prices[from_id]
+    p_to = prices[to_id]
 
     usd_value = amount * p_from
     to_amount = usd_value / p_to
 
-    to_asset = SpotAsset.objects.filter(
+    to_asset = await SpotAsset.objects.filter(
         user=request.user, coin_id=to_id
-    ).first()
-    to_symbol = to_asset.symbol if to_asset else to_id
+    ).afirst()
+    to_symbol = to_asset.symbol if to_asset else to_coin["symbol"]
 
     return Response(
         {
@@ -353,10 +342,10 @@ def convert_preview(request):
 
 # ===================== CONVERT =====================
 
-@api_view(["POST"])
+@async_api_view(["POST"])
 @permission_classes([IsAuthenticated])
-def convert(request):
-    wallet = get_or_create_wallet(request.user)
+async def convert(request):
+    await aget_or_create_wallet(request.user)
 
     from_id = request.data.get("from_coin") or request.data.get("from_id")
     to_id = request.data.get("to_coin") or request.data.get("to_id")
@@ -370,52 +359,33 @@ def convert(request):
     except Exception:
         return Response({"error": "Invalid amount"}, status=400)
 
-    if amount <= 0:
+    if not amount.is_finite() or amount <= 0:
         return Response({"error": "Amount must be positive"}, status=400)
 
-    from_asset = SpotAsset.objects.filter(
+    from_asset = await SpotAsset.objects.filter(
         user=request.user, coin_id=from_id
-    ).first()
+    ).afirst()
     if not from_asset:
         return Response({"error": "You don't own this coin"}, status=400)
 
     if amount > from_asset.amount:
         return Response({"error": "Not enough balance to convert"}, status=400)
 
-    prices = cg(
-        "/simple/price",
-        params={"ids": f"{from_id},{to_id}", "vs_currencies": "usd"},
-    )
+    to_coin = await alookup(to_id)
+    if not to_coin:
+        return Response({"error": "Unknown coin"}, status=400)
 
-    if not prices or from_id not in prices or to_id not in prices:
-        return Response({"error": "Price data unavailable"}, status=400)
+    prices = await aget_prices([from_id, to_id])
 
-    p_from = Decimal(str(prices[from_id]["usd"]))
-    p_to = Decimal(str(prices[to_id]["usd"]))
+    if from_id not in prices or to_id not in prices:
+        return Response({"error": "Price data unavailable"}, status=400)
 
-    usd_value = amount * p_from
-    qty_to_receive = usd_value / p_to
-
-    # Deduct from old asset
-    from_asset.amount -= amount
-    if from_asset.amount <= 0:
-        from_asset.delete()
-    else:
-        from_asset.save()
-
-    # Add to new asset
-    to_asset, _ = SpotAsset.objects.get_or_create(
-        user=request.user,
-        coin_id=to_id,
-        defaults={"symbol": to_id[:5].upper()},
+    # take + add in one guarded transaction (wallet/services.py); the
+    # balance checked above may have been spent meanwhile
+    received = await aconvert(
+        request.user.id, from_id, to_id, to_coin["symbol"], amount, prices[from_id], prices[to_id]
     )
+    if received is None:
+        return Response({"error": "Not enough balance to convert"}, status=400)
 
-    total_before = to_asset.amount * to_asset.avg_price
-    total_after = total_before + usd_value
-    new_qty = to_asset.amount + qty_to_receive
-
-    to_asset.avg_price = total_after / new_qty if new_qty > 0 else p_to
-    to_asset.amount = new_qty
-    to_asset.save()
-
-    return Response({"message": "Conversion successful"})
\ No newline at end of file
+    return Response({"message": "Conversion successful", "received": str(received)})
\ No newline at end of file
@@ -0,0 +1,195 @@
+# wallet/ledger.py
+#
+# Append-only record of every balance movement. The wallet services
+# (wallet/services.py) and futures.settlement add LedgerEntry rows in the
+# same transaction as the UPDATE that moves the money, one bulk INSERT
+# per operation / batch. Nothing is ever updated or deleted.
+#
+# Accounts: "spot" and "futures" (USD wallets), "coin:<coin_id>" (spot
+# assets). Reads:
+#
+#   balance()   LedgerSnapshot + the entries after it: O(1), the snapshot
+#               is rolled forward every few seconds by checkpoint()
+#               (`manage.py ledger_checkpoint`)
+#   history()   newest first, keyset pagination on id over the
+#               (user, account, id) index: every page is one index range
+#
+# The wallet rows keep the live balances the trades check against; the
+# ledger explains them (`ledger_checkpoint --verify` compares both).
+# SQLite adds DECIMAL columns as floats, so every sum is rounded back to
+# the precision of its account's column (rounded()).
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .models import LedgerEntry, LedgerSnapshot
+
+SPOT = "spot"
+FUTURES = "futures"
+
+# wallet model -> account
+ACCOUNTS = {
+    "markets.SpotWallet": SPOT,
+    "futures.FuturesWallet": FUTURES,
+}
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def coin(coin_id):
+    return f"coin:{coin_id}"
+
+
+def account(model):
+    return ACCOUNTS[model._meta.label]
+
+
+def places(account):
+    """ Decimal places an account is kept to: its wallet balance / asset amount column """
+    if account.startswith("coin:"):
+        return apps.get_model("markets.SpotAsset")._meta.get_field("amount").decimal_places
+    label = next(label for label, name in ACCOUNTS.items() if name == account)
+    return apps.get_model(label)._meta.get_field("balance").decimal_places
+
+
+def rounded(account, amount):
+    """ A sum of the account's entries, at its precision """
+    return Decimal(amount).quantize(Decimal(1).scaleb(-places(account)))
+
+
+def entry(user_id, account, kind, amount, reference=""):
+    return LedgerEntry(user_id=user_id, account=account, kind=kind, amount=amount, reference=reference)
+
+
+def record(entries):
+    """ Append entries in one INSERT; call inside the transaction that moved the money """
+    entries = list(entries)
+    if entries:
+        LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+# ===================== READS =====================
+
+def balance(user_id, account):
+    """ Balance of one account: snapshot + entries since """
+    snapshot = (
+        LedgerSnapshot.objects.filter(user_id=user_id, account=account)
+        .values_list("balance", "entry_id")
+        .first()
+    ) or (Decimal("0"), 0)
+    since = LedgerEntry.objects.filter(user_id=user_id, account=account, id__gt=snapshot[1]).aggregate(
+        total=Sum("amount")
+    )["total"]
+    return rounded(account, snapshot[0] + (since or 0))
+
+
+def balances(user_id):
+    """ {account: balance} of every account the user has moved money in """
+    snapshots = dict(
+        LedgerSnapshot.objects.filter(user_id=user_id).values_list("account", "entry_id")
+    )
+    result = dict(
+        LedgerSnapshot.objects.filter(user_id=user_id).values_list("account", "balance")
+    )
+
+    # entries after each account's own snapshot
+    after = ~Q(account__in=list(snapshots))
+    for name, entry_id in snapshots.items():
+        after |= Q(account=name, id__gt=entry_id)
+    tail = (
+        LedgerEntry.objects.filter(after, user_id=user_id)
+        .values("account")
+        .annotate(total=Sum("amount"))
+        .values_list("account", "total")
+    )
+    for name, total in tail:
+        result[name] = result.get(name, 0) + total
+    return {name: rounded(name, total) for name, total in result.items()}
+
+
+def history(user_id, account, before=None, limit=PAGE_SIZE):
+    """ (entries newest first, cursor of the next page or None); before: a cursor from the previous page """
+    entries = LedgerEntry.objects.filter(user_id=user_id, account=account)
+    if before is not None:
+        entries = entries.filter(id__lt=before)
+
+    page = list(entries.order_by("-id")[:limit + 1])
+    if len(page) > limit:
+        page = page[:limit]
+        return page, page[-1].id
+    return page, None
+
+
+# ===================== SNAPSHOTS =====================
+
+def checkpoint(batch=100_000):
+    """
+    Roll the snapshots forward over the entries written since the last
+    run, batch entries at a time. Entries younger than LEDGER_CHECKPOINT_LAG
+    are left for the next run, so one whose transaction committed after
+    a newer id can't be skipped. Run from a single process. Returns the
+    number of entries folded in.
+    """
+    horizon = (
+        LedgerEntry.objects.filter(
+            created_at__lt=timezone.now() - timedelta(seconds=settings.LEDGER_CHECKPOINT_LAG)
+        )
+        .order_by("-id")
+        .values_list("id", flat=True)
+        .first()
+    )
+    if horizon is None:
+        return 0
+
+    done = 0
+    start = LedgerSnapshot.objects.aggregate(last=Max("entry_id"))["last"] or 0
+    while start < horizon:
+        end = min(start + batch, horizon)
+        done += _fold(start, end)
+        start = end
+    return done
+
+
+# -------- helper --------
+def _fold(start, end):
+    """ Add the entries start < id <= end to the snapshots, in one transaction """
+    now = timezone.now()
+    with transaction.atomic():
+        moved = {
+            (row["user_id"], row["account"]): row
+            for row in LedgerEntry.objects.filter(id__gt=start, id__lte=end)
+            .values("user_id", "account")
+            .annotate(total=Sum("amount"), last=Max("id"), count=Count("id"))
+        }
+        if not moved:
+            return 0
+
+        existing = {
+            (s.user_id, s.account): s
+            for s in LedgerSnapshot.objects.filter(
+                user_id__in={user_id for user_id, _ in moved}, account__in={name for _, name in moved}
+            )
+        }
+        created, updated = [], []
+        for key, row in moved.items():
+            snapshot = existing.get(key)
+            if snapshot is None:
+                created.append(LedgerSnapshot(
+                    user_id=key[0], account=key[1], balance=rounded(key[1], row["total"]), entry_id=row["last"]
+                ))
+            else:
+                snapshot.balance = rounded(key[1], snapshot.balance + row["total"])
+                snapshot.entry_id = row["last"]
+                snapshot.updated_at = now
+                updated.append(snapshot)
+
+        LedgerSnapshot.objects.bulk_create(created, batch_size=1000)
+        LedgerSnapshot.objects.bulk_update(updated, ["balance", "entry_id", "updated_at"], batch_size=1000)
+    return sum(row["count"] for row in moved.values())
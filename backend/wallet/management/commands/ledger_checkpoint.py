@@ -0,0 +1,86 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Sum
+
+from futures.models import FuturesWallet
+from markets.models import SpotAsset, SpotWallet
+from wallet import ledger
+from wallet.models import LedgerEntry, LedgerSnapshot
+
+
+class Command(BaseCommand):
+    help = "Periodically roll the wallet ledger snapshots forward (wallet/ledger.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.LEDGER_CHECKPOINT_INTERVAL,
+            help="Seconds between checkpoints",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Run a single checkpoint and exit",
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Checkpoint once, then compare every ledger balance with the wallet rows "
+                 "(run while no trades are settling)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+
+            try:
+                folded = ledger.checkpoint()
+                if folded:
+                    print(f"✅ LEDGER: {folded} entries folded into the snapshots")
+            except Exception as e:
+                print("❌ LEDGER CHECKPOINT ERROR:", e)
+
+            if options["verify"]:
+                return self.verify()
+            if options["once"]:
+                return
+
+            elapsed = time.monotonic() - started
+            time.sleep(max(0.0, options["interval"] - elapsed))
+
+    def verify(self):
+        # snapshots + everything after the newest one: no full scan of the ledger
+        balances = {
+            (user_id, account): balance
+            for user_id, account, balance in LedgerSnapshot.objects.values_list("user_id", "account", "balance")
+        }
+        watermark = LedgerSnapshot.objects.aggregate(last=Max("entry_id"))["last"] or 0
+        tail = (
+            LedgerEntry.objects.filter(id__gt=watermark)
+            .values("user_id", "account")
+            .annotate(total=Sum("amount"))
+            .values_list("user_id", "account", "total")
+        )
+        for user_id, account, total in tail:
+            balances[user_id, account] = ledger.rounded(account, balances.get((user_id, account), 0) + total)
+
+        held = {}
+        for model in (SpotWallet, FuturesWallet):
+            for user_id, balance in model.objects.values_list("user_id", "balance"):
+                held[user_id, ledger.account(model)] = balance
+        for user_id, coin_id, amount in SpotAsset.objects.values_list("user_id", "coin_id", "amount"):
+            held[user_id, ledger.coin(coin_id)] = amount
+
+        mismatches = [
+            (key, held.get(key, 0), balances.get(key, 0))
+            for key in held.keys() | balances.keys()
+            if held.get(key, 0) != balances.get(key, 0)
+        ]
+        for (user_id, account), wallet, booked in sorted(mismatches)[:50]:
+            print(f"❌ user {user_id} {account}: wallet {wallet}, ledger {booked}")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} of {len(held)} balances differ from the ledger")
+        print(f"✅ {len(held)} balances match the ledger")
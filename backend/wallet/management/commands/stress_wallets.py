@@ -0,0 +1,219 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from futures import settlement
+from futures.models import FuturesPosition, FuturesWallet, LimitOrder
+from markets.models import SpotAsset, SpotWallet
+from wallet import ledger, services
+from wallet.models import LedgerEntry
+
+START = Decimal("1000")
+PRICE = Decimal("2")
+STEP = Decimal("10")
+
+
+# ===================== OLD WAY (--naive) =====================
+# read / modify / save(), as the views did before wallet/services.py
+
+def naive_debit(model, user_id, amount):
+    wallet = model.objects.get(user_id=user_id)
+    if wallet.balance < amount:
+        return None
+    wallet.balance -= amount
+    wallet.save()
+    return wallet.balance
+
+
+def naive_credit(model, user_id, amount):
+    wallet = model.objects.get(user_id=user_id)
+    wallet.balance += amount
+    wallet.save()
+    return wallet.balance
+
+
+def naive_buy(user_id, coin_id, symbol, amount_usd, price):
+    if naive_debit(SpotWallet, user_id, amount_usd) is None:
+        return None
+    asset, _ = SpotAsset.objects.get_or_create(user_id=user_id, coin_id=coin_id, defaults={"symbol": symbol})
+    asset.amount += amount_usd / price
+    asset.save()
+    return True
+
+
+def naive_sell(user_id, coin_id, amount, price):
+    asset = SpotAsset.objects.filter(user_id=user_id, coin_id=coin_id).first()
+    if asset is None or asset.amount < amount:
+        return None
+    asset.amount -= amount
+    asset.save()
+    return naive_credit(SpotWallet, user_id, amount * price)
+
+
+# ===================== WORKLOAD =====================
+
+def trade(user_id, seed, naive):
+    """
+    One random operation on one user. Returns (kind, succeeded). At a
+    fixed PRICE, buy / sell / convert keep spot value (balance + coins *
+    PRICE) unchanged, deposit / withdraw move it by STEP; futures
+    operations only move money between the wallet, open orders and
+    position margin.
+    """
+    rnd = random.Random(seed)
+    kind = rnd.choice(["buy", "sell", "convert", "deposit", "withdraw", "order", "cancel", "open"])
+
+    if naive:
+        ops = {
+            "buy": lambda: naive_buy(user_id, "coin-a", "A", STEP, PRICE),
+            "sell": lambda: naive_sell(user_id, "coin-a", STEP / PRICE, PRICE),
+            "deposit": lambda: naive_credit(SpotWallet, user_id, STEP),
+            "withdraw": lambda: naive_debit(SpotWallet, user_id, STEP),
+        }
+        kind = rnd.choice(list(ops))
+        return kind, ops[kind]() is not None
+
+    if kind == "buy":
+        ok = services.buy(user_id, rnd.choice(["coin-a", "coin-b"]), "X", STEP, PRICE) is not None
+    elif kind == "sell":
+        ok = services.sell(user_id, rnd.choice(["coin-a", "coin-b"]), STEP / PRICE, PRICE) is not None
+    elif kind == "convert":
+        ok = services.convert(user_id, "coin-a", "coin-b", "B", STEP / PRICE, PRICE, PRICE) is not None
+    elif kind == "deposit":
+        ok = services.deposit(user_id, STEP) is not None
+    elif kind == "withdraw":
+        ok = services.withdraw(user_id, STEP) is not None
+    elif kind == "order":
+        ok = settlement.place_order(
+            user_id, symbol="BTCUSDT", side=FuturesPosition.LONG, price=PRICE, margin=STEP, leverage=5
+        ) is not None
+    elif kind == "cancel":
+        order_id = (
+            LimitOrder.objects.filter(user_id=user_id, status=LimitOrder.OPEN)
+            .values_list("id", flat=True).first()
+        )
+        ok = order_id is not None and settlement.cancel_order(order_id, user_id)
+    else:
+        ok = settlement.open_position(
+            user_id, symbol="BTCUSDT", side=FuturesPosition.LONG, entry_price=PRICE, amount=STEP * 5 / PRICE,
+            leverage=5, initial_margin=STEP, liquidation_price=PRICE * 4 / 5,
+        ) is not None
+    return kind, ok
+
+
+class Command(BaseCommand):
+    help = "Many parallel trades per user against the wallet services; checks no money is lost or created"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--trades", type=int, default=300, help="Operations per user")
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument(
+            "--naive", action="store_true",
+            help="Run the old read / modify / save() spot code instead, to show the lost updates",
+        )
+
+    def handle(self, *args, **options):
+        self.naive = options["naive"]
+        users = self.setup(options["users"])
+        jobs = [(u, i) for i in range(options["trades"]) for u in users]
+        random.Random(1).shuffle(jobs)
+
+        def run(job):
+            try:
+                return trade(job[0], hash(job), options["naive"])
+            except Exception as e:
+                return f"error: {type(e).__name__}: {e}", False
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options["threads"]) as pool:
+            results = list(pool.map(run, jobs))
+        elapsed = time.perf_counter() - started
+
+        counts = {}
+        for (user_id, _), (kind, ok) in zip(jobs, results):
+            counts.setdefault(kind, [0, 0])[0 if ok else 1] += 1
+        print(f"{len(jobs):,} operations, {options['threads']} threads, {len(users)} users: "
+              f"{elapsed:.1f} s ({len(jobs) / elapsed:,.0f} ops/s)")
+        for kind, (ok, refused) in sorted(counts.items()):
+            print(f"  {kind:40} {ok:6} done {refused:6} refused")
+
+        deposits = self.successes(jobs, results, "deposit")
+        withdraws = self.successes(jobs, results, "withdraw")
+        try:
+            failures = self.verify(users, deposits, withdraws)
+        finally:
+            User.objects.filter(id__in=users).delete()
+
+        if failures:
+            for line in failures[:20]:
+                print("❌", line)
+            raise CommandError(f"{len(failures)} balance mismatches")
+        print("✅ every balance adds up")
+
+    def setup(self, n):
+        with transaction.atomic():
+            # bulk_create: no post_save signals, the wallets are made below
+            users = User.objects.bulk_create(
+                [User(username=f"stress-wallets-{time.time_ns()}-{i}") for i in range(n)]
+            )
+            SpotWallet.objects.bulk_create([SpotWallet(user=u, balance=START) for u in users])
+            FuturesWallet.objects.bulk_create([FuturesWallet(user=u, balance=START) for u in users])
+            ledger.record(
+                ledger.entry(u.id, account, LedgerEntry.OPENING, START)
+                for u in users
+                for account in (ledger.SPOT, ledger.FUTURES)
+            )
+        return [u.id for u in users]
+
+    def successes(self, jobs, results, kind):
+        done = {}
+        for (user_id, _), (k, ok) in zip(jobs, results):
+            if k == kind and ok:
+                done[user_id] = done.get(user_id, 0) + 1
+        return done
+
+    def verify(self, users, deposits, withdraws):
+        """ Spot value and futures money per user against what the successful operations imply """
+        failures = []
+        for user_id in users:
+            balance = SpotWallet.objects.get(user_id=user_id).balance
+            coins = SpotAsset.objects.filter(user_id=user_id).aggregate(s=Sum("amount"))["s"] or 0
+            expected = START + STEP * (deposits.get(user_id, 0) - withdraws.get(user_id, 0))
+            value = balance + coins * PRICE
+            if balance < 0 or abs(value - expected) > Decimal("1e-6"):
+                failures.append(f"user {user_id} spot: balance {balance} + coins {coins} = {value}, expected {expected}")
+
+            futures = FuturesWallet.objects.get(user_id=user_id).balance
+            reserved = LimitOrder.objects.filter(user_id=user_id, status=LimitOrder.OPEN).aggregate(
+                s=Sum("margin")
+            )["s"] or 0
+            margin = FuturesPosition.objects.filter(user_id=user_id).aggregate(s=Sum("initial_margin"))["s"] or 0
+            if futures < 0 or futures + reserved + margin != START:
+                failures.append(
+                    f"user {user_id} futures: {futures} + orders {reserved} + positions {margin} != {START}"
+                )
+
+            # every movement above is in the ledger too
+            if self.naive:
+                continue
+            books = ledger.balances(user_id)
+            held = {ledger.SPOT: balance, ledger.FUTURES: futures}
+            held.update(
+                (ledger.coin(coin_id), amount)
+                for coin_id, amount in SpotAsset.objects.filter(user_id=user_id).values_list("coin_id", "amount")
+            )
+            for account in held.keys() | books.keys():
+                if abs(held.get(account, 0) - books.get(account, 0)) > Decimal("1e-6"):
+                    failures.append(
+                        f"user {user_id} {account}: wallet {held.get(account, 0)}, ledger {books.get(account, 0)}"
+                    )
+        return failures
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def opening_balances(apps, schema_editor):
+    """ One OPENING entry per non-zero balance held before the ledger existed """
+    LedgerEntry = apps.get_model("wallet", "LedgerEntry")
+    wallets = [("markets", "SpotWallet", "spot"), ("futures", "FuturesWallet", "futures")]
+    entries = [
+        LedgerEntry(user_id=user_id, account=account, kind="OPENING", amount=amount)
+        for app, model, account in wallets
+        for user_id, amount in apps.get_model(app, model).objects.values_list("user_id", "balance")
+        if amount
+    ]
+    entries += [
+        LedgerEntry(user_id=user_id, account=f"coin:{coin_id}", kind="OPENING", amount=amount)
+        for user_id, coin_id, amount in apps.get_model("markets", "SpotAsset").objects.values_list(
+            "user_id", "coin_id", "amount"
+        )
+        if amount
+    ]
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0001_initial'),
+        ('markets', '0006_coin'),
+        ('futures', '0004_limitorder'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(max_length=60)),
+                ('kind', models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAW', 'Withdraw'), ('BUY', 'Buy'), ('SELL', 'Sell'), ('CONVERT', 'Convert'), ('MARGIN', 'Margin'), ('REFUND', 'Refund'), ('SETTLE', 'Settle'), ('OPENING', 'Opening balance')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=10, max_digits=30)),
+                ('reference', models.CharField(blank=True, max_length=60)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'account', 'id'], name='wallet_ledg_user_id_54f24f_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account', models.CharField(max_length=60)),
+                ('balance', models.DecimalField(decimal_places=10, default=0, max_digits=30)),
+                ('entry_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'account')},
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
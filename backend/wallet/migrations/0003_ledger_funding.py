@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0002_ledger'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='kind',
+            field=models.CharField(choices=[('DEPOSIT', 'Deposit'), ('WITHDRAW', 'Withdraw'), ('BUY', 'Buy'), ('SELL', 'Sell'), ('CONVERT', 'Convert'), ('MARGIN', 'Margin'), ('REFUND', 'Refund'), ('SETTLE', 'Settle'), ('FUNDING', 'Funding'), ('OPENING', 'Opening balance')], max_length=10),
+        ),
+    ]
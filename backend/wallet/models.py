@@ -17,4 +17,70 @@ class UserAsset(models.Model):
     amount = models.DecimalField(max_digits=20, decimal_places=8, default=0)
 
     def __str__(self):
-        return f"{self.user.username} – {self.asset.symbol}: {self.amount}"
\ No newline at end of file
+        return f"{self.user.username} – {self.asset.symbol}: {self.amount}"
+
+class LedgerEntry(models.Model):
+    """
+    One balance movement, append-only (see wallet/ledger.py). account is
+    "spot" / "futures" for the USD wallets, "coin:<coin_id>" for a spot
+    asset; amount is signed.
+    """
+
+    DEPOSIT = "DEPOSIT"
+    WITHDRAW = "WITHDRAW"
+    BUY = "BUY"
+    SELL = "SELL"
+    CONVERT = "CONVERT"
+    MARGIN = "MARGIN"          # margin taken by a position / limit order
+    REFUND = "REFUND"          # margin of a cancelled order back
+    SETTLE = "SETTLE"          # margin + PnL of a closed position back
+    FUNDING = "FUNDING"        # funding paid / received by open positions
+    LIQUIDATE = "LIQUIDATE"    # margin + PnL of a liquidated cross-margin position back
+    OPENING = "OPENING"        # balance a wallet was created with / held before the ledger existed
+
+    KIND_CHOICES = [
+        (DEPOSIT, "Deposit"),
+        (WITHDRAW, "Withdraw"),
+        (BUY, "Buy"),
+        (SELL, "Sell"),
+        (CONVERT, "Convert"),
+        (MARGIN, "Margin"),
+        (REFUND, "Refund"),
+        (SETTLE, "Settle"),
+        (FUNDING, "Funding"),
+        (LIQUIDATE, "Cross liquidation"),
+        (OPENING, "Opening balance"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    account = models.CharField(max_length=60)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=30, decimal_places=10)
+    # what caused it: "position:12", "order:5", or the other account of a trade
+    reference = models.CharField(max_length=60, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # history pages (keyset on id) and balances since a snapshot
+            models.Index(fields=["user", "account", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.account} {self.kind} {self.amount}"
+
+
+class LedgerSnapshot(models.Model):
+    """ Balance of one account up to entry_id included, rolled forward by ledger.checkpoint() """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    account = models.CharField(max_length=60)
+    balance = models.DecimalField(max_digits=30, decimal_places=10, default=0)
+    entry_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("user", "account")
+
+    def __str__(self):
+        return f"{self.user_id} {self.account} {self.balance} @ {self.entry_id}"
@@ -0,0 +1,151 @@
+# wallet/services.py
+#
+# Balance and asset changes of the spot and futures wallets, each one a
+# guarded UPDATE instead of read / modify / save():
+#
+#   UPDATE ... SET balance = balance - x WHERE user_id = ... AND balance >= x
+#
+# The check and the change happen in the same statement, so concurrent
+# requests of one user can't both spend the same funds and no update is
+# lost. Everything one trade touches (wallet + asset rows) is done in one
+# short transaction that starts with the write, so the row lock is taken
+# first and held only for a few statements.
+#
+# Functions return the new balance, or None when the funds are not there
+# (nothing is changed then). Every movement is also appended to the
+# ledger (wallet/ledger.py) in the same transaction, rounded like the
+# wallet column (quantize()) so the two always agree.
+
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from markets.models import SpotAsset, SpotWallet
+
+from . import ledger
+from .models import LedgerEntry
+
+
+def credit(model, user_id, amount, kind=None, reference=""):
+    """
+    balance += amount on the user's wallet (SpotWallet / FuturesWallet);
+    None if there is no wallet. Without kind the caller writes the
+    ledger entry itself (e.g. once it knows the reference).
+    """
+    amount = quantize(model, amount)
+    with transaction.atomic():
+        if not model.objects.filter(user_id=user_id).update(balance=F("balance") + amount):
+            return None
+        if kind:
+            ledger.record([ledger.entry(user_id, ledger.account(model), kind, amount, reference)])
+        return _balance(model, user_id)
+
+
+def debit(model, user_id, amount, kind=None, reference=""):
+    """ balance -= amount, only if balance >= amount; None otherwise """
+    amount = quantize(model, amount)
+    with transaction.atomic():
+        if not model.objects.filter(user_id=user_id, balance__gte=amount).update(
+            balance=F("balance") - amount
+        ):
+            return None
+        if kind:
+            ledger.record([ledger.entry(user_id, ledger.account(model), kind, -amount, reference)])
+        return _balance(model, user_id)
+
+
+# ===================== SPOT =====================
+
+def deposit(user_id, amount):
+    return credit(SpotWallet, user_id, amount, LedgerEntry.DEPOSIT)
+
+
+def withdraw(user_id, amount):
+    return debit(SpotWallet, user_id, amount, LedgerEntry.WITHDRAW)
+
+
+def buy(user_id, coin_id, symbol, amount_usd, price):
+    """ Spend amount_usd on coin_id at price; new balance or None """
+    amount_usd = quantize(SpotWallet, amount_usd)
+    qty = amount_usd / price
+    with transaction.atomic():
+        balance = debit(SpotWallet, user_id, amount_usd)
+        if balance is None:
+            return None
+        add_asset(user_id, coin_id, symbol, qty, amount_usd)
+        ledger.record([
+            ledger.entry(user_id, ledger.SPOT, LedgerEntry.BUY, -amount_usd, ledger.coin(coin_id)),
+            ledger.entry(user_id, ledger.coin(coin_id), LedgerEntry.BUY, qty, ledger.SPOT),
+        ])
+    return balance
+
+
+def sell(user_id, coin_id, amount, price):
+    """ Sell amount of coin_id at price; (usd received, new balance) or None if not enough coins """
+    usd_value = quantize(SpotWallet, amount * price)
+    with transaction.atomic():
+        if not take_asset(user_id, coin_id, amount):
+            return None
+        balance = credit(SpotWallet, user_id, usd_value)
+        ledger.record([
+            ledger.entry(user_id, ledger.coin(coin_id), LedgerEntry.SELL, -amount, ledger.SPOT),
+            ledger.entry(user_id, ledger.SPOT, LedgerEntry.SELL, usd_value, ledger.coin(coin_id)),
+        ])
+    return usd_value, balance
+
+
+def convert(user_id, from_id, to_id, to_symbol, amount, p_from, p_to):
+    """ Swap amount of from_id for to_id at USD prices; the quantity received or None """
+    usd_value = amount * p_from
+    qty = usd_value / p_to
+    with transaction.atomic():
+        if not take_asset(user_id, from_id, amount):
+            return None
+        add_asset(user_id, to_id, to_symbol, qty, usd_value)
+        ledger.record([
+            ledger.entry(user_id, ledger.coin(from_id), LedgerEntry.CONVERT, -amount, ledger.coin(to_id)),
+            ledger.entry(user_id, ledger.coin(to_id), LedgerEntry.CONVERT, qty, ledger.coin(from_id)),
+        ])
+    return qty
+
+
+def add_asset(user_id, coin_id, symbol, qty, cost):
+    """ amount += qty, average price moved by cost (USD) """
+    assets = SpotAsset.objects.filter(user_id=user_id, coin_id=coin_id)
+    # both SET expressions read the row as it was before the UPDATE
+    fields = {
+        "amount": F("amount") + qty,
+        "avg_price": (F("amount") * F("avg_price") + cost) / (F("amount") + qty),
+    }
+    if assets.update(**fields):
+        return
+
+    try:
+        with transaction.atomic():
+            SpotAsset.objects.create(
+                user_id=user_id, coin_id=coin_id, symbol=symbol, amount=qty, avg_price=cost / qty
+            )
+    except IntegrityError:
+        # created by a concurrent request meanwhile
+        assets.update(**fields)
+
+
+def take_asset(user_id, coin_id, amount):
+    """ amount -= amount, only if the user holds that much; the row goes when it reaches 0 """
+    assets = SpotAsset.objects.filter(user_id=user_id, coin_id=coin_id)
+    if not assets.filter(amount__gte=amount).update(amount=F("amount") - amount):
+        return False
+    assets.filter(amount__lte=0).delete()
+    return True
+
+
+def quantize(model, amount):
+    """ amount rounded to the model's balance column: what the UPDATE actually adds """
+    places = model._meta.get_field("balance").decimal_places
+    return Decimal(amount).quantize(Decimal(1).scaleb(-places))
+
+
+# -------- helper --------
+def _balance(model, user_id):
+    return model.objects.filter(user_id=user_id).values_list("balance", flat=True).first()
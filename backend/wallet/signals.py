@@ -0,0 +1,23 @@
+# wallet/signals.py
+#
+# A wallet row starts at its column default (futures: $10,000): book that
+# as the OPENING ledger entry when the row is created, so the ledger adds
+# up to the wallet from its first trade. bulk_create (stress_wallets,
+# replay, the benches) sends no signal and records its own.
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from futures.models import FuturesWallet
+from markets.models import SpotWallet
+from wallet import ledger
+from wallet.models import LedgerEntry
+
+
+@receiver(post_save, sender=SpotWallet)
+@receiver(post_save, sender=FuturesWallet)
+def record_opening_balance(sender, instance, created, **kwargs):
+    if created and instance.balance:
+        ledger.record([
+            ledger.entry(instance.user_id, ledger.account(sender), LedgerEntry.OPENING, instance.balance)
+        ])
@@ -1,3 +1,74 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import random
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from futures import settlement
+from futures.models import FuturesPosition, FuturesWallet
+from markets.models import SpotWallet
+from wallet import ledger
+from wallet.management.commands import stress_wallets
+
+USERS = 4
+TRADES = 60
+THREADS = 8
+
+
+class ConcurrentWalletTests(TransactionTestCase):
+    """ Parallel buys, sells, converts and futures opens per user (the stress_wallets workload) """
+
+    def test_parallel_trades_keep_every_balance(self):
+        command = stress_wallets.Command()
+        command.naive = False
+        users = command.setup(USERS)
+        jobs = [(u, i) for i in range(TRADES) for u in users]
+        random.Random(1).shuffle(jobs)
+
+        def run(job):
+            try:
+                return stress_wallets.trade(job[0], job[1] * USERS + job[0], False)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(THREADS) as pool:
+            results = list(pool.map(run, jobs))
+
+        done = {kind for kind, ok in results if ok}
+        self.assertTrue({"buy", "sell", "convert", "open"} <= done, done)
+
+        # no lost update, no overdraft, every wallet equal to its ledger
+        failures = command.verify(
+            users, command.successes(jobs, results, "deposit"), command.successes(jobs, results, "withdraw")
+        )
+        self.assertEqual(failures, [])
+
+
+class FuturesLedgerTests(TestCase):
+    """ Futures movements are booked at the precision the wallet stores """
+
+    def test_close_at_a_fractional_pnl(self):
+        user_id, = stress_wallets.Command().setup(1)
+        pos = settlement.open_position(
+            user_id, symbol="BTCUSDT", side=FuturesPosition.LONG, entry_price=Decimal("97123.45"),
+            amount=Decimal("0.00514808"), leverage=5, initial_margin=Decimal("100"),
+            liquidation_price=Decimal("77698.76"),
+        )
+        pnl, balance = settlement.close(pos.id, Decimal("97131.4437"))
+
+        self.assertNotEqual(pnl, pnl.quantize(Decimal("0.01")))
+        self.assertEqual(balance, stress_wallets.START + pnl.quantize(Decimal("0.01")))
+        self.assertEqual(ledger.balance(user_id, ledger.FUTURES), balance)
+
+
+class OpeningBalanceTests(TestCase):
+    """ A new user's wallets start with an OPENING entry for their balance """
+
+    def test_new_user_ledger_matches_wallets(self):
+        user = User.objects.create_user(username="opening", password="x")
+
+        self.assertEqual(ledger.balance(user.id, ledger.FUTURES), FuturesWallet.objects.get(user=user).balance)
+        self.assertEqual(ledger.balance(user.id, ledger.SPOT), SpotWallet.objects.get(user=user).balance)
+        self.assertGreater(ledger.balance(user.id, ledger.FUTURES), 0)
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("ledger/", views.ledger_history),
+    path("ledger/balances/", views.ledger_balances),
+]
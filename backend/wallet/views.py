@@ -2,6 +2,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from decimal import Decimal
+from . import ledger
 from .models import Asset, UserAsset
 
 
@@ -67,4 +68,51 @@ def withdraw(request):
     user_asset.amount -= amount
     user_asset.save()
 
-    return Response({"message": "Withdrawal successful"})
\ No newline at end of file
+    return Response({"message": "Withdrawal successful"})
+
+
+# ===================== LEDGER =====================
+# GET ?account=spot|futures|coin:<coin_id>&before=<cursor>&limit=50
+# newest first; "next" is the cursor of the following page (null at the end)
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def ledger_history(request):
+    account = request.query_params.get("account", ledger.SPOT)
+    if account not in (ledger.SPOT, ledger.FUTURES) and not account.startswith("coin:"):
+        return Response({"error": "Unknown account"}, status=400)
+
+    try:
+        before = request.query_params.get("before")
+        before = int(before) if before else None
+        limit = min(int(request.query_params.get("limit", ledger.PAGE_SIZE)), ledger.MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({"error": "before and limit must be integers"}, status=400)
+    if limit <= 0:
+        return Response({"error": "limit must be positive"}, status=400)
+
+    entries, cursor = ledger.history(request.user.id, account, before, limit)
+
+    return Response({
+        "account": account,
+        "balance": str(ledger.balance(request.user.id, account)),
+        "entries": [
+            {
+                "id": e.id,
+                "kind": e.kind,
+                "amount": str(e.amount),
+                "reference": e.reference,
+                "created_at": e.created_at.isoformat(),
+            }
+            for e in entries
+        ],
+        "next": cursor,
+    })
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def ledger_balances(request):
+    return Response({
+        account: str(balance) for account, balance in ledger.balances(request.user.id).items()
+    })
@@ -6,11 +6,14 @@ import { apiGet, apiPost } from "/src/services/api";
 import { alertSuccess, alertError } from "/src/utils/alert.js";
 import "./coinDetails.css";
 
+const CHART_RANGES = { "1d": "24h", "7d": "7-Day", "30d": "30-Day", "1y": "1-Year", max: "All-Time" };
+
 export default function CoinDetails() {
   const { coin_id } = useParams();
 
   const [info, setInfo] = useState(null);
   const [chart, setChart] = useState(null);
+  const [range, setRange] = useState("7d");
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
@@ -53,6 +56,13 @@ export default function CoinDetails() {
     return () => controller.abort();
   }, [coin_id]);
 
+  // CHART RANGE (served from the backend's price history)
+  const loadRange = async (r) => {
+    setRange(r);
+    const data = await apiGet(`/markets/${coin_id}/chart/?range=${r}`);
+    if (data?.prices) setChart(data);
+  };
+
   // BUY HANDLER
   const handleBuy = async () => {
     if (!buyAmount || isNaN(buyAmount) || Number(buyAmount) <= 0) {
@@ -135,7 +145,18 @@ export default function CoinDetails() {
 
       {/* CHART */}
       <div className="coinpage-chart-card">
-        <h2>7-Day Chart</h2>
+        <h2>{CHART_RANGES[range]} Chart</h2>
+        <div className="chart-ranges">
+          {Object.keys(CHART_RANGES).map((r) => (
+            <button
+              key={r}
+              className={`chart-range-btn ${r === range ? "active" : ""}`}
+              onClick={() => loadRange(r)}
+            >
+              {r.toUpperCase()}
+            </button>
+          ))}
+        </div>
         {spark.length > 5 ? (
           <svg width="100%" height="260">
             <polyline
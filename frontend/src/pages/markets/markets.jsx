@@ -73,7 +73,11 @@ export default function MarketsPage() {
   // -----------------------------
   useEffect(() => {
     const load = async () => {
-      const data = await apiGet("/markets/top100/");
+      const data = await apiGet(
+        "/markets/top100/?sparkline=48" +
+          "&fields=id,symbol,name,image,current_price," +
+          "price_change_percentage_24h,sparkline_in_7d"
+      );
 
       console.log("TOP100 DATA:", data);
 
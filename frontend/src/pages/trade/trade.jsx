@@ -1,5 +1,5 @@
 import { useEffect, useRef, useState } from "react";
-import { apiGet, apiPost } from "../../services/api";
+import { apiEvents, apiPost } from "../../services/api";
 import { createChart } from "lightweight-charts";
 import Swal from "sweetalert2";
 import "./trade.css";
@@ -19,11 +19,18 @@ export default function Trade() {
   const [side, setSide] = useState("BUY");
   const [margin, setMargin] = useState("");
   const [leverage, setLeverage] = useState(20);
+  const [takeProfit, setTakeProfit] = useState("");
+  const [stopLoss, setStopLoss] = useState("");
+  const [trailingStop, setTrailingStop] = useState("");
+  const [limitPrice, setLimitPrice] = useState("");
   const [livePrice, setLivePrice] = useState(null);
 
   const [orderbook, setOrderbook] = useState({ asks: [], bids: [] });
   const [wallet, setWallet] = useState(null);
   const [positions, setPositions] = useState([]);
+  const [orders, setOrders] = useState([]);
+  const [serverPnl, setServerPnl] = useState({});
+  const [serverRoe, setServerRoe] = useState({});
 
   const wsRef = useRef(null);
   const chartRef = useRef(null);
@@ -36,24 +43,31 @@ export default function Trade() {
     "DOTUSDT", "ATOMUSDT", "NEARUSDT", "FILUSDT"
   ];
 
-  const loadWallet = async () => {
-    const res = await apiGet("/futures/wallet/");
-    if (!res.error) setWallet(res);
-  };
-
-  const loadPositions = async () => {
-    const res = await apiGet("/futures/positions/");
-    setPositions(Array.isArray(res) ? res : []);
-  };
-
+  // Wallet + positions are pushed by the backend when they change,
+  // unrealized PnL a few times per second at most
   useEffect(() => {
-    loadWallet();
-    loadPositions();
-    const t = setInterval(() => {
-      loadWallet();
-      loadPositions();
-    }, 1500);
-    return () => clearInterval(t);
+    return apiEvents("/futures/stream/", {
+      snapshot: (data) => {
+        setWallet(data.wallet);
+        setPositions(data.positions);
+        setOrders(data.orders);
+      },
+      orders: (data) => setOrders(data),
+      wallet: (data) => setWallet(data),
+      positions: ({ upsert, remove }) =>
+        setPositions((prev) => {
+          const changed = new Map(upsert.map((p) => [p.id, p]));
+          const kept = prev
+            .filter((p) => !remove.includes(p.id))
+            .map((p) => changed.get(p.id) || p);
+          const added = upsert.filter((p) => !prev.some((q) => q.id === p.id));
+          return [...kept, ...added];
+        }),
+      pnl: (data) => {
+        setServerPnl((prev) => ({ ...prev, ...data.positions }));
+        setServerRoe((prev) => ({ ...prev, ...data.roe }));
+      },
+    });
   }, []);
 
   const createNewChart = () => {
@@ -136,17 +150,35 @@ export default function Trade() {
       return Swal.fire("Error", "Enter a valid margin amount", "error");
     }
 
+    if (limitPrice) {
+      const res = await apiPost("/futures/orders/", {
+        symbol, side, leverage, margin, price: limitPrice
+      });
+      if (res.error) {
+        Swal.fire("Order Failed", res.error, "error");
+      } else {
+        Swal.fire("Success", "Limit order placed!", "success");
+        setMargin("");
+        setLimitPrice("");
+      }
+      return;
+    }
+
     const res = await apiPost("/futures/open/", {
-      symbol, side, leverage, margin, price: livePrice
+      symbol, side, leverage, margin, price: livePrice,
+      ...(takeProfit && { take_profit: takeProfit }),
+      ...(stopLoss && { stop_loss: stopLoss }),
+      ...(trailingStop && { trailing_stop: trailingStop }),
     });
 
     if (res.error) {
       Swal.fire("Order Failed", res.error, "error");
     } else {
       Swal.fire("Success", "Order opened!", "success");
-      loadWallet();
-      loadPositions();
       setMargin("");
+      setTakeProfit("");
+      setStopLoss("");
+      setTrailingStop("");
     }
   };
 
@@ -157,13 +189,17 @@ export default function Trade() {
       Swal.fire("Error", res.error, "error");
     } else {
       Swal.fire("Closed", `PnL: ${Number(res.pnl).toFixed(2)} USDT`, "success");
-      loadWallet();
-      loadPositions();
     }
   };
 
+  const cancelOrder = async (id) => {
+    const res = await apiPost(`/futures/orders/${id}/cancel/`, {});
+    if (res.error) Swal.fire("Error", res.error, "error");
+  };
+
   const calcPnL = (pos) => {
-    if (!livePrice) return 0;
+    if (serverPnl[pos.id] !== undefined) return Number(serverPnl[pos.id]);
+    if (!livePrice || pos.symbol !== symbol) return 0;
     const entry = Number(pos.entry_price);
     const amt = Number(pos.amount);
     return pos.side === "LONG"
@@ -250,6 +286,13 @@ export default function Trade() {
             <label>Live Price</label>
             <input readOnly value={livePrice ? Number(livePrice).toFixed(2) : "..."} />
 
+            <label>Limit Price (empty = market)</label>
+            <input
+              type="number"
+              value={limitPrice}
+              onChange={(e) => setLimitPrice(e.target.value)}
+            />
+
             <label>Margin (USDT)</label>
             <input
               type="number"
@@ -267,6 +310,28 @@ export default function Trade() {
               className="leverage-slider"
             />
 
+            <label>Take Profit (optional)</label>
+            <input
+              type="number"
+              value={takeProfit}
+              onChange={(e) => setTakeProfit(e.target.value)}
+            />
+
+            <label>Stop Loss (optional)</label>
+            <input
+              type="number"
+              value={stopLoss}
+              onChange={(e) => setStopLoss(e.target.value)}
+            />
+
+            <label>Trailing Stop % (optional)</label>
+            <input
+              type="number"
+              step="0.1"
+              value={trailingStop}
+              onChange={(e) => setTrailingStop(e.target.value)}
+            />
+
             <button className="confirm-btn" onClick={submitOrder}>
               Confirm Order
             </button>
@@ -286,6 +351,27 @@ export default function Trade() {
           </strong>
         </div>
 
+        {orders.length > 0 && (
+          <>
+            <h2 className="section-title">Open Orders</h2>
+            {orders.map((o) => (
+              <div key={o.id} className="pos-card">
+                <div className="pos-header">
+                  <strong>{o.symbol}</strong>
+                  <span className={o.side === "LONG" ? "green" : "red"}>{o.side}</span>
+                </div>
+                <div className="pos-info">
+                  <div>Price: {Number(o.price).toFixed(2)}</div>
+                  <div>Margin: {Number(o.margin).toFixed(2)} × {o.leverage}</div>
+                </div>
+                <button className="close-btn" onClick={() => cancelOrder(o.id)}>
+                  Cancel Order
+                </button>
+              </div>
+            ))}
+          </>
+        )}
+
         <h2 className="section-title">Open Positions</h2>
 
         {positions.length === 0 && <p>No open positions</p>}
@@ -303,10 +389,16 @@ export default function Trade() {
                 <div>Entry: {Number(p.entry_price).toFixed(2)}</div>
                 <div>Contracts: {Number(p.amount).toFixed(4)}</div>
                 <div>Liq: {Number(p.liquidation_price).toFixed(2)}</div>
+                {p.take_profit && <div>TP: {Number(p.take_profit).toFixed(2)}</div>}
+                {p.stop_loss && <div>SL: {Number(p.stop_loss).toFixed(2)}</div>}
+                {p.trailing_stop && (
+                  <div>Trailing: {p.trailing_stop}% @ {Number(p.trailing_stop_price).toFixed(2)}</div>
+                )}
               </div>
 
               <div className="pos-pnl" style={{ color: pnl >= 0 ? "#00ff8c" : "#ff4d4d" }}>
                 PnL: {Number(pnl).toFixed(2)}
+                {serverRoe[p.id] !== undefined && ` (${serverRoe[p.id].toFixed(2)}%)`}
               </div>
 
               <button className="close-btn" onClick={() => closePosition(p.id)}>
@@ -102,4 +102,56 @@ async function request(method, endpoint, body = null, isFile = false) {
 export const apiGet = (endpoint) => request("GET", endpoint);
 export const apiPost = (endpoint, body = {}) => request("POST", endpoint, body);
 export const apiUpload = (endpoint, formData) =>
-  request("POST", endpoint, formData, true);
\ No newline at end of file
+  request("POST", endpoint, formData, true);
+// -------------------------
+// SERVER-SENT EVENTS
+// -------------------------
+// handlers: { eventName: (data) => ... }. EventSource cannot send
+// headers, so every connection first gets a single-use ticket from
+// `${endpoint}ticket/` (an authenticated POST, token refresh included)
+// and puts that in the query — never the access token. When the server
+// reports the token expired, or the connection is rejected, we get a new
+// ticket and reconnect. Returns a function that closes the stream.
+export function apiEvents(endpoint, handlers) {
+  let source = null;
+  let closed = false;
+
+  const path = endpoint.startsWith("/") ? endpoint : `/${endpoint}`;
+
+  const connect = async () => {
+    const { ticket } = await apiPost(`${path}ticket/`);
+    if (closed) return;
+    if (!ticket) {
+      setTimeout(() => !closed && connect(), 3000);
+      return;
+    }
+
+    source = new EventSource(
+      `${API_URL}${path}?ticket=${encodeURIComponent(ticket)}`
+    );
+
+    Object.entries(handlers).forEach(([name, handler]) => {
+      source.addEventListener(name, (e) => handler(JSON.parse(e.data)));
+    });
+
+    source.addEventListener("expired", async () => {
+      source.close();
+      // a fresh access token, so the next stream runs for its lifetime
+      await refreshToken();
+      if (!closed) connect();
+    });
+
+    // rejected (e.g. 401): the browser gives up, so retry with a new ticket
+    source.onerror = () => {
+      if (source.readyState !== EventSource.CLOSED || closed) return;
+      setTimeout(() => !closed && connect(), 3000);
+    };
+  };
+
+  connect();
+
+  return () => {
+    closed = true;
+    source?.close();
+  };
+}